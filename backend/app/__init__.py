@@ -3,39 +3,100 @@ from flask_cors import CORS
 from pymongo import MongoClient
 from config import Config
 from app.routes import api_bp
+from app.routes.health_routes import health_bp
+from app.utils.json_provider import FastJSONProvider
+from app.utils.mongo import ProcessLocalDatabase
+from app.utils.tracing import tracer, mongo_listener
+from app.utils.storage import (interactions_collection_options, interactions_indexes,
+                               superseded_interactions_indexes, timeseries_ttl_change, SUMMARY_KEY)
+from app.cli import register_commands
+from app.services.ad_events import ad_event_logger
+from app.services.dirty_tracker import dirty_users
+from app.services.sessionizer import sessionizer
+from app.utils import vocabulary
 
 def create_app(config_class=Config):
     """Application factory pattern for Flask"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
 
     # Enable CORS for frontend communication
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-    # Initialize MongoDB connection
-    client = MongoClient(app.config['MONGODB_URI'])
-    app.mongo = client[app.config['MONGODB_DB']]
+    # MongoDB connection, opened on first use in each process so pre-fork
+    # workers never share the master's sockets
+    app.mongo = ProcessLocalDatabase(
+        lambda: MongoClient(
+            app.config['MONGODB_URI'],
+            maxPoolSize=app.config['MONGODB_MAX_POOL_SIZE'],
+            minPoolSize=app.config['MONGODB_MIN_POOL_SIZE'],
+            event_listeners=[mongo_listener] if app.config['TRACE_ENABLED'] else []
+        ),
+        app.config['MONGODB_DB']
+    )
+    ad_event_logger.attach(app.mongo)
+    dirty_users.attach(app.mongo)
+    sessionizer.attach(app.mongo)
+
+    # Sampled request tracing
+    tracer.init_app(app)
 
     # Register blueprints
     app.register_blueprint(api_bp, url_prefix='/api')
+    # Load balancer probes live at the root
+    app.register_blueprint(health_bp)
+    register_commands(app)
 
     # Create indexes for better performance
     with app.app_context():
         # User collection indexes
         app.mongo.users.create_index('user_id', unique=True)
         app.mongo.users.create_index('email', unique=True)
+        app.mongo.users.create_index('last_active')
+
+        # Interactions collection, optionally as a time-series collection
+        ts_options = interactions_collection_options(app.config)
+        if ts_options:
+            info = next(app.mongo.list_collections(filter={'name': 'interactions'}), None)
+            if info is None:
+                app.mongo.create_collection('interactions', **ts_options)
+            # Keep an existing time-series TTL in step with retention and its margin
+            ttl = timeseries_ttl_change(app.config, info)
+            if ttl is not None:
+                app.mongo.command('collMod', 'interactions', expireAfterSeconds=ttl)
+        for keys in interactions_indexes(app.config):
+            app.mongo.interactions.create_index(keys)
+        existing = app.mongo.interactions.index_information()
+        for name in superseded_interactions_indexes(app.config):
+            if name in existing:
+                app.mongo.interactions.drop_index(name)
 
-        # Interactions collection indexes
-        app.mongo.interactions.create_index('user_id')
-        app.mongo.interactions.create_index('timestamp')
-        app.mongo.interactions.create_index([('user_id', 1), ('timestamp', -1)])
+        # Daily per-user summaries of compacted interactions
+        app.mongo.interaction_summaries.create_index([(k, 1) for k in SUMMARY_KEY], unique=True)
 
         # Predictions collection indexes
         app.mongo.predictions.create_index('user_id', unique=True)
         app.mongo.predictions.create_index('timestamp')
+        app.mongo.dirty_users.create_index('marked_at')
+
+        # Closed session summaries
+        app.mongo.sessions.create_index([('user_id', 1), ('start', -1)])
+        if app.config['SESSION_STORE'] == 'mongo':
+            app.mongo.open_sessions.create_index('end')
 
         # Ads collection indexes
         app.mongo.ads.create_index('ad_id', unique=True)
         app.mongo.ads.create_index('category')
 
+        # Ad impression/click events, aggregated by time window
+        app.mongo.ad_events.create_index('t')
+
+        # Incremental similarity rebuilds look pairs up by item and by user
+        app.mongo.user_items.create_index('_id.i')
+        app.mongo.user_items.create_index('_id.u')
+
+        # Category/event codes stored in interactions must stay stable
+        vocabulary.sync(app.mongo)
+
     return app
@@ -0,0 +1,205 @@
+import asyncio
+import time
+from quart import Quart
+from quart_cors import cors
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import Config
+from app.async_routes import async_api_bp
+from app.async_routes.health_routes import async_health_bp
+from app.utils.json_provider import FastJSONProvider
+from app.utils.tracing import tracer, mongo_listener
+from app.services.ad_events import ad_event_logger, ctr_table
+from app.services.dirty_tracker import dirty_users
+from app.services.sessionizer import sessionizer
+from app.services.warmup import readiness, warm_model, p99_ms, is_steady
+from app.utils import vocabulary
+from app.utils.storage import (interactions_collection_options, interactions_indexes,
+                               superseded_interactions_indexes, timeseries_ttl_change, SUMMARY_KEY)
+
+
+def create_async_app(config_class=Config):
+    """Application factory for the ASGI variant of the API.
+
+    Serves the same routes and response shapes as ``create_app`` but runs
+    handlers as coroutines on one event loop, with Mongo access through
+    Motor, so thousands of in-flight requests share a few OS threads.
+    """
+    app = Quart(__name__)
+    app.config.from_object(config_class)
+    if app.config['SESSION_STORE'] == 'mongo':
+        # The Mongo session store issues blocking pymongo calls from track_interaction
+        raise ValueError('SESSION_STORE=mongo is only supported by the WSGI app; run one ASGI process with the memory store')
+    app.json = FastJSONProvider(app)
+
+    app = cors(app, allow_origin='*')
+
+    tracer.init_async_app(app)
+
+    app.register_blueprint(async_api_bp, url_prefix='/api')
+    app.register_blueprint(async_health_bp)
+
+    @app.before_serving
+    async def connect_mongo():
+        # Motor binds to the running loop, so the client is created here
+        app.mongo_client = AsyncIOMotorClient(
+            app.config['MONGODB_URI'],
+            maxPoolSize=app.config['MONGODB_MAX_POOL_SIZE'],
+            event_listeners=[mongo_listener] if app.config['TRACE_ENABLED'] else []
+        )
+        app.mongo = app.mongo_client[app.config['MONGODB_DB']]
+        await ensure_indexes(app.mongo, app.config)
+        app.add_background_task(flush_ad_events, app)
+        app.add_background_task(flush_dirty_users, app)
+        app.add_background_task(flush_sessions, app)
+        if app.config['WARMUP_ENABLED']:
+            readiness.begin()
+            app.add_background_task(warm_up, app)
+
+    @app.after_serving
+    async def close_mongo():
+        await write_sessions(app, close_all=True)
+        app.mongo_client.close()
+
+    return app
+
+
+async def flush_ad_events(app):
+    """Drain the shared ad event buffer into Mongo from the event loop"""
+    while True:
+        await asyncio.sleep(ad_event_logger.flush_interval)
+        try:
+            while True:
+                docs = ad_event_logger.drain()
+                if not docs:
+                    break
+                await app.mongo.ad_events.insert_many(docs, ordered=False)
+        except Exception as e:
+            print(f"Ad event flush failed: {e}")
+
+
+async def flush_dirty_users(app):
+    """Upsert users marked dirty by track_interaction from the event loop"""
+    while True:
+        await asyncio.sleep(dirty_users.flush_interval)
+        try:
+            ops = dirty_users.drain()
+            if ops:
+                await app.mongo.dirty_users.bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"Dirty user flush failed: {e}")
+
+
+async def write_sessions(app, close_all=False):
+    sessions, ops = sessionizer.drain(close_all=close_all)
+    if sessions:
+        await app.mongo.sessions.insert_many(sessions, ordered=False)
+        await app.mongo.users.bulk_write(ops, ordered=False)
+
+
+async def flush_sessions(app):
+    """Write sessions closed by the inactivity gap from the event loop"""
+    while True:
+        await asyncio.sleep(sessionizer.flush_interval)
+        try:
+            await write_sessions(app)
+        except Exception as e:
+            print(f"Session flush failed: {e}")
+
+
+async def warm_up(app):
+    """Event-loop version of ``Warmup``: same steps, through Motor and the async service"""
+    from app.services.async_user_service import AsyncUserService
+    from app.utils.http_cache import catalog_version
+
+    config = app.config
+    service = AsyncUserService(app.mongo)
+
+    async def step(name, coro):
+        started = time.perf_counter()
+        info = await coro
+        readiness.record(name, time.perf_counter() - started, **info)
+
+    async def open_pool():
+        await asyncio.gather(*(app.mongo.command('ping') for _ in range(config['WARMUP_CONNECTIONS'])))
+        return {'connections': config['WARMUP_CONNECTIONS']}
+
+    async def prime_catalog():
+        catalog_version()
+        await service._reload_ctr()
+        await service._refresh_slate()
+        return {'ads_with_ctr': len(ctr_table.by_ad)}
+
+    async def prime_predictions(user_ids):
+        have = {p['user_id'] async for p in app.mongo.predictions.find({'user_id': {'$in': user_ids}}, {'_id': 0, 'user_id': 1})}
+        predicted = 0
+        for user_id in user_ids:
+            if user_id not in have and await service.has_interactions(user_id):
+                predicted += (await service.predict_user_interests(user_id))['success']
+        return {'recent_users': len(user_ids), 'had_prediction': len(have), 'predicted': predicted}
+
+    async def calibrate(user_ids):
+        user_ids = user_ids or ['warmup']
+        rounds = []
+        for _ in range(config['WARMUP_MAX_ROUNDS']):
+            timings = []
+            for i in range(config['WARMUP_PROBES']):
+                started = time.perf_counter()
+                await service.get_recommended_ads(user_ids[i % len(user_ids)], 3)
+                timings.append(time.perf_counter() - started)
+            rounds.append(p99_ms(timings))
+            if is_steady(rounds, config['WARMUP_P99_TOLERANCE']):
+                break
+        return {'p99_ms': [round(r, 3) for r in rounds], 'steady': is_steady(rounds, config['WARMUP_P99_TOLERANCE'])}
+
+    try:
+        await step('model', asyncio.to_thread(warm_model))
+        await step('mongo_pool', open_pool())
+        await step('ad_catalog', prime_catalog())
+        recent = app.mongo.users.find({}, {'_id': 0, 'user_id': 1}).sort('last_active', -1)
+        user_ids = [u['user_id'] async for u in recent.limit(config['WARMUP_RECENT_USERS'])]
+        await step('predictions', prime_predictions(user_ids))
+        await step('calibration', calibrate(user_ids))
+        readiness.ready()
+        print(f"✅ Warm-up finished in {readiness.snapshot()['warmup_seconds']}s")
+    except Exception as e:
+        readiness.fail(e)
+        print(f"❌ Warm-up failed: {e}")
+
+
+async def ensure_indexes(db, config):
+    await db.users.create_index('user_id', unique=True)
+    await db.users.create_index('email', unique=True)
+    await db.users.create_index('last_active')
+
+    ts_options = interactions_collection_options(config)
+    if ts_options:
+        infos = await (await db.list_collections(filter={'name': 'interactions'})).to_list(length=1)
+        if not infos:
+            await db.create_collection('interactions', **ts_options)
+        # Keep an existing time-series TTL in step with retention and its margin
+        ttl = timeseries_ttl_change(config, infos[0] if infos else None)
+        if ttl is not None:
+            await db.command('collMod', 'interactions', expireAfterSeconds=ttl)
+    for keys in interactions_indexes(config):
+        await db.interactions.create_index(keys)
+    existing = await db.interactions.index_information()
+    for name in superseded_interactions_indexes(config):
+        if name in existing:
+            await db.interactions.drop_index(name)
+    await db.interaction_summaries.create_index([(k, 1) for k in SUMMARY_KEY], unique=True)
+
+    await db.predictions.create_index('user_id', unique=True)
+    await db.predictions.create_index('timestamp')
+    await db.dirty_users.create_index('marked_at')
+    await db.sessions.create_index([('user_id', 1), ('start', -1)])
+
+    await db.ads.create_index('ad_id', unique=True)
+    await db.ads.create_index('category')
+
+    await db.ad_events.create_index('t')
+    await db.user_items.create_index('_id.i')
+    await db.user_items.create_index('_id.u')
+
+    for vocab in vocabulary.VOCABULARIES:
+        if vocab.check(await db.vocabulary.find_one({'_id': vocab.field})):
+            await db.vocabulary.update_one({'_id': vocab.field}, {'$set': {'names': vocab.names}}, upsert=True)
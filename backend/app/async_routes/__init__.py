@@ -0,0 +1,5 @@
+from quart import Blueprint
+
+async_api_bp = Blueprint('api', __name__)
+
+from . import user_routes, ad_routes, ml_routes, analytics_routes
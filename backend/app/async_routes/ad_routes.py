@@ -0,0 +1,119 @@
+from quart import request, jsonify, current_app
+from app.async_routes import async_api_bp
+from app.utils.admission import admission
+from app.services.async_user_service import AsyncUserService
+from app.services.ad_events import ad_event_logger, AD_CATEGORY_BY_ID
+from app.utils.http_cache import conditional, catalog_version
+from config import Config
+
+@async_api_bp.route('/users/<user_id>/ads', methods=['GET'])
+@admission.limit('ads')
+async def get_personalized_ads(user_id):
+    """Get personalized ads for user"""
+    try:
+        limit = request.args.get('limit', 3, type=int)
+
+        user_service = AsyncUserService(current_app.mongo)
+        # Under load, skip inline prediction and serve cached or popular slates
+        degraded = admission.degraded('ads')
+        ads = await user_service.get_recommended_ads(user_id, limit, inline_predict=not degraded)
+        ad_event_logger.log_impressions(user_id, ads)
+
+        return jsonify({
+            'success': True,
+            'ads': ads,
+            'count': len(ads),
+            'user_id': user_id,
+            'degraded': degraded
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving ads: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/users/<user_id>/related', methods=['GET'])
+async def get_related(user_id):
+    """Get content and ads related to the user's recently viewed content"""
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        ad_limit = request.args.get('ad_limit', 3, type=int)
+
+        user_service = AsyncUserService(current_app.mongo)
+        related = await user_service.get_related(user_id, limit, ad_limit)
+        ad_event_logger.log_impressions(user_id, related['ads'])
+
+        return jsonify({
+            'success': True,
+            'content': related['content'],
+            'ads': related['ads'],
+            'user_id': user_id
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving related content: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/ads/categories', methods=['GET'])
+@conditional(catalog_version, max_age=Config.CATALOG_MAX_AGE)
+async def get_ad_categories():
+    """Get all available ad categories"""
+    categories = list(Config.AD_CATEGORIES.keys())
+    return jsonify({
+        'success': True,
+        'categories': categories,
+        'count': len(categories)
+    })
+
+@async_api_bp.route('/ads/categories/<category>', methods=['GET'])
+@conditional(catalog_version, max_age=Config.CATALOG_MAX_AGE)
+async def get_ads_by_category(category):
+    """Get ads by specific category"""
+    ads = Config.AD_CATEGORIES.get(category, [])
+    return jsonify({
+        'success': True,
+        'category': category,
+        'ads': ads,
+        'count': len(ads)
+    })
+
+@async_api_bp.route('/ads/random', methods=['GET'])
+async def get_random_ads():
+    """Get random ads"""
+    try:
+        limit = request.args.get('limit', 3, type=int)
+
+        user_service = AsyncUserService(current_app.mongo)
+        ads = user_service.get_random_ads(limit)
+
+        return jsonify({
+            'success': True,
+            'ads': ads,
+            'count': len(ads)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving random ads: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/ads/<ad_id>/click', methods=['POST'])
+async def track_ad_click(ad_id):
+    """Record a click on a served ad"""
+    data = await request.get_json(silent=True) or {}
+
+    if ad_id not in AD_CATEGORY_BY_ID:
+        return jsonify({
+            'success': False,
+            'message': 'Unknown ad'
+        }), 404
+
+    ad_event_logger.log_click(data.get('user_id'), ad_id)
+    return jsonify({
+        'success': True,
+        'message': 'Click tracked successfully'
+    })
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+from quart import request, jsonify, current_app
+from app.async_routes import async_api_bp
+from app.services import analytics_service as queries
+from app.services.async_user_service import spawn
+from app.services.audience_segments import audience_index, conditions_from_args
+from app.utils.http_cache import analytics_cache
+
+
+async def _aggregate_one(collection, pipeline):
+    results = await collection.aggregate(pipeline).to_list(length=1)
+    return results[0]
+
+
+async def _latest(collection, query, limit):
+    return await collection.find(query).sort('timestamp', -1).limit(limit).to_list(length=limit)
+
+
+@async_api_bp.route('/analytics/overview', methods=['GET'])
+@analytics_cache.cached()
+async def get_system_overview():
+    """Get system-wide analytics overview"""
+    try:
+        db = current_app.mongo
+        week_ago = datetime.utcnow() - timedelta(days=7)
+
+        results = await asyncio.gather(
+            db.interactions.estimated_document_count(),
+            _aggregate_one(db.users, queries.users_overview_pipeline(week_ago)),
+            _aggregate_one(db.predictions, queries.predictions_overview_pipeline()),
+            _aggregate_one(db.interactions, queries.interactions_overview_pipeline(week_ago))
+        )
+
+        return jsonify({'success': True, 'overview': queries.build_overview(*results)})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error retrieving analytics: {str(e)}'}), 500
+
+
+@async_api_bp.route('/analytics/interests', methods=['GET'])
+@analytics_cache.cached()
+async def get_interest_analytics():
+    """Get detailed interest analytics"""
+    try:
+        db = current_app.mongo
+        day_ago = datetime.utcnow() - timedelta(days=1)
+        by_interest, recent = await asyncio.gather(
+            db.predictions.aggregate(queries.interests_pipeline()).to_list(length=None),
+            _latest(db.predictions, queries.window_query(day_ago), queries.RECENT_PREDICTIONS)
+        )
+        return jsonify({'success': True, 'analytics': queries.build_interest_analytics(by_interest, recent)})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error retrieving interest analytics: {str(e)}'}), 500
+
+
+@async_api_bp.route('/analytics/interactions', methods=['GET'])
+@analytics_cache.cached(params=('days',))
+async def get_interaction_analytics():
+    """Get interaction analytics, optionally limited to the last `days` days"""
+    try:
+        db = current_app.mongo
+        since = queries.window_start(request.args.get('days', type=int))
+        facet, recent = await asyncio.gather(
+            _aggregate_one(db.interactions, queries.interactions_pipeline(since)),
+            _latest(db.interactions, queries.window_query(since), queries.RECENT_INTERACTIONS)
+        )
+        analytics = queries.build_interaction_analytics(facet, recent)
+        return jsonify({'success': True, 'analytics': analytics})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error retrieving interaction analytics: {str(e)}'}), 500
+
+
+async def _refresh_audience(db):
+    try:
+        since, until = audience_index.watermark, datetime.utcnow()
+        predictions, activity = await asyncio.gather(
+            db.predictions.find(*audience_index.prediction_query(since, until)).to_list(length=None),
+            db.users.find(*audience_index.activity_query(since, until)).to_list(length=None)
+        )
+        await asyncio.to_thread(audience_index.apply, predictions, activity, until)
+    except Exception as e:
+        print(f"Audience index refresh failed: {e}")
+    finally:
+        audience_index.end_refresh()
+
+
+async def _ensure_audience(db):
+    """Build the index on first use, refresh it in the background afterwards"""
+    if audience_index.is_built:
+        if audience_index.begin_refresh():
+            spawn(_refresh_audience(db))
+        return True
+    if audience_index.begin_refresh():
+        await _refresh_audience(db)
+    return audience_index.is_built
+
+
+def _audience_building():
+    response = jsonify({'success': False, 'message': 'Audience index is being built'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
+@async_api_bp.route('/analytics/segments', methods=['GET'])
+async def get_segment_size():
+    """Count users matching `interest`, `min_confidence` and `active_days` from the audience bitmaps"""
+    try:
+        if not await _ensure_audience(current_app.mongo):
+            return _audience_building()
+        conditions = conditions_from_args(request.args)
+        return jsonify({'success': True, 'conditions': conditions, **audience_index.size(**conditions)})
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error computing segment: {str(e)}'}), 500
+
+
+@async_api_bp.route('/analytics/segments/members', methods=['GET'])
+async def get_segment_members():
+    """Page through the user ids of a segment with `limit` and `offset`"""
+    try:
+        if not await _ensure_audience(current_app.mongo):
+            return _audience_building()
+        conditions = conditions_from_args(request.args)
+        page = audience_index.members(limit=request.args.get('limit', 100, type=int),
+                                      offset=request.args.get('offset', 0, type=int), **conditions)
+        return jsonify({'success': True, 'conditions': conditions, **page})
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error listing segment members: {str(e)}'}), 500
+
+
+@async_api_bp.route('/analytics/segments/index', methods=['GET'])
+async def get_segment_index():
+    """Audience index coverage and per-bitmap sizes"""
+    try:
+        return jsonify({'success': True, 'index': audience_index.stats()})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error reading audience index: {str(e)}'}), 500
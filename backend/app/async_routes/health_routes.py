@@ -0,0 +1,24 @@
+import time
+
+from quart import Blueprint, jsonify, current_app
+from app.services.warmup import readiness
+from app.utils.admission import admission
+
+async_health_bp = Blueprint('health', __name__)
+
+@async_health_bp.route('/healthz', methods=['GET'])
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok', 'uptime_seconds': round(time.time() - readiness.started_at, 3)})
+
+@async_health_bp.route('/readyz', methods=['GET'])
+async def readyz():
+    """Readiness: warm-up has finished (or was never started) and Mongo answers"""
+    status = readiness.snapshot()
+    if not readiness.is_ready:
+        return jsonify({'ready': False, **status}), 503, {'Retry-After': '1'}
+    try:
+        await current_app.mongo.command('ping')
+    except Exception as e:
+        return jsonify({'ready': False, **status, 'error': f'Mongo unavailable: {str(e)}'}), 503, {'Retry-After': '1'}
+    return jsonify({'ready': True, **status, 'admission': admission.stats()})
@@ -0,0 +1,76 @@
+from quart import jsonify, current_app
+from app.async_routes import async_api_bp
+from app.utils.admission import admission
+from app.services.async_user_service import AsyncUserService
+from app.utils.http_cache import conditional, model_version
+
+@async_api_bp.route('/ml/train', methods=['POST'])
+async def train_model():
+    """Start training the ML model in the background; poll GET /ml/train for the result"""
+    try:
+        user_service = AsyncUserService(current_app.mongo)
+        job = await user_service.start_training()
+
+        if job is None:
+            return jsonify({
+                'success': False,
+                'message': 'Model training is already running',
+                'job': await user_service.get_training_status()
+            }), 409
+        job.pop('_id', None)
+        return jsonify({'success': True, 'message': 'Model training started', 'job': job}), 202
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error training model: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/ml/train', methods=['GET'])
+async def get_training_status():
+    """Status and result of the latest training run"""
+    try:
+        user_service = AsyncUserService(current_app.mongo)
+        return jsonify({'success': True, 'job': await user_service.get_training_status()})
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving training status: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/ml/info', methods=['GET'])
+@conditional(model_version)
+async def get_model_info():
+    """Get information about the ML model"""
+    try:
+        user_service = AsyncUserService(current_app.mongo)
+        return jsonify({
+            'success': True,
+            'model_info': user_service.get_model_info()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving model info: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/ml/predict/<user_id>', methods=['POST'])
+@admission.limit('predict')
+async def predict_user_interests(user_id):
+    """Predict user interests using ML model"""
+    try:
+        user_service = AsyncUserService(current_app.mongo)
+        result = await user_service.predict_user_interests(user_id)
+
+        if result['success']:
+            return jsonify(result)
+        else:
+            return jsonify(result), 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error predicting interests: {str(e)}'
+        }), 500
@@ -0,0 +1,167 @@
+from quart import request, jsonify, current_app, Response
+from app.async_routes import async_api_bp
+from app.utils.admission import admission
+from app.services.async_user_service import AsyncUserService
+from app.utils.vocabulary import decode_interaction
+
+@async_api_bp.route('/users', methods=['POST'])
+async def create_user():
+    """Create a new demo user"""
+    try:
+        data = await request.get_json()
+
+        if not data or not data.get('email'):
+            return jsonify({
+                'success': False,
+                'message': 'Email is required'
+            }), 400
+
+        user_service = AsyncUserService(current_app.mongo)
+        result = await user_service.create_user(data)
+
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error creating user: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/users/<user_id>', methods=['GET'])
+async def get_user(user_id):
+    """Get user information"""
+    try:
+        user_service = AsyncUserService(current_app.mongo)
+        user = await user_service.get_user(user_id)
+
+        if user:
+            return jsonify({
+                'success': True,
+                'user': user
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving user: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/users/<user_id>/interactions', methods=['POST'])
+@admission.limit('ingest')
+async def track_interaction(user_id):
+    """Track user interaction for ML analysis"""
+    try:
+        data = await request.get_json()
+
+        if not data or not data.get('event_type'):
+            return jsonify({
+                'success': False,
+                'message': 'Event type is required'
+            }), 400
+
+        user_service = AsyncUserService(current_app.mongo)
+        result = await user_service.track_interaction(user_id, data)
+
+        if result['success']:
+            return jsonify(result)
+        else:
+            return jsonify(result), 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error tracking interaction: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/users/<user_id>/interactions', methods=['GET'])
+async def get_user_interactions(user_id):
+    """Get user's interaction history, paginated by cursor or streamed as NDJSON"""
+    try:
+        cursor = request.args.get('cursor')
+        user_service = AsyncUserService(current_app.mongo)
+
+        if request.args.get('format') == 'ndjson':
+            docs = user_service.iter_interactions(user_id, cursor, request.args.get('limit', 0, type=int))
+            dumps = current_app.json.dumps
+
+            async def generate():
+                try:
+                    async for doc in docs:
+                        yield (dumps(decode_interaction(doc)) + '\n').encode()
+                finally:
+                    await docs.close()
+
+            return Response(generate(), mimetype='application/x-ndjson')
+
+        limit = request.args.get('limit', 100, type=int)
+        interactions, next_cursor = await user_service.get_interactions_page(user_id, limit, cursor)
+
+        return jsonify({
+            'success': True,
+            'interactions': interactions,
+            'count': len(interactions),
+            'next_cursor': next_cursor
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving interactions: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/users/<user_id>/predict', methods=['POST'])
+@admission.limit('predict')
+async def predict_interests(user_id):
+    """Predict user interests using ML model"""
+    try:
+        user_service = AsyncUserService(current_app.mongo)
+        result = await user_service.predict_user_interests(user_id)
+
+        if result['success']:
+            return jsonify(result)
+        else:
+            return jsonify(result), 400
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error predicting interests: {str(e)}'
+        }), 500
+
+@async_api_bp.route('/users/<user_id>/analytics', methods=['GET'])
+async def get_user_analytics(user_id):
+    """Get comprehensive user analytics"""
+    try:
+        user_service = AsyncUserService(current_app.mongo)
+        # ?aggregation=python|server overrides USER_AGGREGATION_MODE for comparison
+        analytics = await user_service.get_user_analytics(user_id, request.args.get('aggregation'))
+
+        if analytics:
+            return jsonify({
+                'success': True,
+                'analytics': analytics
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving analytics: {str(e)}'
+        }), 500
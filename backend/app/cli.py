@@ -0,0 +1,157 @@
+import click
+from flask import current_app
+
+
+def register_commands(app):
+    """Register maintenance jobs as `flask <command>` CLI commands"""
+
+    @app.cli.command('compact-interactions')
+    def compact_interactions():
+        """Fold aging interactions into daily summaries and expire raw events."""
+        from app.services.compaction_service import InteractionCompactor
+
+        result = InteractionCompactor(current_app.mongo).compact()
+        if not result['success']:
+            raise click.ClickException(result['message'])
+        click.echo(f"✅ Compacted until {result['compacted_until']}, deleted {result['deleted']} raw events")
+
+    @app.cli.command('export')
+    @click.argument('kind', type=click.Choice(['interactions', 'features']))
+    @click.option('--format', 'fmt', type=click.Choice(['parquet', 'arrow']), default=None,
+                  help='File format (default: EXPORT_FORMAT)')
+    @click.option('--out', default=None, help='Output directory (default: EXPORT_DIR)')
+    @click.option('--full', is_flag=True, help='Export everything instead of resuming from the watermark')
+    @click.option('--no-partition', is_flag=True, help='Write one file instead of date=YYYY-MM-DD partitions')
+    def export(kind, fmt, out, full, no_partition):
+        """Export interactions or per-user feature rows to Parquet/Arrow files."""
+        from app.services.export_service import ColumnarExporter
+
+        exporter = ColumnarExporter(current_app.mongo, out_dir=out, fmt=fmt)
+        method = exporter.export_interactions if kind == 'interactions' else exporter.export_features
+        result = method(partition_by_date=not no_partition, incremental=not full)
+        click.echo(f"✅ {result['message']} into {len(result['files'])} files")
+
+    @app.cli.command('train-model')
+    @click.option('--data', 'data_path', default=None,
+                  help='Exported feature file or directory (default: synthetic data)')
+    @click.option('--budget', type=float, default=None,
+                  help='Model selection time budget in seconds (default: MODEL_SELECTION_BUDGET_SECONDS)')
+    def train_model(data_path, budget):
+        """Select and train the interest classifier, optionally from exported feature files."""
+        from app.services.user_service import UserService
+
+        result = UserService(current_app.mongo).train_ml_model(data_path, budget)
+        if not result['success']:
+            raise click.ClickException(result['message'])
+        click.echo(f"✅ {result['message']}: {result['model']['model']} {result['model']['params']} "
+                   f"(accuracy {result['accuracy']:.3f}, p99 {result['model']['p99_ms']:.2f}ms)")
+        click.echo(f"📄 Selection report written to {result['report_path']}")
+
+    @app.cli.command('distill')
+    @click.option('--budget-ms', type=float, default=None,
+                  help='Single-row p99 latency budget for online predictions (default: DISTILL_P99_BUDGET_MS)')
+    @click.option('--data', 'data_path', default=None,
+                  help='Exported feature file or directory (default: synthetic data)')
+    def distill(budget_ms, data_path):
+        """Distil the trained model into a low-latency student for online predictions."""
+        from app.services.user_service import UserService
+
+        result = UserService(current_app.mongo).distill_ml_model(data_path, budget_ms)
+        if not result['success']:
+            raise click.ClickException(result['message'])
+        student, teacher = result['student'], result['teacher']
+        if student is None:
+            click.echo(f"✅ Teacher fits the budget (p99 {teacher['p99_ms']:.3f}ms); serving it online")
+        else:
+            click.echo(f"✅ Serving student {student['name']} online: accuracy {student['accuracy']:.3f} "
+                       f"({student['accuracy_lost']:+.3f} lost), p99 {student['p99_ms']:.3f}ms "
+                       f"vs teacher {teacher['p99_ms']:.3f}ms")
+        click.echo(f"📄 Distillation report written to {result['report_path']}")
+
+    @app.cli.command('build-similarity')
+    @click.option('--full', is_flag=True, help='Rebuild every item instead of resuming from the watermark')
+    def build_similarity(full):
+        """Recompute item-to-item content neighbours from co-occurrence."""
+        from app.services.item_similarity import ItemSimilarityIndex
+
+        result = ItemSimilarityIndex(current_app.mongo).rebuild(full=full)
+        click.echo(f"✅ {result['message']}")
+
+    @app.cli.command('seed')
+    @click.option('--users', 'n_users', type=int, default=10000, help='Number of users to generate')
+    @click.option('--events-per-user', type=int, default=50, help='Mean interactions per user')
+    @click.option('--category-skew', type=float, default=1.2, help='Zipf exponent of per-user category preference')
+    @click.option('--activity-skew', type=float, default=1.5, help='Pareto shape of per-user activity (lower is heavier-tailed)')
+    @click.option('--events-per-session', type=int, default=8, help='Mean interactions per session')
+    @click.option('--days', type=int, default=30, help='Spread history over this many days')
+    @click.option('--seed', 'random_seed', type=int, default=42, help='Random seed')
+    @click.option('--target', type=click.Choice(['mongo', 'ndjson']), default='mongo',
+                  help='Load into Mongo or write NDJSON files as a local stand-in')
+    @click.option('--out', default=None, help='Output directory for --target ndjson')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: SEED_WORKERS)')
+    @click.option('--batch-size', type=int, default=None, help='Documents per insert_many (default: SEED_BATCH_SIZE)')
+    def seed(n_users, events_per_user, category_skew, activity_skew, events_per_session, days,
+             random_seed, target, out, workers, batch_size):
+        """Generate synthetic users and interactions for capacity testing."""
+        from app.utils.seeding import Seeder, SyntheticWorkload
+
+        workload = SyntheticWorkload(events_per_user, category_skew, activity_skew, events_per_session, days, random_seed)
+        seeder = Seeder(workload, target=target, workers=workers, batch_size=batch_size,
+                        db_name=current_app.config['MONGODB_DB'], out_dir=out)
+
+        def progress(totals, elapsed):
+            docs = totals['users'] + totals['interactions']
+            click.echo(f"  {totals['users']:,} users, {totals['interactions']:,} interactions "
+                       f"({docs / elapsed:,.0f} docs/s)")
+
+        result = seeder.run(n_users, on_progress=progress)
+        click.echo(f"✅ {result['message']}")
+
+    @app.cli.command('encode-interactions')
+    def encode_interactions():
+        """Rewrite string categories and event types in interactions as vocabulary codes."""
+        from app.utils.vocabulary import VOCABULARIES
+
+        for vocab in VOCABULARIES:
+            converted = 0
+            for name, code in vocab.codes.items():
+                result = current_app.mongo.interactions.update_many({vocab.field: name}, {'$set': {vocab.field: code}})
+                converted += result.modified_count
+            # Whatever is left is mixed case or outside the vocabulary; unknown names stay strings
+            for value in current_app.mongo.interactions.distinct(vocab.field, {vocab.field: {'$type': 'string'}}):
+                if vocab.store(value) == value:
+                    continue
+                result = current_app.mongo.interactions.update_many(
+                    {vocab.field: value}, {'$set': {vocab.field: vocab.store(value)}}
+                )
+                converted += result.modified_count
+            click.echo(f"✅ Encoded {converted} {vocab.field} values")
+
+    @app.cli.command('aggregate-ctr')
+    def aggregate_ctr():
+        """Rebuild the per-ad and per-category CTR tables from ad events."""
+        from app.services.ad_events import ctr_table
+
+        ctr_table.aggregate(current_app.mongo)
+        ctr_table.reload(current_app.mongo)
+        click.echo(f"✅ CTR tables rebuilt for {len(ctr_table.by_ad)} ads")
+
+    @app.cli.command('score-users')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: SCORING_WORKERS)')
+    @click.option('--shard-size', type=int, default=None, help='Users per worker task')
+    def score_users(workers, shard_size):
+        """Re-score every user with interactions across a process pool."""
+        from app.models.batch_scoring import BatchScoringExecutor
+
+        result = BatchScoringExecutor(current_app.mongo, workers=workers, shard_size=shard_size).run()
+        click.echo(f"✅ {result['message']}")
+
+    @app.cli.command('rescore-dirty')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: SCORING_WORKERS)')
+    @click.option('--shard-size', type=int, default=None, help='Users per worker task')
+    def rescore_dirty(workers, shard_size):
+        """Re-score users with new interactions since their last scoring."""
+        from app.services.dirty_tracker import IncrementalRescorer
+
+        result = IncrementalRescorer(current_app.mongo, workers=workers, shard_size=shard_size).run()
+        click.echo(f"✅ {result['message']}, cleared {result['cleared']} flags")
@@ -0,0 +1,301 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from app.models.ml_model import UserInterestClassifier
+from app.services import user_aggregates
+from app.services.compaction_service import InteractionCompactor
+from config import Config
+
+
+class FlatForest:
+    """A fitted RandomForest flattened into a few contiguous node arrays.
+
+    sklearn trees copy their nodes into private buffers on unpickling, so
+    every worker that loads the pickle holds its own copy of the forest.
+    Flattened into ``.npy`` files, the same model is opened with
+    ``mmap_mode='r'`` and all workers read one copy from the page cache.
+    Prediction walks every tree for a whole batch at once in NumPy.
+    """
+
+    ARRAYS = ('left', 'right', 'feature', 'threshold', 'value', 'roots', 'mean', 'scale')
+
+    def __init__(self, arrays, classes, feature_names):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes = classes
+        self.feature_names = feature_names
+
+    @staticmethod
+    def supports(model):
+        """Forests and single decision trees can be flattened"""
+        return isinstance(model, (RandomForestClassifier, DecisionTreeClassifier))
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        left, right, feature, threshold, value, roots = [], [], [], [], [], []
+        offset = 0
+        model = classifier.model
+        for estimator in getattr(model, 'estimators_', [model]):
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            counts = tree.value[:, 0, :]
+            value.append(counts / counts.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += tree.node_count
+
+        arrays = {
+            'left': np.concatenate(left).astype(np.int64),
+            'right': np.concatenate(right).astype(np.int64),
+            'feature': np.concatenate(feature).astype(np.int64),
+            'threshold': np.concatenate(threshold).astype(np.float64),
+            'value': np.concatenate(value).astype(np.float64),
+            'roots': np.asarray(roots, dtype=np.int64),
+            'mean': np.asarray(classifier.scaler.mean_, dtype=np.float64),
+            'scale': np.asarray(classifier.scaler.scale_, dtype=np.float64)
+        }
+        return cls(arrays, [str(c) for c in classifier.model.classes_], list(classifier.feature_names))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'classes': self.classes, 'feature_names': self.feature_names}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode) for name in cls.ARRAYS}
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(arrays, meta['classes'], meta['feature_names'])
+
+    def predict_proba(self, X):
+        # sklearn compares float32 features against its thresholds
+        X = ((X - self.mean) / self.scale).astype(np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        while True:
+            left = self.left[nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.right[nodes]), nodes)
+        return self.value[nodes].mean(axis=1)
+
+
+class PickledModel:
+    """Scoring interface over the pickled classifier, for models that cannot be flattened"""
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.classes = [str(c) for c in classifier.model.classes_]
+        self.feature_names = list(classifier.feature_names)
+
+    def predict_proba(self, X):
+        return self.classifier.predict_proba(X)
+
+
+def export_scoring_model(classifier=None, directory=None):
+    """Write the flattened forest next to the pickle, if it is out of date.
+
+    Returns the directory, or None when the selected model is not a tree
+    ensemble and workers have to load the pickle instead.
+    """
+    directory = directory or Config.SCORING_MODEL_DIR
+    classifier = classifier or UserInterestClassifier(Config.ML_MODEL_PATH)
+    if classifier.model is None:
+        raise ValueError('Model is not trained')
+    if not FlatForest.supports(classifier.model):
+        return None
+
+    marker = os.path.join(directory, 'meta.json')
+    if os.path.exists(marker) and os.path.getmtime(marker) >= os.path.getmtime(classifier.model_path):
+        return directory
+    FlatForest.from_classifier(classifier).save(directory)
+    return directory
+
+
+# Per-process worker state, set by _init_worker after the pool forks/spawns
+_worker = {}
+
+
+def _init_worker(model_dir, mongo_uri, db_name):
+    if model_dir is None:
+        classifier = UserInterestClassifier(Config.ML_MODEL_PATH)
+        _worker['model'] = PickledModel(classifier)
+    else:
+        _worker['model'] = FlatForest.load(model_dir, mmap=True)
+        # Features are built by the classifier's code path, without its model
+        classifier = UserInterestClassifier.__new__(UserInterestClassifier)
+        classifier.categories = [n[:-len('_clicks')] for n in _worker['model'].feature_names if n.endswith('_clicks')]
+        classifier.feature_names = _worker['model'].feature_names
+    _worker['features'] = classifier
+    _worker['db'] = MongoClient(mongo_uri, maxPoolSize=2)[db_name]
+
+
+def shard_features(db, classifier, user_ids, history_limit):
+    """Feature rows for a shard of users, from the same inputs as an inline prediction.
+
+    Like ``UserService.get_feature_records``, each user's latest
+    ``history_limit`` raw events after the compaction watermark are used;
+    one limited query per user walks the (user_id, timestamp) index, so
+    heavy users cost no more than the limit. Users with no raw events left
+    fall back to their compacted summaries. Returns
+    ``(user_ids_with_history, matrix)``, rows in the order of ``user_ids``.
+    """
+    compactor = InteractionCompactor(db)
+    since = compactor.compacted_until()
+    records = []
+    seen = set()
+    projection = {'_id': 0, 'user_id': 1, 'content_category': 1, 'duration': 1, 'session_id': 1}
+    for user_id in user_ids:
+        history = list(db.interactions.find(user_aggregates.user_history_match(user_id, since), projection)
+                       .sort('timestamp', -1).limit(history_limit))
+        if history:
+            seen.add(user_id)
+            records.extend(history)
+
+    missing = [user_id for user_id in user_ids if user_id not in seen]
+    if missing:
+        for row in compactor.get_users_summary(missing):
+            seen.add(row['user_id'])
+            records.append(row)
+
+    scored_ids = [user_id for user_id in user_ids if user_id in seen]
+    if not scored_ids:
+        return [], None
+
+    features = classifier.features_matrix(records, scored_ids)
+    _apply_session_counters(db, scored_ids, features, classifier.feature_names)
+    return scored_ids, features
+
+
+def _score_shard(user_ids, history_limit):
+    model = _worker['model']
+    scored_ids, features = shard_features(_worker['db'], _worker['features'], user_ids, history_limit)
+    if not scored_ids:
+        return []
+
+    proba = model.predict_proba(features)
+    best = proba.argmax(axis=1)
+    now = datetime.utcnow()
+
+    results = []
+    for i, user_id in enumerate(scored_ids):
+        results.append({
+            'user_id': user_id,
+            'primary_interest': model.classes[best[i]],
+            'interest_scores': dict(zip(model.classes, proba[i].tolist())),
+            'confidence': float(proba[i, best[i]]),
+            'features_used': dict(zip(model.feature_names, features[i].tolist())),
+            'timestamp': now,
+            'model_version': Config.ML_MODEL_VERSION
+        })
+    return results
+
+
+def _apply_session_counters(db, user_ids, features, feature_names):
+    """Replace record-based session estimates with the sessionizer's counters"""
+    row = {user_id: i for i, user_id in enumerate(user_ids)}
+    sessions_col = feature_names.index('total_sessions')
+    avg_col = feature_names.index('avg_session_duration')
+    for user in db.users.find(
+        {'user_id': {'$in': user_ids}, 'total_sessions': {'$gt': 0}},
+        {'_id': 0, 'user_id': 1, 'total_sessions': 1, 'total_session_duration': 1}
+    ):
+        i = row[user['user_id']]
+        features[i, sessions_col] = user['total_sessions']
+        features[i, avg_col] = user.get('total_session_duration', 0) / user['total_sessions']
+
+
+class BatchScoringExecutor:
+    """Re-scores users across a process pool and upserts predictions in bulk.
+
+    Users are sharded into fixed-size chunks; each worker reads its shard's
+    history with one limited, indexed query per user (compacted summaries
+    for users without raw events), builds features with NumPy and
+    scores them against the memory-mapped forest (or the pickled model when
+    the selected model is not a tree ensemble). The parent keeps a bounded
+    number of shards in flight and writes each finished shard with one
+    unordered ``bulk_write`` as soon as it arrives.
+    """
+
+    def __init__(self, mongo_db, workers=None, shard_size=None, model_dir=None,
+                 history_limit=500, mongo_uri=None):
+        self.db = mongo_db
+        # Workers open their own clients after the pool starts them
+        self.mongo_uri = mongo_uri or Config.MONGODB_URI
+        self.workers = workers or Config.SCORING_WORKERS
+        self.shard_size = shard_size or Config.SCORING_SHARD_SIZE
+        self.model_dir = model_dir or Config.SCORING_MODEL_DIR
+        self.history_limit = history_limit
+
+    def all_user_ids(self):
+        for row in self.db.interactions.aggregate([{'$group': {'_id': '$user_id'}}], allowDiskUse=True):
+            yield row['_id']
+
+    def _shards(self, user_ids):
+        shard = []
+        for user_id in user_ids:
+            shard.append(user_id)
+            if len(shard) == self.shard_size:
+                yield shard
+                shard = []
+        if shard:
+            yield shard
+
+    def _write(self, results):
+        if results:
+            self.db.predictions.bulk_write([
+                UpdateOne({'user_id': r['user_id']}, {'$set': r}, upsert=True) for r in results
+            ], ordered=False)
+        return len(results)
+
+    def run(self, user_ids=None, on_shard_done=None):
+        """Score ``user_ids`` (default: every user with interactions).
+
+        ``on_shard_done(user_ids)`` is called with the ids each shard actually
+        scored once their predictions have been written; users with neither
+        raw history nor compacted summaries get no prediction and are left out.
+        """
+        model_dir = export_scoring_model(directory=self.model_dir)
+        user_ids = self.all_user_ids() if user_ids is None else user_ids
+
+        scored = 0
+        max_in_flight = self.workers * 2
+
+        def finish(future):
+            results = future.result()
+            written = self._write(results)
+            if on_shard_done is not None and results:
+                on_shard_done([r['user_id'] for r in results])
+            return written
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(model_dir, self.mongo_uri, self.db.name)
+        ) as pool:
+            pending = set()
+            for shard in self._shards(user_ids):
+                pending.add(pool.submit(_score_shard, shard, self.history_limit))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    scored += sum(finish(f) for f in done)
+            for future in pending:
+                scored += finish(future)
+
+        return {'success': True, 'scored': scored, 'message': f'Scored {scored} users'}
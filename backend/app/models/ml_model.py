@@ -1,12 +1,69 @@
+import json
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, classification_report
+from sklearn.tree import DecisionTreeRegressor
 import joblib
 import os
+import threading
 from datetime import datetime
+from app.models.model_selection import ModelSelector, measure_latency, write_report
+from app.utils import vocabulary
+from app.utils.tracing import tracer
+from config import Config
+
+class DistilledStudent:
+    """A compact model trained on the teacher's class probabilities.
+
+    Regressors (trees, small forests) fit the probability vectors directly
+    and their outputs are renormalised; the linear student is a logistic
+    regression fitted to soft labels by repeating each row once per class,
+    weighted by the teacher's probability for it.
+    """
+
+    def __init__(self, name, estimator, classes):
+        self.name = name
+        self.estimator = estimator
+        self.classes_ = np.asarray(classes)
+
+    def fit(self, X, soft_targets):
+        if isinstance(self.estimator, LogisticRegression):
+            n_classes = soft_targets.shape[1]
+            self.estimator.fit(
+                np.repeat(X, n_classes, axis=0),
+                np.tile(self.classes_, len(X)),
+                sample_weight=soft_targets.ravel()
+            )
+        else:
+            self.estimator.fit(X, soft_targets)
+        return self
+
+    def predict_proba(self, X):
+        if isinstance(self.estimator, LogisticRegression):
+            return self.estimator.predict_proba(X)
+        proba = np.clip(self.estimator.predict(X), 0, None)
+        if proba.ndim == 1:
+            proba = proba[:, None]
+        total = proba.sum(axis=1, keepdims=True)
+        return np.divide(proba, total, out=np.full_like(proba, 1 / proba.shape[1]), where=total > 0)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+# Student candidates, roughly cheapest first
+STUDENTS = {
+    'tree_depth_4': lambda: DecisionTreeRegressor(max_depth=4, random_state=42),
+    'tree_depth_6': lambda: DecisionTreeRegressor(max_depth=6, random_state=42),
+    'tree_depth_8': lambda: DecisionTreeRegressor(max_depth=8, random_state=42),
+    'linear': lambda: LogisticRegression(max_iter=2000),
+    'forest_10': lambda: RandomForestRegressor(n_estimators=10, max_depth=8, random_state=42, n_jobs=1),
+    'forest_25': lambda: RandomForestRegressor(n_estimators=25, max_depth=10, random_state=42, n_jobs=1),
+}
 
 class UserInterestClassifier:
     """Machine Learning model for classifying user interests based on behavior"""
@@ -14,6 +71,10 @@ class UserInterestClassifier:
     def __init__(self, model_path='./ml_models/user_classifier.pkl'):
         self.model_path = model_path
         self.model = None
+        self.selection = None
+        # Distilled student used for online predictions, when one was chosen
+        self.student = None
+        self.distillation = None
         self.scaler = StandardScaler()
 
         # Categories use 'tech' instead of 'technology' to match feature_names
@@ -33,6 +94,14 @@ class UserInterestClassifier:
 
         self.load_model()
 
+    @property
+    def report_path(self):
+        return os.path.splitext(self.model_path)[0] + '_selection.json'
+
+    @property
+    def distillation_report_path(self):
+        return os.path.splitext(self.model_path)[0] + '_distillation.json'
+
     def generate_synthetic_data(self, n_samples=1000):
         """Generate synthetic training data for the ML model"""
         np.random.seed(42)
@@ -62,37 +131,278 @@ class UserInterestClassifier:
 
         return pd.DataFrame(data)
 
-    def train_model(self, data=None):
-        """Train the machine learning model"""
-        if data is None:
-            data = self.generate_synthetic_data()
+    def engagement_labels(self, matrix):
+        """Each feature row's top engagement category, or None for rows with no engagement.
+
+        Uses the score the synthetic labels are drawn from (clicks * 2 plus
+        seconds / 10), without the noise, so exported features are labelled
+        from the user's own interactions rather than a model's predictions.
+        """
+        clicks = matrix[:, [self.feature_names.index(f'{c}_clicks') for c in self.categories]]
+        time_spent = matrix[:, [self.feature_names.index(f'{c}_time') for c in self.categories]]
+        scores = clicks * 2 + time_spent / 10
+        best = scores.argmax(axis=1)
+        return [self.categories[b] if scores[i, b] > 0 else None for i, b in enumerate(best)]
+
+    def load_training_data(self, path):
+        """Feature matrix and labels from exported Parquet/Arrow feature files.
 
-        print("Data Columns in train_model:", data.columns.tolist())  # Debugging check
+        ``path`` is one file or a directory of them. Files are memory-mapped
+        and only the feature columns are read. Incremental exports repeat
+        users active in several runs, so only each user's row from the
+        latest run (files ordered by run id) is kept; unlabelled rows are
+        dropped.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
 
-        X = data[self.feature_names]
-        y = data['primary_interest']
+        if os.path.isdir(path):
+            # part-<run_id> names sort by run time, whatever date partition they sit in
+            files = sorted(
+                (os.path.join(root, name)
+                 for root, _, names in os.walk(path)
+                 for name in names if name.endswith(('.parquet', '.arrow'))),
+                key=lambda file: (os.path.basename(file), file)
+            )
+        else:
+            files = [path]
+        if not files:
+            raise ValueError(f'No training files found in {path}')
 
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+        columns = ['user_id'] + self.feature_names + ['primary_interest']
+        tables = []
+        for file in files:
+            if file.endswith('.arrow'):
+                tables.append(pa.ipc.open_file(pa.memory_map(file, 'r')).read_all().select(columns))
+            else:
+                tables.append(pq.read_table(file, columns=columns, memory_map=True))
+        table = pa.concat_tables(tables)
+        # Last occurrence of each user, i.e. the row from the latest run
+        user_ids = table.column('user_id').to_numpy(zero_copy_only=False)[::-1]
+        _, first_from_end = np.unique(user_ids, return_index=True)
+        table = table.take(np.sort(len(user_ids) - 1 - first_from_end))
+        table = table.filter(table.column('primary_interest').is_valid())
+
+        X = np.column_stack([table.column(name).to_numpy() for name in self.feature_names])
+        y = table.column('primary_interest').to_numpy(zero_copy_only=False)
+        return X, y
+
+    def _split(self, data=None, path=None):
+        if path is not None:
+            X, y = self.load_training_data(path)
+        else:
+            if data is None:
+                data = self.generate_synthetic_data()
+            X = data[self.feature_names].to_numpy(dtype=float)
+            y = data['primary_interest'].to_numpy()
+        return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    def train_model(self, data=None, path=None, budget_seconds=None):
+        """Select and train the model from a DataFrame, exported files or synthetic data.
+
+        Candidate models are compared by ``ModelSelector`` within
+        ``budget_seconds``; its report is written next to the model file.
+        """
+        X_train, X_test, y_train, y_test = self._split(data, path)
 
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
 
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
-        model.fit(X_train_scaled, y_train)
-
-        self.model = model
+        selector = ModelSelector(
+            candidates=Config.MODEL_CANDIDATES,
+            budget_seconds=budget_seconds or Config.MODEL_SELECTION_BUDGET_SECONDS,
+            workers=Config.MODEL_SELECTION_WORKERS,
+            tolerance=Config.MODEL_SELECTION_TOLERANCE
+        )
+        self.model, self.selection = selector.select(X_train_scaled, y_train, X_test_scaled, y_test)
+        self.student, self.distillation = None, None
+        if Config.DISTILL_ENABLED:
+            self.distill(X_train_scaled, X_test_scaled, y_test)
 
         self.save_model()
+        write_report(self.selection, self.report_path)
+        if self.distillation:
+            write_report(self.distillation, self.distillation_report_path)
+
+        for candidate in self.selection['candidates']:
+            marker = '*' if candidate['chosen'] else ('+' if candidate['pareto'] else ' ')
+            print(f"{marker} {candidate['model']:<20} {json.dumps(candidate['params']):<40} "
+                  f"acc {candidate['accuracy']:.3f}  p99 {candidate['p99_ms']:.2f}ms  "
+                  f"batch {candidate['batch_us_per_row']:.1f}µs/row")
+        if self.selection['skipped']:
+            print(f"⏱️  {len(self.selection['skipped'])} candidates skipped by the time budget")
 
         y_pred = self.model.predict(X_test_scaled)
         score = accuracy_score(y_test, y_pred)
 
-        print(f"✅ Best model accuracy: {score:.3f}")
+        print(f"✅ Best model accuracy: {score:.3f} ({self.selection['chosen']['model']})")
         print("\nClassification Report:")
-        print(classification_report(y_test, y_pred, target_names=self.categories))
+        print(classification_report(y_test, y_pred))
 
         return score
 
+    def distill(self, X_train, X_test, y_test, p99_budget_ms=None):
+        """Fit student models to the teacher's probabilities and keep the best one in budget.
+
+        Inputs are scaled feature rows. The transfer set is the training rows
+        plus jittered copies, all labelled by the teacher. The most accurate
+        student whose single-row p99 fits ``p99_budget_ms`` is kept for online
+        predictions; if the teacher itself fits and is at least as accurate,
+        no student is kept. Returns the report, which is also stored on
+        ``self.distillation``.
+        """
+        if self.model is None:
+            raise ValueError('Model is not trained')
+        budget = p99_budget_ms or Config.DISTILL_P99_BUDGET_MS
+        rng = np.random.default_rng(42)
+        transfer = np.vstack([X_train] + [
+            X_train + rng.normal(0, Config.DISTILL_JITTER, X_train.shape) for _ in range(Config.DISTILL_AUGMENT)
+        ])
+        soft_targets = self.model.predict_proba(transfer)
+        teacher_predictions = self.model.predict(X_test)
+        teacher = {'model': type(self.model).__name__,
+                   'accuracy': float(accuracy_score(y_test, teacher_predictions)),
+                   **measure_latency(self.model, X_test)}
+
+        students = []
+        for name, build in STUDENTS.items():
+            student = DistilledStudent(name, build(), self.model.classes_).fit(transfer, soft_targets)
+            predictions = student.predict(X_test)
+            result = {
+                'name': name,
+                'accuracy': float(accuracy_score(y_test, predictions)),
+                'agreement': float(np.mean(predictions == teacher_predictions)),
+                **measure_latency(student, X_test)
+            }
+            result['accuracy_lost'] = teacher['accuracy'] - result['accuracy']
+            students.append((result, student))
+
+        fitting = [(r, st) for r, st in students if r['p99_ms'] <= budget]
+        if fitting:
+            best, student = max(fitting, key=lambda pair: pair[0]['accuracy'])
+        else:
+            best, student = min(students, key=lambda pair: pair[0]['p99_ms'])
+            print(f"⚠️  No student fits the {budget}ms p99 budget; using the fastest ({best['name']})")
+        if teacher['p99_ms'] <= budget and teacher['accuracy'] >= best['accuracy']:
+            best, student = None, None
+
+        self.student = student
+        self.distillation = {
+            'p99_budget_ms': budget,
+            'teacher': teacher,
+            'student': best,
+            'students': [r for r, _ in students],
+            'transfer_rows': len(transfer)
+        }
+        if best is None:
+            print(f"🎓 Teacher fits the {budget}ms p99 budget; serving it online")
+        else:
+            print(f"🎓 Student {best['name']}: accuracy {best['accuracy']:.3f} "
+                  f"({best['accuracy_lost']:+.3f} lost), p99 {best['p99_ms']:.3f}ms "
+                  f"vs teacher {teacher['p99_ms']:.3f}ms")
+        return self.distillation
+
+    def distill_model(self, data=None, path=None, p99_budget_ms=None):
+        """Distil the saved teacher again, e.g. for a new latency budget"""
+        if self.model is None:
+            raise ValueError('Model is not trained')
+        X_train, X_test, _, y_test = self._split(data, path)
+        report = self.distill(self.scaler.transform(X_train), self.scaler.transform(X_test), y_test, p99_budget_ms)
+        self.save_model()
+        write_report(report, self.distillation_report_path)
+        return report
+
+    def features_matrix(self, interactions, user_ids=None):
+        """Build one feature row per user from interaction records.
+
+        Records need ``content_category`` (a vocabulary code), ``duration``
+        and ``session_id``; compacted summary rows add a ``count`` and stand
+        in for that many events. With ``user_ids`` the records may span
+        several users and rows follow that order; otherwise they all belong
+        to a single user. Codes map to model categories by array indexing and
+        the sums are ``np.bincount`` calls.
+        """
+        encode = vocabulary.categories.encode
+        n_categories = len(self.categories)
+        width = n_categories + 1  # last slot collects unknown categories
+        position = {user_id: i for i, user_id in enumerate(user_ids)} if user_ids is not None else None
+        n_users = len(user_ids) if user_ids is not None else 1
+
+        n = len(interactions)
+        users = np.zeros(n, dtype=np.int64)
+        codes = np.empty(n, dtype=np.int64)
+        counts = np.ones(n)
+        durations = np.zeros(n)
+        sessions = set()
+        for i, record in enumerate(interactions):
+            user = position[record['user_id']] if position is not None else 0
+            users[i] = user
+            codes[i] = encode(record.get('content_category'))
+            counts[i] = record.get('count', 1)
+            durations[i] = record.get('duration') or 0
+            session_id = record.get('session_id')
+            if session_id is not None:
+                sessions.add((user, session_id))
+
+        cells = users * width + vocabulary.interest_codes(self.categories)[codes]
+        clicks = np.bincount(cells, weights=counts, minlength=n_users * width).reshape(n_users, width)
+        time_spent = np.bincount(cells, weights=durations, minlength=n_users * width).reshape(n_users, width)
+        total_interactions = np.bincount(users, weights=counts, minlength=n_users)
+        total_duration = np.bincount(users, weights=durations, minlength=n_users)
+        total_sessions = np.bincount(
+            np.fromiter((user for user, _ in sessions), dtype=np.int64, count=len(sessions)),
+            minlength=n_users
+        ).astype(float)
+        # Summary rows carry no session ids; count their history as one session
+        total_sessions = np.where((total_sessions == 0) & (total_interactions > 0), 1, total_sessions)
+
+        columns = {'total_sessions': total_sessions, 'total_interactions': total_interactions,
+                   'avg_session_duration': total_duration / np.maximum(total_sessions, 1)}
+        for i, category in enumerate(self.categories):
+            columns[f'{category}_clicks'] = clicks[:, i]
+            columns[f'{category}_time'] = time_spent[:, i]
+        return np.column_stack([columns[name] for name in self.feature_names])
+
+    @property
+    def online_model(self):
+        """The student when one was distilled, else the teacher"""
+        return self.student if self.student is not None else self.model
+
+    def predict_proba(self, X, online=False):
+        """Class probabilities for raw feature rows, in ``model.classes_`` order.
+
+        Batch scoring uses the teacher; ``online`` requests use ``online_model``.
+        """
+        model = self.online_model if online else self.model
+        with tracer.span('model.predict_proba', cat='model', rows=len(X), online=online):
+            return model.predict_proba((X - self.scaler.mean_) / self.scaler.scale_)
+
+    @tracer.traced('model.predict_user_interests', cat='model')
+    def predict_user_interests(self, interactions, session_stats=None):
+        """Predict a single user's interests from their interaction records.
+
+        ``session_stats`` carries sessionizer totals (``total_sessions``,
+        ``avg_session_duration``) that replace the estimates from the records.
+        """
+        if self.model is None:
+            raise ValueError('Model is not trained')
+
+        features = self.features_matrix(interactions)
+        if session_stats and session_stats.get('total_sessions'):
+            for name, value in session_stats.items():
+                if name in self.feature_names:
+                    features[0, self.feature_names.index(name)] = value
+        proba = self.predict_proba(features, online=True)[0]
+        classes = [str(c) for c in self.model.classes_]
+        best = int(np.argmax(proba))
+
+        return {
+            'primary_interest': classes[best],
+            'interest_scores': {c: float(p) for c, p in zip(classes, proba)},
+            'confidence': float(proba[best]),
+            'features_used': dict(zip(self.feature_names, features[0].tolist()))
+        }
+
     def save_model(self):
         """Save the trained model to disk"""
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
@@ -102,10 +412,16 @@ class UserInterestClassifier:
             'scaler': self.scaler,
             'categories': self.categories,
             'feature_names': self.feature_names,
+            'selection': self.selection,
+            'student': self.student,
+            'distillation': self.distillation,
             'trained_at': datetime.now().isoformat()
         }
 
-        joblib.dump(model_data, self.model_path)
+        # Written aside and renamed, so processes polling the file never load a partial model
+        tmp_path = f'{self.model_path}.tmp'
+        joblib.dump(model_data, tmp_path)
+        os.replace(tmp_path, self.model_path)
         print(f"Model saved to {self.model_path}")
 
     def load_model(self):
@@ -117,6 +433,9 @@ class UserInterestClassifier:
                 self.scaler = model_data['scaler']
                 self.categories = model_data['categories']
                 self.feature_names = model_data['feature_names']
+                self.selection = model_data.get('selection')
+                self.student = model_data.get('student')
+                self.distillation = model_data.get('distillation')
                 print(f"Model loaded from {self.model_path}")
                 return True
         except Exception as e:
@@ -132,5 +451,37 @@ class UserInterestClassifier:
             'model_type': type(self.model).__name__,
             'categories': self.categories,
             'feature_names': self.feature_names,
-            'model_path': self.model_path
+            'model_path': self.model_path,
+            'selection': self.selection['chosen'] if self.selection else None,
+            'online_model': self.student.name if self.student is not None else 'teacher',
+            'distillation': self.distillation['student'] if self.distillation else None
         }
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_classifier(model_path=None):
+    """The process-wide classifier for ``model_path``, loaded once.
+
+    The model file's mtime is checked on each call and the classifier is
+    reloaded when it changes, so a retrain is picked up without a restart.
+    Training works on its own instance, so requests never see a half-trained
+    model; a file that fails to load keeps the previous model in service.
+    """
+    path = model_path or Config.ML_MODEL_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    entry = _shared.get(path)
+    if entry is None or entry[0] != mtime:
+        with _shared_lock:
+            entry = _shared.get(path)
+            if entry is None or entry[0] != mtime:
+                classifier = UserInterestClassifier(path)
+                if classifier.model is None and entry is not None and entry[1].model is not None:
+                    classifier = entry[1]
+                entry = _shared[path] = (mtime, classifier)
+    return entry[1]
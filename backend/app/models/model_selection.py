@@ -0,0 +1,181 @@
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold, cross_val_score
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+# name -> (estimator, parameter grid). Grids are expanded in order, cheapest
+# settings first, so a tight budget still evaluates every family.
+CANDIDATES = {
+    'logistic_regression': (LogisticRegression(max_iter=2000), {'C': [0.1, 1.0, 10.0]}),
+    'decision_tree': (DecisionTreeClassifier(random_state=42), {'max_depth': [4, 8, 16], 'min_samples_leaf': [1, 5]}),
+    'knn': (KNeighborsClassifier(), {'n_neighbors': [5, 15, 31], 'weights': ['uniform', 'distance']}),
+    'random_forest': (RandomForestClassifier(random_state=42, n_jobs=1),
+                      {'n_estimators': [50, 100], 'max_depth': [12, None]}),
+}
+
+
+def expand_grid(names):
+    """``(family, params)`` for every grid point of the named candidates, round-robin across families"""
+    per_family = []
+    for name in names:
+        if name not in CANDIDATES:
+            raise ValueError(f'Unknown model candidate: {name}')
+        grid = CANDIDATES[name][1]
+        keys = list(grid)
+        per_family.append([(name, dict(zip(keys, values))) for values in itertools.product(*grid.values())])
+    return [config for group in itertools.zip_longest(*per_family) for config in group if config is not None]
+
+
+def _evaluate(name, params, X, y, folds):
+    estimator = clone(CANDIDATES[name][0]).set_params(**params)
+    started = time.perf_counter()
+    scores = cross_val_score(estimator, X, y, cv=StratifiedKFold(folds, shuffle=True, random_state=42))
+    estimator.fit(X, y)
+    return {'model': name, 'params': params, 'cv_accuracy': float(scores.mean()),
+            'cv_std': float(scores.std()), 'fit_seconds': time.perf_counter() - started}, estimator
+
+
+def measure_latency(estimator, X, single_calls=200, batch_rows=1000):
+    """Single-row p50/p99 (ms) and batch cost (µs per row) of ``predict_proba``"""
+    estimator.predict_proba(X[:1])  # warm up
+    timings = np.empty(single_calls)
+    for i in range(single_calls):
+        row = X[i % len(X):i % len(X) + 1]
+        started = time.perf_counter()
+        estimator.predict_proba(row)
+        timings[i] = time.perf_counter() - started
+
+    batch = X[np.arange(batch_rows) % len(X)]
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        estimator.predict_proba(batch)
+        best = min(best, time.perf_counter() - started)
+    return {
+        'p50_ms': float(np.percentile(timings, 50) * 1000),
+        'p99_ms': float(np.percentile(timings, 99) * 1000),
+        'batch_us_per_row': best / batch_rows * 1e6
+    }
+
+
+def pareto_front(results):
+    """Results not beaten on both holdout accuracy and single-row p99"""
+    front = []
+    for r in results:
+        dominated = any(
+            o['accuracy'] >= r['accuracy'] and o['p99_ms'] <= r['p99_ms']
+            and (o['accuracy'] > r['accuracy'] or o['p99_ms'] < r['p99_ms'])
+            for o in results
+        )
+        if not dominated:
+            front.append(r)
+    return front
+
+
+class ModelSelector:
+    """Cross-validated model selection across processes within a time budget.
+
+    Every grid point of the candidate families is cross-validated and refit
+    in a process pool; whatever has not finished when ``budget_seconds`` runs
+    out is cancelled and listed as skipped. Finished candidates are then
+    timed one at a time in this process, so latencies are comparable, and
+    scored on the holdout set. The choice is made on the accuracy/p99
+    Pareto front: the fastest model within ``tolerance`` of the most
+    accurate one.
+    """
+
+    def __init__(self, candidates=None, budget_seconds=60, workers=None, folds=3, tolerance=0.01):
+        self.candidates = list(candidates or CANDIDATES)
+        self.budget_seconds = budget_seconds
+        self.workers = workers or os.cpu_count() or 1
+        self.folds = folds
+        self.tolerance = tolerance
+
+    def _cross_validate(self, X, y):
+        configs = expand_grid(self.candidates)
+        deadline = time.monotonic() + self.budget_seconds
+        finished, failed = [], []
+        # multiprocessing.Pool rather than ProcessPoolExecutor: past the deadline
+        # its terminate() stops fits that are still running
+        results = queue.Queue()
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            pending = {}
+            for i, (name, params) in enumerate(configs):
+                pending[i] = (name, params)
+                pool.apply_async(_evaluate, (name, params, X, y, self.folds),
+                                 callback=lambda result, i=i: results.put((i, result, None)),
+                                 error_callback=lambda error, i=i: results.put((i, None, error)))
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    i, result, error = results.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                name, params = pending.pop(i)
+                if error is None:
+                    finished.append(result)
+                else:
+                    failed.append({'model': name, 'params': params, 'error': str(error)})
+        finally:
+            # Fits still running past the deadline are discarded, so stop their
+            # processes rather than leave them burning CPU after we return
+            if pending:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+        skipped = [{'model': name, 'params': params} for name, params in pending.values()]
+        return finished, skipped, failed
+
+    def select(self, X_train, y_train, X_test, y_test):
+        """Return ``(best_estimator, report)``"""
+        started = time.perf_counter()
+        finished, skipped, failed = self._cross_validate(X_train, y_train)
+        if not finished:
+            raise RuntimeError(f'No model finished cross-validation within {self.budget_seconds}s')
+
+        results, estimators = [], []
+        for summary, estimator in finished:
+            summary['accuracy'] = float(accuracy_score(y_test, estimator.predict(X_test)))
+            summary.update(measure_latency(estimator, X_test))
+            results.append(summary)
+            estimators.append(estimator)
+
+        front = pareto_front(results)
+        best_accuracy = max(r['accuracy'] for r in front)
+        chosen = min((r for r in front if r['accuracy'] >= best_accuracy - self.tolerance),
+                     key=lambda r: r['p99_ms'])
+        for r in results:
+            r['pareto'] = any(r is f for f in front)
+            r['chosen'] = r is chosen
+
+        report = {
+            'chosen': {k: chosen[k] for k in ('model', 'params', 'accuracy', 'p99_ms', 'batch_us_per_row')},
+            'candidates': sorted(results, key=lambda r: -r['accuracy']),
+            'skipped': skipped,
+            'failed': failed,
+            'budget_seconds': self.budget_seconds,
+            'workers': self.workers,
+            'elapsed_seconds': time.perf_counter() - started
+        }
+        return next(e for r, e in zip(results, estimators) if r is chosen), report
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
@@ -1,51 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime, timedelta
 
 # Define the Blueprint here
 from app.routes import api_bp
+from app.services.analytics_service import AnalyticsService
+from app.services.audience_segments import audience_index, conditions_from_args
+from app.utils.http_cache import analytics_cache
 
 
 @api_bp.route('/analytics/overview', methods=['GET'])
+@analytics_cache.cached()
 def get_system_overview():
     """Get system-wide analytics overview"""
     try:
-        db = current_app.mongo
-
-        total_users = db.users.count_documents({})
-        total_interactions = db.interactions.count_documents({})
-        total_predictions = db.predictions.count_documents({})
-
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_users = db.users.count_documents({'created_at': {'$gte': week_ago}})
-        recent_interactions = db.interactions.count_documents({'timestamp': {'$gte': week_ago}})
-
-        interest_pipeline = [
-            {'$group': {'_id': '$primary_interest', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
-        ]
-        interest_distribution = list(db.predictions.aggregate(interest_pipeline))
-
-        daily_interactions = db.interactions.aggregate([
-            {
-                '$group': {
-                    '_id': {'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}}},
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'_id.date': -1}},
-            {'$limit': 7}
-        ])
-
-        overview = {
-            'total_users': total_users,
-            'total_interactions': total_interactions,
-            'total_predictions': total_predictions,
-            'recent_users': recent_users,
-            'recent_interactions': recent_interactions,
-            'interest_distribution': interest_distribution,
-            'daily_interactions': list(daily_interactions)
-        }
-
+        overview = AnalyticsService(current_app.mongo).get_overview()
         return jsonify({'success': True, 'overview': overview})
 
     except Exception as e:
@@ -53,39 +20,11 @@ def get_system_overview():
 
 
 @api_bp.route('/analytics/interests', methods=['GET'])
+@analytics_cache.cached()
 def get_interest_analytics():
     """Get detailed interest analytics"""
     try:
-        db = current_app.mongo
-
-        interest_pipeline = [
-            {'$group': {'_id': '$primary_interest', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
-        ]
-        interest_distribution = list(db.predictions.aggregate(interest_pipeline))
-
-        confidence_pipeline = [
-            {'$group': {
-                '_id': '$primary_interest',
-                'avg_confidence': {'$avg': '$confidence'},
-                'count': {'$sum': 1}
-            }},
-            {'$sort': {'avg_confidence': -1}}
-        ]
-        confidence_by_interest = list(db.predictions.aggregate(confidence_pipeline))
-
-        day_ago = datetime.utcnow() - timedelta(days=1)
-        recent_predictions = list(db.predictions.find({'timestamp': {'$gte': day_ago}}).sort('timestamp', -1).limit(10))
-
-        for pred in recent_predictions:
-            pred['_id'] = str(pred['_id'])
-
-        analytics = {
-            'interest_distribution': interest_distribution,
-            'confidence_by_interest': confidence_by_interest,
-            'recent_predictions': recent_predictions
-        }
-
+        analytics = AnalyticsService(current_app.mongo).get_interest_analytics()
         return jsonify({'success': True, 'analytics': analytics})
 
     except Exception as e:
@@ -93,47 +32,81 @@ def get_interest_analytics():
 
 
 @api_bp.route('/analytics/interactions', methods=['GET'])
+@analytics_cache.cached(params=('days',))
 def get_interaction_analytics():
-    """Get interaction analytics"""
+    """Get interaction analytics, optionally limited to the last `days` days"""
     try:
-        db = current_app.mongo
-
-        event_pipeline = [
-            {'$group': {'_id': '$event_type', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
-        ]
-        event_distribution = list(db.interactions.aggregate(event_pipeline))
-
-        category_pipeline = [
-            {'$group': {'_id': '$content_category', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
-        ]
-        category_distribution = list(db.interactions.aggregate(category_pipeline))
-
-        hourly_pipeline = [
-            {
-                '$group': {
-                    '_id': {'$hour': '$timestamp'},
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'_id': 1}}
-        ]
-        hourly_pattern = list(db.interactions.aggregate(hourly_pipeline))
-
-        recent_interactions = list(db.interactions.find().sort('timestamp', -1).limit(20))
-
-        for interaction in recent_interactions:
-            interaction['_id'] = str(interaction['_id'])
-
-        analytics = {
-            'event_distribution': event_distribution,
-            'category_distribution': category_distribution,
-            'hourly_pattern': hourly_pattern,
-            'recent_interactions': recent_interactions
-        }
-
+        days = request.args.get('days', type=int)
+        analytics = AnalyticsService(current_app.mongo).get_interaction_analytics(days)
         return jsonify({'success': True, 'analytics': analytics})
 
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error retrieving interaction analytics: {str(e)}'}), 500
+
+
+@api_bp.route('/analytics/export/<kind>', methods=['POST'])
+def export_columnar(kind):
+    """Export interactions or feature rows to Parquet/Arrow files under EXPORT_DIR"""
+    try:
+        from app.services.export_service import ColumnarExporter
+
+        if kind not in ('interactions', 'features'):
+            return jsonify({'success': False, 'message': f'Unknown export: {kind}'}), 404
+        data = request.get_json(silent=True) or {}
+        exporter = ColumnarExporter(current_app.mongo, fmt=data.get('format'))
+        method = exporter.export_interactions if kind == 'interactions' else exporter.export_features
+        result = method(partition_by_date=data.get('partition', True), incremental=not data.get('full', False))
+        return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error exporting {kind}: {str(e)}'}), 500
+
+
+def _audience_building():
+    response = jsonify({'success': False, 'message': 'Audience index is being built'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
+@api_bp.route('/analytics/segments', methods=['GET'])
+def get_segment_size():
+    """Count users matching `interest`, `min_confidence` and `active_days` from the audience bitmaps"""
+    try:
+        if not audience_index.ensure_built(current_app.mongo):
+            return _audience_building()
+        conditions = conditions_from_args(request.args)
+        return jsonify({'success': True, 'conditions': conditions, **audience_index.size(**conditions)})
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error computing segment: {str(e)}'}), 500
+
+
+@api_bp.route('/analytics/segments/members', methods=['GET'])
+def get_segment_members():
+    """Page through the user ids of a segment with `limit` and `offset`"""
+    try:
+        if not audience_index.ensure_built(current_app.mongo):
+            return _audience_building()
+        conditions = conditions_from_args(request.args)
+        page = audience_index.members(limit=request.args.get('limit', 100, type=int),
+                                      offset=request.args.get('offset', 0, type=int), **conditions)
+        return jsonify({'success': True, 'conditions': conditions, **page})
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error listing segment members: {str(e)}'}), 500
+
+
+@api_bp.route('/analytics/segments/index', methods=['GET'])
+def get_segment_index():
+    """Audience index coverage and per-bitmap sizes"""
+    try:
+        return jsonify({'success': True, 'index': audience_index.stats()})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error reading audience index: {str(e)}'}), 500
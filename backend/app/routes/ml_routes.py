@@ -1,26 +1,46 @@
 from flask import request, jsonify, current_app
 from app.routes import api_bp
+from app.utils.admission import admission
 from app.services.user_service import UserService
+from app.utils.http_cache import conditional, model_version
 
 @api_bp.route('/ml/train', methods=['POST'])
 def train_model():
-    """Train the ML model"""
+    """Start training the ML model in the background; poll GET /ml/train for the result"""
     try:
         user_service = UserService(current_app.mongo)
-        result = user_service.train_ml_model()
-        
-        if result['success']:
-            return jsonify(result)
-        else:
-            return jsonify(result), 400
-            
+        job = user_service.start_training()
+
+        if job is None:
+            return jsonify({
+                'success': False,
+                'message': 'Model training is already running',
+                'job': user_service.get_training_status()
+            }), 409
+        job.pop('_id', None)
+        return jsonify({'success': True, 'message': 'Model training started', 'job': job}), 202
+
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error training model: {str(e)}'
         }), 500
 
+@api_bp.route('/ml/train', methods=['GET'])
+def get_training_status():
+    """Status and result of the latest training run"""
+    try:
+        user_service = UserService(current_app.mongo)
+        return jsonify({'success': True, 'job': user_service.get_training_status()})
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving training status: {str(e)}'
+        }), 500
+
 @api_bp.route('/ml/info', methods=['GET'])
+@conditional(model_version)
 def get_model_info():
     """Get information about the ML model"""
     try:
@@ -39,6 +59,7 @@ def get_model_info():
         }), 500
 
 @api_bp.route('/ml/predict/<user_id>', methods=['POST'])
+@admission.limit('predict')
 def predict_user_interests(user_id):
     """Predict user interests using ML model"""
     try:
@@ -1,7 +1,8 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, Response, stream_with_context
 from app.routes import api_bp
+from app.utils.admission import admission
 from app.services.user_service import UserService
-import uuid
+from app.utils.vocabulary import decode_interaction
 
 @api_bp.route('/users', methods=['POST'])
 def create_user():
@@ -58,6 +59,7 @@ def get_user(user_id):
         }), 500
 
 @api_bp.route('/users/<user_id>/interactions', methods=['POST'])
+@admission.limit('ingest')
 def track_interaction(user_id):
     """Track user interaction for ML analysis"""
     try:
@@ -70,10 +72,6 @@ def track_interaction(user_id):
                 'message': 'Event type is required'
             }), 400
         
-        # Generate session ID if not provided
-        if not data.get('session_id'):
-            data['session_id'] = str(uuid.uuid4())
-        
         user_service = UserService(current_app.mongo)
         result = user_service.track_interaction(user_id, data)
         
@@ -90,19 +88,44 @@ def track_interaction(user_id):
 
 @api_bp.route('/users/<user_id>/interactions', methods=['GET'])
 def get_user_interactions(user_id):
-    """Get user's interaction history"""
+    """Get user's interaction history, newest first.
+
+    Pass the returned ``next_cursor`` back as ``?cursor=`` to continue.
+    ``?format=ndjson`` streams every remaining interaction (or ``limit`` of
+    them) one JSON document per line as the Mongo cursor yields them.
+    """
     try:
-        limit = request.args.get('limit', 100, type=int)
-        
+        cursor = request.args.get('cursor')
         user_service = UserService(current_app.mongo)
-        interactions = user_service.get_user_interactions(user_id, limit)
+
+        if request.args.get('format') == 'ndjson':
+            docs = user_service.iter_interactions(user_id, cursor, request.args.get('limit', 0, type=int))
+            dumps = current_app.json.dumps
+
+            def generate():
+                try:
+                    for doc in docs:
+                        yield dumps(decode_interaction(doc)) + '\n'
+                finally:
+                    docs.close()
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        limit = request.args.get('limit', 100, type=int)
+        interactions, next_cursor = user_service.get_interactions_page(user_id, limit, cursor)
         
         return jsonify({
             'success': True,
             'interactions': interactions,
-            'count': len(interactions)
+            'count': len(interactions),
+            'next_cursor': next_cursor
         })
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -110,6 +133,7 @@ def get_user_interactions(user_id):
         }), 500
 
 @api_bp.route('/users/<user_id>/predict', methods=['POST'])
+@admission.limit('predict')
 def predict_interests(user_id):
     """Predict user interests using ML model"""
     try:
@@ -132,7 +156,8 @@ def get_user_analytics(user_id):
     """Get comprehensive user analytics"""
     try:
         user_service = UserService(current_app.mongo)
-        analytics = user_service.get_user_analytics(user_id)
+        # ?aggregation=python|server overrides USER_AGGREGATION_MODE for comparison
+        analytics = user_service.get_user_analytics(user_id, request.args.get('aggregation'))
         
         if analytics:
             return jsonify({
@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from config import Config
+
+IMPRESSION = 0
+CLICK = 1
+
+# Catalog lookup so events only need to carry the ad id
+AD_CATEGORY_BY_ID = {
+    ad['id']: category
+    for category, ads in Config.AD_CATEGORIES.items()
+    for ad in ads
+}
+
+
+class AdEventLogger:
+    """Buffers ad impressions and clicks and writes them off the request path.
+
+    ``log`` only appends a tuple to a bounded deque, which is atomic and
+    allocation-light, so serving ads pays well under a few microseconds per
+    event. A daemon thread drains the buffer into ``ad_events`` with
+    unordered ``insert_many`` batches. When the buffer is full the oldest
+    events are dropped rather than blocking requests.
+    """
+
+    def __init__(self, flush_interval=None, batch_size=None, max_buffer=None):
+        self.flush_interval = flush_interval or Config.AD_EVENTS_FLUSH_SECONDS
+        self.batch_size = batch_size or Config.AD_EVENTS_BATCH_SIZE
+        self._buffer = deque(maxlen=max_buffer or Config.AD_EVENTS_MAX_BUFFER)
+        self._db = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def attach(self, mongo_db):
+        """Set the database the background flusher writes to"""
+        self._db = mongo_db
+
+    def log(self, kind, user_id, ad_id):
+        self._buffer.append((time.time(), kind, user_id, ad_id))
+        if self._thread is None and self._db is not None:
+            self._start()
+
+    def log_impressions(self, user_id, ads):
+        now = time.time()
+        append = self._buffer.append
+        for ad in ads:
+            append((now, IMPRESSION, user_id, ad['id']))
+        if self._thread is None and self._db is not None:
+            self._start()
+
+    def log_click(self, user_id, ad_id):
+        self.log(CLICK, user_id, ad_id)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ad-events', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Ad event flush failed: {e}")
+
+    def drain(self, max_items=None):
+        """Pop buffered events as compact documents, oldest first"""
+        max_items = max_items or self.batch_size
+        docs = []
+        popleft = self._buffer.popleft
+        while len(docs) < max_items:
+            try:
+                ts, kind, user_id, ad_id = popleft()
+            except IndexError:
+                break
+            docs.append({
+                't': datetime.utcfromtimestamp(ts),
+                'k': kind,
+                'u': user_id,
+                'a': ad_id,
+                'c': AD_CATEGORY_BY_ID.get(ad_id)
+            })
+        return docs
+
+    def flush(self):
+        written = 0
+        while True:
+            docs = self.drain()
+            if not docs:
+                return written
+            self._db.ad_events.insert_many(docs, ordered=False)
+            written += len(docs)
+
+
+def ctr_pipeline(group_field, since, output, run_start):
+    """Upsert per-key CTR rows stamped ``run_start``; rows the run did not touch are stale"""
+    return [
+        {'$match': {'t': {'$gte': since}}},
+        {'$group': {
+            '_id': f'${group_field}',
+            'impressions': {'$sum': {'$cond': [{'$eq': ['$k', IMPRESSION]}, 1, 0]}},
+            'clicks': {'$sum': {'$cond': [{'$eq': ['$k', CLICK]}, 1, 0]}}
+        }},
+        {'$set': {
+            'ctr': {'$cond': [
+                {'$gt': ['$impressions', 0]},
+                {'$divide': ['$clicks', '$impressions']},
+                0
+            ]},
+            'updated_at': run_start
+        }},
+        {'$merge': {'into': output, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ]
+
+
+class CTRTable:
+    """Per-ad and per-category click-through rates held in memory.
+
+    ``aggregate`` rebuilds the ``ad_ctr`` and ``category_ctr`` collections
+    from ``ad_events``, deleting rows for keys with no events left in the
+    window; ``reload`` pulls those small tables into dicts. Rates
+    are smoothed towards the category rate so new ads are not ranked on a
+    handful of impressions.
+    """
+
+    def __init__(self, reload_interval=None, prior_impressions=None):
+        self.reload_interval = reload_interval or Config.CTR_RELOAD_SECONDS
+        self.prior_impressions = prior_impressions or Config.CTR_PRIOR_IMPRESSIONS
+        self.by_ad = {}
+        self.by_category = {}
+        self._loaded_at = 0.0
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def aggregate(self, mongo_db, window_days=None):
+        run_start = datetime.utcnow()
+        since = run_start - timedelta(days=window_days or Config.CTR_WINDOW_DAYS)
+        for group_field, output in (('a', 'ad_ctr'), ('c', 'category_ctr')):
+            mongo_db.ad_events.aggregate(ctr_pipeline(group_field, since, output, run_start))
+            mongo_db[output].delete_many({'updated_at': {'$lt': run_start}})
+
+    def load(self, ad_rows, category_rows):
+        by_ad = {row['_id']: (row['impressions'], row['clicks']) for row in ad_rows}
+        by_category = {row['_id']: row['ctr'] for row in category_rows}
+        self.by_ad, self.by_category = by_ad, by_category
+        self._loaded_at = time.time()
+
+    def reload(self, mongo_db):
+        self.load(mongo_db.ad_ctr.find(), mongo_db.category_ctr.find())
+
+    def begin_reload(self):
+        """Claim the reload slot when the tables are stale"""
+        with self._lock:
+            if self._reloading or time.time() - self._loaded_at < self.reload_interval:
+                return False
+            self._reloading = True
+            return True
+
+    def end_reload(self):
+        self._reloading = False
+
+    def reload_in_background(self, mongo_db):
+        if not self.begin_reload():
+            return
+
+        def run():
+            try:
+                self.reload(mongo_db)
+            except Exception as e:
+                print(f"CTR table reload failed: {e}")
+                self._loaded_at = time.time()
+            finally:
+                self.end_reload()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def ctr(self, ad_id):
+        prior = self.by_category.get(AD_CATEGORY_BY_ID.get(ad_id), 0.0)
+        impressions, clicks = self.by_ad.get(ad_id, (0, 0))
+        return (clicks + prior * self.prior_impressions) / (impressions + self.prior_impressions)
+
+    def rank(self, ads):
+        """Order ads by smoothed CTR, keeping catalog order for ties"""
+        if not self.by_ad:
+            return ads
+        return sorted(ads, key=lambda ad: self.ctr(ad['id']), reverse=True)
+
+
+ad_event_logger = AdEventLogger()
+ctr_table = CTRTable()
@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from config import Config
+from app.utils.vocabulary import CATEGORY_AD, INTEREST_AD, categories
+
+
+def ad_category_for(content_category):
+    """Map an interaction's content category (code or name) onto an ad category, if any"""
+    return CATEGORY_AD[categories.encode(content_category)]
+
+
+def ad_category_for_interest(interest):
+    """Ad category for a model interest, e.g. 'tech' -> 'technology'"""
+    return INTEREST_AD.get(interest, interest)
+
+
+class PopularitySlate:
+    """Precomputed, popularity-ranked ad slate for users without a prediction.
+
+    A refresh counts recent engagement per ad category and ranks the catalog
+    by it, then precomputes a fixed number of lightly shuffled variants.
+    Serving picks a variant from a hash of the user id, so each visitor sees
+    a stable slate and the request path is a list slice.
+    """
+
+    REASON = 'Popular right now'
+
+    def __init__(self, refresh_interval=None, window_days=None, variants=None):
+        self.refresh_interval = refresh_interval or Config.SLATE_REFRESH_SECONDS
+        self.window_days = window_days or Config.SLATE_WINDOW_DAYS
+        self.n_variants = variants or Config.SLATE_VARIANTS
+        self._refreshing = False
+        self._lock = threading.Lock()
+        # Catalog order until the first refresh has real engagement to rank by
+        self.load([])
+        self._refreshed_at = 0.0
+
+    def popularity_pipeline(self):
+        since = datetime.utcnow() - timedelta(days=self.window_days)
+        return [
+            {'$match': {'timestamp': {'$gte': since}}},
+            {'$group': {'_id': '$content_category', 'count': {'$sum': 1}}}
+        ]
+
+    def load(self, category_counts):
+        """Rebuild the slate variants from ``[{'_id': category, 'count': n}]`` rows"""
+        scores = {category: 0 for category in Config.AD_CATEGORIES}
+        for row in category_counts:
+            category = ad_category_for(row['_id'])
+            if category in scores:
+                scores[category] += row['count']
+
+        ranked = []
+        for position, category in enumerate(sorted(scores, key=scores.get, reverse=True)):
+            for ad in Config.AD_CATEGORIES[category]:
+                ranked.append((scores[category], position, dict(
+                    ad, recommendation_reason=self.REASON, confidence_score=0.0
+                )))
+
+        # Variant 0 is the pure ranking; the rest add seeded noise scaled to
+        # the score spread so popular ads still tend to lead
+        spread = max((score for score, _, _ in ranked), default=0) or 1
+        variants = [[ad for _, _, ad in ranked]]
+        for seed in range(1, self.n_variants):
+            rng = random.Random(seed)
+            noisy = sorted(ranked, key=lambda item: item[0] + rng.random() * spread, reverse=True)
+            variants.append([ad for _, _, ad in noisy])
+
+        self._variants = variants
+        self._refreshed_at = time.time()
+
+    def is_stale(self):
+        return time.time() - self._refreshed_at >= self.refresh_interval
+
+    def begin_refresh(self):
+        """Claim the refresh slot; returns False if one is already running"""
+        with self._lock:
+            if self._refreshing or not self.is_stale():
+                return False
+            self._refreshing = True
+            return True
+
+    def end_refresh(self, category_counts=None):
+        try:
+            if category_counts is not None:
+                self.load(category_counts)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh_in_background(self, mongo_db):
+        if not self.begin_refresh():
+            return
+
+        def run():
+            rows = None
+            try:
+                rows = list(mongo_db.interactions.aggregate(self.popularity_pipeline()))
+            except Exception as e:
+                print(f"Popularity slate refresh failed: {e}")
+            finally:
+                self.end_refresh(rows)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, user_id, limit=3):
+        variants = self._variants
+        variant = variants[zlib.crc32(user_id.encode()) % len(variants)]
+        return [dict(ad) for ad in variant[:limit]]
+
+
+popularity_slate = PopularitySlate()
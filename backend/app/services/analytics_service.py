@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.utils import vocabulary
+from app.utils.tracing import tracer
+
+# Shared by all requests; each dashboard load uses at most a few slots
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='analytics')
+
+
+def _first_count(facet_rows):
+    return facet_rows[0]['n'] if facet_rows else 0
+
+
+def users_overview_pipeline(week_ago):
+    return [
+        {'$facet': {
+            'total': [{'$count': 'n'}],
+            'recent': [{'$match': {'created_at': {'$gte': week_ago}}}, {'$count': 'n'}]
+        }}
+    ]
+
+
+def predictions_overview_pipeline():
+    return [
+        {'$facet': {
+            'total': [{'$count': 'n'}],
+            'interest_distribution': [
+                {'$group': {'_id': '$primary_interest', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1}}
+            ]
+        }}
+    ]
+
+
+def interactions_overview_pipeline(week_ago):
+    # $match first so only the window is read, through the timestamp index
+    return [
+        {'$match': {'timestamp': {'$gte': week_ago}}},
+        {'$facet': {
+            'recent': [{'$count': 'n'}],
+            'daily': [
+                {'$group': {
+                    '_id': {'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}}},
+                    'count': {'$sum': 1}
+                }},
+                {'$sort': {'_id.date': -1}},
+                {'$limit': 7}
+            ]
+        }}
+    ]
+
+
+def build_overview(total_interactions, users_facet, predictions_facet, interactions_facet):
+    return {
+        'total_users': _first_count(users_facet['total']),
+        'total_interactions': total_interactions,
+        'total_predictions': _first_count(predictions_facet['total']),
+        'recent_users': _first_count(users_facet['recent']),
+        'recent_interactions': _first_count(interactions_facet['recent']),
+        'interest_distribution': predictions_facet['interest_distribution'],
+        'daily_interactions': interactions_facet['daily']
+    }
+
+
+# Latest documents shown on the dashboards; fetched with an indexed find, since
+# stages inside $facet cannot use indexes
+RECENT_PREDICTIONS = 10
+RECENT_INTERACTIONS = 20
+
+
+def window_query(since):
+    return {'timestamp': {'$gte': since}} if since is not None else {}
+
+
+def interests_pipeline():
+    # One $group yields both the distribution and the confidence table
+    return [
+        {'$group': {
+            '_id': '$primary_interest',
+            'avg_confidence': {'$avg': '$confidence'},
+            'count': {'$sum': 1}
+        }}
+    ]
+
+
+def build_interest_analytics(by_interest, recent_predictions):
+    return {
+        'interest_distribution': [
+            {'_id': row['_id'], 'count': row['count']}
+            for row in sorted(by_interest, key=lambda r: r['count'], reverse=True)
+        ],
+        'confidence_by_interest': sorted(
+            by_interest, key=lambda r: r['avg_confidence'] or 0, reverse=True
+        ),
+        'recent_predictions': recent_predictions
+    }
+
+
+def interactions_pipeline(since=None):
+    pipeline = []
+    if since is not None:
+        pipeline.append({'$match': {'timestamp': {'$gte': since}}})
+    pipeline.append({'$facet': {
+        'event_distribution': [
+            {'$group': {'_id': '$event_type', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}}
+        ],
+        'category_distribution': [
+            {'$group': {'_id': '$content_category', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}}
+        ],
+        'hourly_pattern': [
+            {'$group': {'_id': {'$hour': '$timestamp'}, 'count': {'$sum': 1}}},
+            {'$sort': {'_id': 1}}
+        ]
+    }})
+    return pipeline
+
+
+def _decoded_distribution(rows, vocab):
+    counts = {}
+    for row in rows:
+        name = vocab.decode(row['_id'])
+        counts[name] = counts.get(name, 0) + row['count']
+    return [{'_id': name, 'count': count} for name, count in sorted(counts.items(), key=lambda x: x[1], reverse=True)]
+
+
+def build_interaction_analytics(facet, recent_interactions):
+    """Replace vocabulary codes in the interactions facet with names"""
+    return dict(
+        facet,
+        event_distribution=_decoded_distribution(facet['event_distribution'], vocabulary.event_types),
+        category_distribution=_decoded_distribution(facet['category_distribution'], vocabulary.categories),
+        recent_interactions=[vocabulary.decode_interaction(doc) for doc in recent_interactions]
+    )
+
+
+def window_start(days):
+    return datetime.utcnow() - timedelta(days=days) if days else None
+
+
+@tracer.traced_methods()
+class AnalyticsService:
+    """System-wide dashboard queries, one aggregation per collection.
+
+    The pipeline builders above are shared with the async routes; this class
+    runs them on pymongo, issuing the per-collection queries concurrently.
+    """
+
+    def __init__(self, mongo_db):
+        self.db = mongo_db
+
+    def _aggregate_one(self, collection, pipeline):
+        return next(collection.aggregate(pipeline))
+
+    def get_overview(self):
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        futures = [
+            _executor.submit(self.db.interactions.estimated_document_count),
+            _executor.submit(self._aggregate_one, self.db.users, users_overview_pipeline(week_ago)),
+            _executor.submit(self._aggregate_one, self.db.predictions, predictions_overview_pipeline()),
+            _executor.submit(self._aggregate_one, self.db.interactions, interactions_overview_pipeline(week_ago))
+        ]
+        return build_overview(*(f.result() for f in futures))
+
+    def _latest(self, collection, query, limit):
+        return list(collection.find(query).sort('timestamp', -1).limit(limit))
+
+    def get_interest_analytics(self):
+        day_ago = datetime.utcnow() - timedelta(days=1)
+        by_interest = _executor.submit(lambda: list(self.db.predictions.aggregate(interests_pipeline())))
+        recent = _executor.submit(self._latest, self.db.predictions, window_query(day_ago), RECENT_PREDICTIONS)
+        return build_interest_analytics(by_interest.result(), recent.result())
+
+    def get_interaction_analytics(self, days=None):
+        since = window_start(days)
+        facet = _executor.submit(self._aggregate_one, self.db.interactions, interactions_pipeline(since))
+        recent = _executor.submit(self._latest, self.db.interactions, window_query(since), RECENT_INTERACTIONS)
+        return build_interaction_analytics(facet.result(), recent.result())
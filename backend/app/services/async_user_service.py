@@ -0,0 +1,285 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.services.user_service import UserService
+from app.services.compaction_service import InteractionCompactor, user_summary_pipeline
+from app.services.ad_slate import popularity_slate
+from app.services.ad_events import ctr_table
+from app.services.dirty_tracker import dirty_users
+from app.services.sessionizer import sessionizer, session_stats
+from app.services.training_jobs import training_job
+from app.services import interest_profile, user_aggregates
+from app.services.item_similarity import related_ads, related_items
+from app.utils import vocabulary
+from app.utils.admission import admission
+from app.utils.pagination import KEYSET_SORT, encode_cursor, keyset_query
+from app.utils.tracing import tracer
+from config import Config
+
+# The event loop only holds weak references to tasks, so fire-and-forget
+# work is kept here until it finishes
+_background_tasks = set()
+
+
+def spawn(coro):
+    """Run ``coro`` as a background task that cannot be garbage-collected mid-flight"""
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+@tracer.traced_methods()
+class AsyncUserService:
+    """Coroutine counterpart of UserService backed by a Motor database.
+
+    Ad selection, analytics shaping and the model are shared with the
+    synchronous service; only the Mongo round trips differ. Queries that do
+    not depend on each other are issued together with ``asyncio.gather``.
+    """
+
+    def __init__(self, mongo_db):
+        self.db = mongo_db
+        # Reuses the sync service for pure logic; it never touches self.db here
+        self._sync = UserService(None)
+        self.ml_classifier = self._sync.ml_classifier
+
+    async def create_user(self, user_data):
+        user_id = str(uuid.uuid4())
+        user = {
+            'user_id': user_id,
+            'email': user_data.get('email'),
+            'name': user_data.get('name', 'Demo User'),
+            'created_at': datetime.utcnow(),
+            'last_active': datetime.utcnow(),
+            'preferences': {},
+            'is_demo_user': True
+        }
+        result = await self.db.users.insert_one(user)
+        return {'success': True, 'user_id': user_id, 'message': 'User created successfully'} if result.inserted_id else {'success': False, 'message': 'Failed to create user'}
+
+    async def get_user(self, user_id):
+        return await self.db.users.find_one({'user_id': user_id})
+
+    async def track_interaction(self, user_id, interaction_data):
+        # Stored as vocabulary codes (unknown values as strings); names are restored at the API boundary
+        category = vocabulary.categories.store(interaction_data.get('content_category'))
+
+        now = datetime.utcnow()
+        duration = interaction_data.get('duration', 0)
+        session_id = sessionizer.assign(user_id, now, interaction_data.get('session_id'),
+                                        vocabulary.categories.decode(category), duration)
+        interaction = {
+            'user_id': user_id,
+            'session_id': session_id,
+            'event_type': vocabulary.event_types.store(interaction_data.get('event_type')),
+            'content_category': category,
+            'content_id': interaction_data.get('content_id'),
+            'duration': duration,
+            'timestamp': now,
+            'metadata': interaction_data.get('metadata', {})
+        }
+        result, _ = await asyncio.gather(
+            self.db.interactions.insert_one(interaction),
+            self.db.users.update_one({'user_id': user_id}, interest_profile.activity_update(
+                category, interaction['event_type'], duration, now))
+        )
+        if result.inserted_id:
+            dirty_users.mark(user_id)
+            return {'success': True, 'interaction_id': str(result.inserted_id),
+                    'normalized': vocabulary.normalized_fields(interaction_data, interaction),
+                    'message': 'Interaction tracked successfully'}
+        return {'success': False, 'message': 'Failed to track interaction'}
+
+    async def get_user_interactions(self, user_id, limit=100, since=None):
+        query = user_aggregates.user_history_match(user_id, since)
+        cursor = self.db.interactions.find(query).sort('timestamp', -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def compacted_until(self):
+        if not Config.INTERACTIONS_RETENTION_DAYS:
+            return None
+        state = await self.db.compaction_state.find_one({'_id': InteractionCompactor.STATE_ID})
+        return state.get('watermark') if state else None
+
+    async def get_interactions_page(self, user_id, limit=100, cursor=None):
+        limit = max(1, min(limit, Config.INTERACTIONS_MAX_PAGE))
+        query = keyset_query({'user_id': user_id}, cursor)
+        docs = await self.db.interactions.find(query).sort(KEYSET_SORT).limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return [vocabulary.decode_interaction(doc) for doc in docs[:limit]], next_cursor
+
+    def iter_interactions(self, user_id, cursor=None, limit=0):
+        query = keyset_query({'user_id': user_id}, cursor)
+        return (self.db.interactions.find(query).sort(KEYSET_SORT)
+                .limit(limit).batch_size(Config.INTERACTIONS_STREAM_BATCH))
+
+    async def _aggregate_one(self, collection, pipeline):
+        return (await collection.aggregate(pipeline).to_list(length=1))[0]
+
+    async def get_feature_records(self, user_id, aggregation=None):
+        since = await self.compacted_until()
+        if self._sync._server_side(aggregation):
+            facet = await self._aggregate_one(self.db.interactions,
+                                              user_aggregates.user_features_pipeline(user_id, since=since))
+            return user_aggregates.feature_records_from_facet(facet)
+        return await self.get_user_interactions(user_id, limit=500, since=since), None
+
+    async def get_user_activity(self, user_id, aggregation=None):
+        since = await self.compacted_until()
+        if self._sync._server_side(aggregation):
+            facet = await self._aggregate_one(self.db.interactions,
+                                              user_aggregates.user_activity_pipeline(user_id, since=since))
+            return user_aggregates.activity_from_facet(facet)
+        interactions = await self.get_user_interactions(user_id, limit=1000, since=since)
+        return user_aggregates.activity_from_interactions(interactions)
+
+    async def predict_user_interests(self, user_id, aggregation=None):
+        (interactions, window_stats), user = await asyncio.gather(
+            self.get_feature_records(user_id, aggregation),
+            self.db.users.find_one({'user_id': user_id}, {'total_sessions': 1, 'total_session_duration': 1})
+        )
+        if not interactions:
+            interactions = await self.get_user_summary(user_id)
+        if not interactions:
+            return {'success': False, 'message': 'No interaction data available for prediction'}
+        try:
+            # The model is CPU bound; keep it off the event loop
+            stats = session_stats(user, sessionizer.open_session(user_id))
+            if not stats['total_sessions'] and window_stats:
+                stats = window_stats
+            prediction = await asyncio.to_thread(self.ml_classifier.predict_user_interests, interactions, stats)
+            prediction_record = {
+                'user_id': user_id,
+                'primary_interest': prediction['primary_interest'],
+                'interest_scores': prediction['interest_scores'],
+                'confidence': prediction['confidence'],
+                'features_used': prediction['features_used'],
+                'timestamp': datetime.utcnow(),
+                'model_version': Config.ML_MODEL_VERSION
+            }
+            await self.db.predictions.update_one({'user_id': user_id}, {'$set': prediction_record}, upsert=True)
+            return {'success': True, 'prediction': prediction, 'message': 'Interest prediction completed'}
+        except Exception as e:
+            return {'success': False, 'message': f'Prediction failed: {str(e)}'}
+
+    async def has_interactions(self, user_id):
+        projection = {'_id': 0, 'user_id': 1}
+        if await self.db.interactions.find_one({'user_id': user_id}, projection):
+            return True
+        if Config.INTERACTIONS_RETENTION_DAYS:
+            return await self.db.interaction_summaries.find_one({'user_id': user_id}, projection) is not None
+        return False
+
+    async def get_interest_profile(self, user_id):
+        projection = interest_profile.profile_projection()
+        if projection is None:
+            return None
+        user = await self.db.users.find_one({'user_id': user_id}, projection)
+        return (user or {}).get(interest_profile.FIELD)
+
+    async def get_recommended_ads(self, user_id, limit=3, inline_predict=True):
+        if ctr_table.begin_reload():
+            spawn(self._reload_ctr())
+        prediction, profile, has_interactions = await asyncio.gather(
+            self.db.predictions.find_one({'user_id': user_id}),
+            self.get_interest_profile(user_id),
+            self.has_interactions(user_id)
+        )
+        if not prediction and profile:
+            return self._sync.select_ads(interest_profile.blend(profile), limit)
+        if not prediction:
+            if not inline_predict or not has_interactions:
+                return self.get_popular_ads(user_id, limit)
+            with admission.slot('predict') as slot:
+                if not slot.admitted:
+                    return self.get_popular_ads(user_id, limit)
+                prediction_result = await self.predict_user_interests(user_id)
+                if not prediction_result['success']:
+                    slot.fail()
+            if not prediction_result['success']:
+                return self.get_popular_ads(user_id, limit)
+            prediction = prediction_result['prediction']
+        return self._sync.select_ads(interest_profile.blend(profile, prediction), limit)
+
+    async def get_related(self, user_id, limit=10, ad_limit=3):
+        recent = await self.db.interactions.find(
+            {'user_id': user_id, 'content_id': {'$ne': None}}, {'_id': 0, 'content_id': 1}
+        ).sort('timestamp', -1).to_list(length=Config.SIMILARITY_RECENT_ITEMS)
+        seen = {row['content_id'] for row in recent}
+        docs = await self.db.content_neighbors.find({'_id': {'$in': list(seen)}}).to_list(length=None)
+        items = related_items(docs, seen, limit)
+        return {'content': items, 'ads': related_ads(items, ad_limit)}
+
+    def get_popular_ads(self, user_id, limit=3):
+        if popularity_slate.begin_refresh():
+            spawn(self._refresh_slate())
+        return popularity_slate.get(user_id, limit)
+
+    async def _reload_ctr(self):
+        try:
+            ad_rows, category_rows = await asyncio.gather(
+                self.db.ad_ctr.find().to_list(length=None),
+                self.db.category_ctr.find().to_list(length=None)
+            )
+            ctr_table.load(ad_rows, category_rows)
+        except Exception as e:
+            print(f"CTR table reload failed: {e}")
+            ctr_table._loaded_at = time.time()
+        finally:
+            ctr_table.end_reload()
+
+    async def _refresh_slate(self):
+        rows = None
+        try:
+            rows = await self.db.interactions.aggregate(popularity_slate.popularity_pipeline()).to_list(length=None)
+        except Exception as e:
+            print(f"Popularity slate refresh failed: {e}")
+        finally:
+            popularity_slate.end_refresh(rows)
+
+    def get_random_ads(self, limit=3):
+        return self._sync.get_random_ads(limit)
+
+    async def get_user_analytics(self, user_id, aggregation=None):
+        user, activity, prediction, summary = await asyncio.gather(
+            self.get_user(user_id),
+            self.get_user_activity(user_id, aggregation),
+            self.db.predictions.find_one({'user_id': user_id}),
+            self.get_user_summary(user_id)
+        )
+        if not user:
+            return None
+        return self._sync.build_user_analytics(user_id, user, activity, prediction, summary)
+
+    async def get_user_summary(self, user_id):
+        return await self.db.interaction_summaries.aggregate(user_summary_pipeline(user_id)).to_list(length=None)
+
+    async def train_ml_model(self):
+        return await asyncio.to_thread(self._sync.train_ml_model)
+
+    async def start_training(self):
+        query, update = training_job.claim(datetime.utcnow())
+        try:
+            job = await self.db.training_jobs.find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            return None
+        spawn(self._run_training())
+        return job
+
+    async def _run_training(self):
+        try:
+            result = await self.train_ml_model()
+        except Exception as e:
+            result = {'success': False, 'message': f'Model training failed: {str(e)}'}
+        await self.db.training_jobs.update_one(*training_job.finish(result))
+
+    async def get_training_status(self):
+        return await self.db.training_jobs.find_one({'_id': training_job.JOB_ID}, {'_id': 0}) or {'status': 'idle'}
+
+    def get_model_info(self):
+        return self._sync.get_model_info()
@@ -0,0 +1,320 @@
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import reduce
+
+import numpy as np
+
+from config import Config
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # pragma: no cover - pyroaring is optional
+    BitMap = None
+
+# Set bits per byte value, for counting DenseBitmap members
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+class DenseBitmap:
+    """Uncompressed bitmap over a numpy byte array, used when pyroaring is not installed.
+
+    Supports the subset of ``pyroaring.BitMap`` the audience index uses:
+    ``add``, ``discard``, ``&``, ``|``, ``-``, ``len`` and ascending
+    iteration. One bit per dense user id, so a million users cost 125 KB
+    per bitmap whatever their density.
+    """
+
+    __slots__ = ('bits',)
+
+    def __init__(self, values=(), bits=None):
+        self.bits = bits if bits is not None else np.zeros(0, dtype=np.uint8)
+        for value in values:
+            self.add(value)
+
+    def _grow(self, size):
+        if size > len(self.bits):
+            self.bits = np.concatenate([self.bits, np.zeros(max(size, 2 * len(self.bits)) - len(self.bits), dtype=np.uint8)])
+
+    def add(self, value):
+        self._grow((value >> 3) + 1)
+        self.bits[value >> 3] |= 1 << (value & 7)
+
+    def discard(self, value):
+        if (value >> 3) < len(self.bits):
+            self.bits[value >> 3] &= ~np.uint8(1 << (value & 7))
+
+    def _aligned(self, other):
+        size = max(len(self.bits), len(other.bits))
+        return (np.pad(self.bits, (0, size - len(self.bits))), np.pad(other.bits, (0, size - len(other.bits))))
+
+    def __and__(self, other):
+        size = min(len(self.bits), len(other.bits))
+        return DenseBitmap(bits=self.bits[:size] & other.bits[:size])
+
+    def __or__(self, other):
+        a, b = self._aligned(other)
+        return DenseBitmap(bits=a | b)
+
+    def __sub__(self, other):
+        a, b = self._aligned(other)
+        return DenseBitmap(bits=(a & ~b)[:len(self.bits)])
+
+    def __len__(self):
+        return int(_POPCOUNT[self.bits].sum())
+
+    def __iter__(self):
+        return iter(np.flatnonzero(np.unpackbits(self.bits, bitorder='little')).tolist())
+
+
+Bitmap = BitMap or DenseBitmap
+
+
+def union(bitmaps):
+    return reduce(lambda a, b: a | b, bitmaps, Bitmap())
+
+
+class AudienceIndex:
+    """In-memory bitmap index for audience segment counts and member lists.
+
+    Every user gets a dense integer id the first time the index sees them.
+    Bitmaps over those ids are kept per primary interest, per confidence
+    bucket (``buckets`` equal slices of [0, 1]) and per UTC day of last
+    activity, each user sitting in exactly one bitmap of each kind. A segment
+    is the AND of the OR over the requested interests, the buckets above the
+    confidence floor and the last ``active_days`` days, so a query touches a
+    few dozen bitmaps however many users match. The bucket holding the floor
+    itself is filtered against each user's exact confidence.
+
+    ``refresh`` applies predictions and ``users.last_active`` changes since
+    the previous watermark, moving each changed user between bitmaps; only
+    the first run reads everything. Day bitmaps older than ``max_days`` are
+    dropped as they age out.
+    """
+
+    def __init__(self, refresh_interval=None, buckets=None, max_days=None):
+        self.refresh_interval = refresh_interval or Config.AUDIENCE_REFRESH_SECONDS
+        self.n_buckets = buckets or Config.AUDIENCE_CONFIDENCE_BUCKETS
+        self.max_days = max_days or Config.AUDIENCE_MAX_WINDOW_DAYS
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refreshed_at = 0.0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.ids = {}
+            self.user_ids = []
+            self.interests = {}
+            self.buckets = [Bitmap() for _ in range(self.n_buckets)]
+            self.days = {}
+            self._segment_of = []  # dense id -> (interest, bucket) or None
+            self._confidence_of = []  # dense id -> confidence of the latest prediction
+            self._day_of = []  # dense id -> day ordinal or None
+            self.watermark = None
+
+    @property
+    def is_built(self):
+        return self.watermark is not None
+
+    def dense_id(self, user_id):
+        uid = self.ids.get(user_id)
+        if uid is None:
+            uid = self.ids[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self._segment_of.append(None)
+            self._confidence_of.append(0.0)
+            self._day_of.append(None)
+        return uid
+
+    def bucket(self, confidence):
+        return min(int((confidence or 0.0) * self.n_buckets), self.n_buckets - 1)
+
+    def set_prediction(self, user_id, interest, confidence):
+        uid = self.dense_id(user_id)
+        self._confidence_of[uid] = confidence or 0.0
+        segment = (interest, self.bucket(confidence))
+        previous = self._segment_of[uid]
+        if previous == segment:
+            return
+        if previous is not None:
+            self.interests[previous[0]].discard(uid)
+            self.buckets[previous[1]].discard(uid)
+        self.interests.setdefault(interest, Bitmap()).add(uid)
+        self.buckets[segment[1]].add(uid)
+        self._segment_of[uid] = segment
+
+    def set_active(self, user_id, when):
+        uid = self.dense_id(user_id)
+        day = when.toordinal()
+        previous = self._day_of[uid]
+        if previous is not None and previous >= day:
+            return
+        if previous in self.days:
+            self.days[previous].discard(uid)
+        self.days.setdefault(day, Bitmap()).add(uid)
+        self._day_of[uid] = day
+
+    def _expire_days(self, today):
+        for day in [day for day in self.days if day <= today - self.max_days]:
+            del self.days[day]
+
+    def prediction_query(self, since, until):
+        match = {'timestamp': {'$lte': until}}
+        if since is not None:
+            match['timestamp']['$gt'] = since
+        return match, {'_id': 0, 'user_id': 1, 'primary_interest': 1, 'confidence': 1}
+
+    def activity_query(self, since, until):
+        match = {'last_active': {'$lte': until}}
+        # The first build only needs users recent enough to fall in a window
+        match['last_active']['$gt'] = since if since is not None else until - timedelta(days=self.max_days)
+        return match, {'_id': 0, 'user_id': 1, 'last_active': 1}
+
+    def apply(self, predictions, activity, until, chunk=1000):
+        """Fold prediction and activity rows into the bitmaps and advance the watermark"""
+        for rows, apply_row in ((predictions, self._apply_prediction), (activity, self._apply_activity)):
+            rows = iter(rows)
+            while True:
+                batch = list(itertools.islice(rows, chunk))
+                if not batch:
+                    break
+                # Queries wait at most one chunk for a consistent view
+                with self._lock:
+                    for row in batch:
+                        apply_row(row)
+        with self._lock:
+            self._expire_days(until.toordinal())
+            self.watermark = until
+        self._refreshed_at = time.time()
+
+    def _apply_prediction(self, row):
+        if row.get('primary_interest') is not None:
+            self.set_prediction(row['user_id'], row['primary_interest'], row.get('confidence'))
+
+    def _apply_activity(self, row):
+        if row.get('last_active') is not None:
+            self.set_active(row['user_id'], row['last_active'])
+
+    def refresh(self, mongo_db, full=False):
+        if full:
+            self.reset()
+        since, until = self.watermark, datetime.utcnow()
+        started = time.perf_counter()
+        predictions = mongo_db.predictions.find(*self.prediction_query(since, until))
+        activity = mongo_db.users.find(*self.activity_query(since, until))
+        self.apply(predictions, activity, until)
+        return {'success': True, 'users': len(self.user_ids), 'watermark': until,
+                'seconds': round(time.perf_counter() - started, 3),
+                'message': f'Audience index covers {len(self.user_ids)} users'}
+
+    def begin_refresh(self):
+        """Claim the refresh slot when the index is stale"""
+        with self._lock:
+            if self._refreshing or time.time() - self._refreshed_at < self.refresh_interval:
+                return False
+            self._refreshing = True
+            return True
+
+    def end_refresh(self):
+        self._refreshing = False
+
+    def refresh_in_background(self, mongo_db):
+        if not self.begin_refresh():
+            return
+
+        def run():
+            try:
+                self.refresh(mongo_db)
+            except Exception as e:
+                print(f"Audience index refresh failed: {e}")
+                self._refreshed_at = time.time()
+            finally:
+                self.end_refresh()
+
+        threading.Thread(target=run, name='audience-index', daemon=True).start()
+
+    def ensure_built(self, mongo_db):
+        """Build the index on first use; afterwards refresh it in the background when stale.
+
+        Returns False while another request is doing the first build.
+        """
+        if self.is_built:
+            self.refresh_in_background(mongo_db)
+            return True
+        if not self.begin_refresh():
+            return self.is_built
+        try:
+            self.refresh(mongo_db)
+        finally:
+            self.end_refresh()
+        return True
+
+    def segment(self, interests=None, min_confidence=None, active_days=None):
+        """Bitmap of users matching every given condition.
+
+        ``interests`` are OR-ed. ``min_confidence`` is exact: buckets above
+        it match whole and the bucket containing it is filtered user by user.
+        ``active_days`` covers today and the previous ``active_days - 1`` UTC days.
+        """
+        if active_days is not None and not 0 < active_days <= self.max_days:
+            raise ValueError(f'active_days must be between 1 and {self.max_days}')
+        with self._lock:
+            parts = []
+            if interests:
+                parts.append(union(self.interests[i] for i in interests if i in self.interests))
+            if min_confidence is not None:
+                floor = self.bucket(min_confidence)
+                boundary = Bitmap(uid for uid in self.buckets[floor] if self._confidence_of[uid] >= min_confidence)
+                parts.append(union([boundary] + self.buckets[floor + 1:]))
+            if active_days is not None:
+                today = datetime.utcnow().toordinal()
+                parts.append(union(b for day, b in self.days.items() if day > today - active_days))
+            if not parts:
+                parts.append(union(list(self.interests.values()) + list(self.days.values())))
+            return reduce(lambda a, b: a & b, parts)
+
+    def size(self, **conditions):
+        started = time.perf_counter()
+        size = len(self.segment(**conditions))
+        return {'size': size, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)}
+
+    def members(self, limit=100, offset=0, **conditions):
+        """One page of matching user ids, in dense id order"""
+        limit = max(1, min(limit, Config.AUDIENCE_MAX_MEMBERS))
+        offset = max(0, offset)
+        started = time.perf_counter()
+        bitmap = self.segment(**conditions)
+        ids = list(itertools.islice(iter(bitmap), offset, offset + limit))
+        return {
+            'size': len(bitmap),
+            'user_ids': [self.user_ids[uid] for uid in ids],
+            'next_offset': offset + len(ids) if offset + len(ids) < len(bitmap) else None,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self.user_ids),
+                'backend': type(self.buckets[0]).__name__,
+                'interests': {interest: len(b) for interest, b in self.interests.items()},
+                'confidence_buckets': [len(b) for b in self.buckets],
+                'active_days': len(self.days),
+                'watermark': self.watermark
+            }
+
+
+def conditions_from_args(args):
+    """Segment conditions from query parameters: ``interest`` (comma-separated, OR-ed),
+    ``min_confidence`` and ``active_days``"""
+    interests = [i.strip() for i in (args.get('interest') or '').split(',') if i.strip()]
+    return {
+        'interests': interests or None,
+        'min_confidence': args.get('min_confidence', type=float),
+        'active_days': args.get('active_days', type=int)
+    }
+
+
+audience_index = AudienceIndex()
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from config import Config
+from app.utils.storage import SUMMARY_KEY
+
+
+class InteractionCompactor:
+    """Folds raw interactions into per-user, per-day summary documents.
+
+    Each run summarises the whole days between the stored watermark and
+    ``retention - lead`` days ago into ``interaction_summaries``, then moves
+    the watermark. Summary rows of those days are recomputed and replaced,
+    not added to, so a run that dies before moving the watermark can simply
+    be repeated; runs also claim the state document first, so two never
+    overlap.
+
+    On a plain collection raw events are only deleted once compacted, so
+    every event is counted exactly once whatever the schedule. Time-series
+    collections expire raw events by TTL whether or not they were
+    compacted, so ``flask compact-interactions`` must run at least every
+    ``lead + COMPACTION_TS_MARGIN_DAYS`` days (daily is the intended
+    schedule) or uncompacted days are lost.
+    """
+
+    STATE_ID = 'interactions'
+
+    def __init__(self, mongo_db, retention_days=None, lead_days=None, timeseries=None):
+        self.db = mongo_db
+        self.retention_days = Config.INTERACTIONS_RETENTION_DAYS if retention_days is None else retention_days
+        self.lead_days = Config.COMPACTION_LEAD_DAYS if lead_days is None else lead_days
+        self.timeseries = Config.INTERACTIONS_TIMESERIES if timeseries is None else timeseries
+
+    def _cutoff(self, now):
+        keep_days = max(self.retention_days - self.lead_days, 0)
+        cutoff = now - timedelta(days=keep_days)
+        return cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def get_watermark(self):
+        state = self.db.compaction_state.find_one({'_id': self.STATE_ID})
+        return state.get('watermark') if state else None
+
+    def compacted_until(self):
+        """Watermark raw history is read from: earlier events are already in the summaries"""
+        if not self.retention_days:
+            return None
+        return self.get_watermark()
+
+    def summary_pipeline(self, start, end):
+        match = {'$lt': end}
+        if start is not None:
+            match['$gte'] = start
+        return [
+            {'$match': {'timestamp': match}},
+            {'$group': {
+                '_id': {
+                    'user_id': '$user_id',
+                    'day': {'$dateTrunc': {'date': '$timestamp', 'unit': 'day'}},
+                    'content_category': {'$ifNull': ['$content_category', 0]},
+                    'event_type': {'$ifNull': ['$event_type', 0]}
+                },
+                'count': {'$sum': 1},
+                'duration': {'$sum': {'$ifNull': ['$duration', 0]}}
+            }},
+            {'$project': dict(
+                {key: f'$_id.{key}' for key in SUMMARY_KEY},
+                _id=0, count=1, duration=1
+            )},
+            {'$merge': {
+                'into': 'interaction_summaries',
+                'on': SUMMARY_KEY,
+                # Each day in the window is recomputed whole, so replacing is idempotent
+                'whenMatched': 'replace',
+                'whenNotMatched': 'insert'
+            }}
+        ]
+
+    def compact(self, now=None):
+        """Summarise newly eligible days and expire raw events past retention"""
+        if not self.retention_days:
+            return {'success': True, 'compacted_until': None, 'deleted': 0,
+                    'message': 'Retention disabled, nothing to compact'}
+
+        now = now or datetime.utcnow()
+        if not self._claim(now):
+            return {'success': False, 'compacted_until': self.get_watermark(), 'deleted': 0,
+                    'message': 'Another compaction run is in progress'}
+        try:
+            watermark = self.get_watermark()
+            cutoff = self._cutoff(now)
+            if watermark is None or cutoff > watermark:
+                self.db.interactions.aggregate(self.summary_pipeline(watermark, cutoff))
+                self.db.compaction_state.update_one(
+                    {'_id': self.STATE_ID},
+                    {'$set': {'watermark': cutoff, 'updated_at': now}},
+                    upsert=True
+                )
+                watermark = cutoff
+            deleted = self._expire(now, watermark)
+        finally:
+            self.db.compaction_state.update_one({'_id': self.STATE_ID}, {'$unset': {'running_since': ''}})
+
+        return {'success': True, 'compacted_until': watermark, 'deleted': deleted,
+                'message': 'Interactions compacted successfully'}
+
+    def _claim(self, now):
+        """Mark a run in progress; False if another live run holds the claim"""
+        stale = now - timedelta(seconds=Config.COMPACTION_STALE_SECONDS)
+        try:
+            self.db.compaction_state.update_one(
+                {'_id': self.STATE_ID, '$or': [{'running_since': None}, {'running_since': {'$lt': stale}}]},
+                {'$set': {'running_since': now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def _expire(self, now, watermark):
+        """Delete compacted raw events past retention; returns how many"""
+        if self.timeseries:
+            # Time-series collections expire on their own via expireAfterSeconds
+            return 0
+        expire_before = min(now - timedelta(days=self.retention_days), watermark)
+        return self.db.interactions.delete_many({'timestamp': {'$lt': expire_before}}).deleted_count
+
+    def get_user_summary(self, user_id):
+        """Category and event totals for the user's compacted history"""
+        return list(self.db.interaction_summaries.aggregate(user_summary_pipeline(user_id)))
+
+    def get_users_summary(self, user_ids):
+        """``get_user_summary`` rows for several users at once, each tagged with its ``user_id``"""
+        return list(self.db.interaction_summaries.aggregate(users_summary_pipeline(user_ids)))
+
+
+def user_summary_pipeline(user_id):
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$group': {
+            '_id': {'content_category': '$content_category', 'event_type': '$event_type'},
+            'count': {'$sum': '$count'},
+            'duration': {'$sum': '$duration'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'content_category': '$_id.content_category',
+            'event_type': '$_id.event_type',
+            'count': 1,
+            'duration': 1
+        }}
+    ]
+
+
+def users_summary_pipeline(user_ids):
+    return [
+        {'$match': {'user_id': {'$in': list(user_ids)}}},
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'content_category': '$content_category', 'event_type': '$event_type'},
+            'count': {'$sum': '$count'},
+            'duration': {'$sum': '$duration'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'user_id': '$_id.user_id',
+            'content_category': '$_id.content_category',
+            'event_type': '$_id.event_type',
+            'count': 1,
+            'duration': 1
+        }}
+    ]
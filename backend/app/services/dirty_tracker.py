@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from config import Config
+
+
+class DirtyUserTracker:
+    """Remembers which users have new interactions since their last scoring.
+
+    ``mark`` adds the user id to an in-process set, so repeated events from
+    one user cost a set insert and collapse to one flag. A daemon thread
+    periodically upserts the set into the ``dirty_users`` collection, keyed
+    by user id and stamped with ``marked_at``.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval or Config.DIRTY_FLUSH_SECONDS
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._db = None
+        self._thread = None
+
+    def attach(self, mongo_db):
+        """Set the database the background flusher writes to"""
+        self._db = mongo_db
+
+    def mark(self, user_id):
+        with self._lock:
+            self._pending.add(user_id)
+        if self._thread is None and self._db is not None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='dirty-users', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Dirty user flush failed: {e}")
+
+    def drain(self):
+        """Take the pending ids as upsert operations for ``dirty_users``"""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        now = datetime.utcnow()
+        return [UpdateOne({'_id': user_id}, {'$set': {'marked_at': now}}, upsert=True) for user_id in pending]
+
+    def flush(self):
+        ops = self.drain()
+        if ops:
+            self._db.dirty_users.bulk_write(ops, ordered=False)
+        return len(ops)
+
+
+class IncrementalRescorer:
+    """Re-scores only the users flagged in ``dirty_users``.
+
+    Flags raised before the run started are streamed to the batch scorer;
+    as each shard is written, the flags of the users it scored are cleared
+    unless the user was marked again in the meantime, in which case the next
+    run picks them up. Users the scorer skipped because they have no
+    history at all, raw or compacted, stay flagged.
+    """
+
+    def __init__(self, mongo_db, workers=None, shard_size=None):
+        self.db = mongo_db
+        self.workers = workers
+        self.shard_size = shard_size
+
+    def dirty_user_ids(self, started):
+        for row in self.db.dirty_users.find({'marked_at': {'$lte': started}}, {'_id': 1}):
+            yield row['_id']
+
+    def run(self):
+        from app.models.batch_scoring import BatchScoringExecutor
+
+        started = datetime.utcnow()
+        cleared = 0
+
+        def clear(user_ids):
+            nonlocal cleared
+            result = self.db.dirty_users.delete_many({'_id': {'$in': user_ids}, 'marked_at': {'$lte': started}})
+            cleared += result.deleted_count
+
+        executor = BatchScoringExecutor(self.db, workers=self.workers, shard_size=self.shard_size)
+        result = executor.run(self.dirty_user_ids(started), on_shard_done=clear)
+        return {'success': True, 'scored': result['scored'], 'cleared': cleared,
+                'message': f"Re-scored {result['scored']} dirty users"}
+
+
+dirty_users = DirtyUserTracker()
@@ -0,0 +1,226 @@
+import os
+from datetime import datetime
+
+from config import Config
+from app.utils import vocabulary
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is only needed for exports
+    pa = pq = None
+
+FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def interactions_schema():
+    # Low-cardinality strings are dictionary-encoded
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('id', pa.string()),
+        ('timestamp', pa.timestamp('ms')),
+        ('user_id', pa.string()),
+        ('session_id', pa.string()),
+        ('event_type', category),
+        ('content_category', category),
+        ('content_id', pa.string()),
+        ('duration', pa.float64())
+    ])
+
+
+def features_schema(feature_names):
+    return pa.schema(
+        [('user_id', pa.string())]
+        + [(name, pa.float64()) for name in feature_names]
+        + [('primary_interest', pa.string())]
+    )
+
+
+def _duration(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def interactions_batch(docs, schema):
+    """One record batch from interaction documents"""
+    columns = {
+        'id': [str(doc['_id']) for doc in docs],
+        'timestamp': [doc.get('timestamp') for doc in docs],
+        'user_id': [doc.get('user_id') for doc in docs],
+        'session_id': [doc.get('session_id') for doc in docs],
+        'event_type': [vocabulary.event_types.decode(doc.get('event_type')) for doc in docs],
+        'content_category': [vocabulary.categories.decode(doc.get('content_category')) for doc in docs],
+        'content_id': [doc.get('content_id') for doc in docs],
+        'duration': [_duration(doc.get('duration')) for doc in docs]
+    }
+    return pa.record_batch([pa.array(columns[f.name], type=f.type) for f in schema], schema=schema)
+
+
+class _FileWriter:
+    """Writes record batches to one Parquet or Arrow IPC file"""
+
+    def __init__(self, path, schema, fmt):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.rows = 0
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(path, schema, compression='zstd')
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def write(self, batch):
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self._writer.close()
+        if hasattr(self, '_sink'):
+            self._sink.close()
+
+
+class ColumnarExporter:
+    """Streams interactions or per-user feature rows into columnar files.
+
+    Documents are read from a sorted cursor and written in fixed-size record
+    batches, so memory use is bounded by ``batch_size`` whatever the size of
+    the export. Files land under ``<out_dir>/<kind>/[date=YYYY-MM-DD/]`` with
+    one ``part-<run>`` file per partition and run. Incremental runs start at
+    the watermark stored in ``export_state`` and only add new part files.
+    """
+
+    def __init__(self, mongo_db, out_dir=None, fmt=None, batch_size=None):
+        if pa is None:
+            raise RuntimeError('pyarrow is required for columnar export')
+        self.db = mongo_db
+        self.out_dir = out_dir or Config.EXPORT_DIR
+        self.fmt = fmt or Config.EXPORT_FORMAT
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {self.fmt}")
+        self.batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+
+    def get_watermark(self, kind):
+        state = self.db.export_state.find_one({'_id': kind})
+        return state['watermark'] if state else None
+
+    def _set_watermark(self, kind, watermark):
+        self.db.export_state.update_one(
+            {'_id': kind},
+            {'$set': {'watermark': watermark, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    def _path(self, kind, run_id, day=None):
+        parts = [self.out_dir, kind]
+        if day is not None:
+            parts.append(f'date={day}')
+        parts.append(f'part-{run_id}.{FORMATS[self.fmt]}')
+        return os.path.join(*parts)
+
+    def _window(self, kind, incremental):
+        since = self.get_watermark(kind) if incremental else None
+        until = datetime.utcnow()
+        return since, until, until.strftime('%Y%m%dT%H%M%S%f')
+
+    def export_interactions(self, partition_by_date=True, incremental=True):
+        since, until, run_id = self._window('interactions', incremental)
+        query = {'timestamp': {'$lte': until}}
+        if since is not None:
+            query['timestamp']['$gt'] = since
+
+        schema = interactions_schema()
+        cursor = self.db.interactions.find(query).sort('timestamp', 1).batch_size(self.batch_size)
+        files = []
+        writer = None
+        day = None
+        buffer = []
+
+        def write(docs):
+            nonlocal writer
+            if writer is None:
+                writer = _FileWriter(self._path('interactions', run_id, day), schema, self.fmt)
+                files.append(writer)
+            writer.write(interactions_batch(docs, schema))
+
+        try:
+            for doc in cursor:
+                doc_day = doc['timestamp'].date().isoformat() if partition_by_date else None
+                if doc_day != day:
+                    # Sorted by time, so each day's partition is written in one pass
+                    if buffer:
+                        write(buffer)
+                        buffer = []
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    day = doc_day
+                buffer.append(doc)
+                if len(buffer) == self.batch_size:
+                    write(buffer)
+                    buffer = []
+            if buffer:
+                write(buffer)
+        finally:
+            cursor.close()
+            if writer is not None:
+                writer.close()
+
+        if incremental:
+            self._set_watermark('interactions', until)
+        rows = sum(f.rows for f in files)
+        return {'success': True, 'rows': rows, 'files': [f.path for f in files], 'watermark': until,
+                'message': f'Exported {rows} interactions'}
+
+    def export_features(self, partition_by_date=True, incremental=True, history_limit=500):
+        """Feature rows for users active since the watermark, labelled with their top engagement category"""
+        from app.models.ml_model import UserInterestClassifier
+
+        since, until, run_id = self._window('features', incremental)
+        query = {'last_active': {'$lte': until}}
+        if since is not None:
+            query['last_active']['$gt'] = since
+
+        # Only the feature builder is used; labels come from the features, not stored predictions,
+        # so training on the export never fits the model to its own outputs
+        classifier = UserInterestClassifier(Config.ML_MODEL_PATH)
+        schema = features_schema(classifier.feature_names)
+        writer = None
+        day = until.date().isoformat() if partition_by_date else None
+
+        users = self.db.users.find(query, {'_id': 0, 'user_id': 1}).sort('user_id', 1).batch_size(self.batch_size)
+        try:
+            shard = []
+            for user in users:
+                shard.append(user['user_id'])
+                if len(shard) == self.batch_size:
+                    writer = self._write_features(shard, classifier, schema, history_limit, writer, run_id, day)
+                    shard = []
+            if shard:
+                writer = self._write_features(shard, classifier, schema, history_limit, writer, run_id, day)
+        finally:
+            users.close()
+            if writer is not None:
+                writer.close()
+
+        if incremental:
+            self._set_watermark('features', until)
+        rows = writer.rows if writer is not None else 0
+        return {'success': True, 'rows': rows, 'files': [writer.path] if writer is not None else [],
+                'watermark': until, 'message': f'Exported {rows} feature rows'}
+
+    def _write_features(self, shard, classifier, schema, history_limit, writer, run_id, day):
+        from app.models.batch_scoring import shard_features
+
+        user_ids, matrix = shard_features(self.db, classifier, shard, history_limit)
+        if not user_ids:
+            return writer
+        labels = classifier.engagement_labels(matrix)
+        arrays = [pa.array(user_ids, type=pa.string())]
+        arrays += [pa.array(matrix[:, i], type=pa.float64()) for i in range(matrix.shape[1])]
+        arrays.append(pa.array(labels, type=pa.string()))
+        if writer is None:
+            writer = _FileWriter(self._path('features', run_id, day), schema, self.fmt)
+        writer.write(pa.record_batch(arrays, schema=schema))
+        return writer
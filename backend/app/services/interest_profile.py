@@ -0,0 +1,91 @@
+from datetime import datetime
+from config import Config
+from app.utils import vocabulary
+
+FIELD = 'interest_profile'
+
+
+def event_weight(event_type, duration=0):
+    """Evidence one event adds to its interest: the event type's weight plus minutes spent, capped"""
+    base = Config.INTEREST_EVENT_WEIGHTS.get(vocabulary.event_types.decode(event_type), 1.0)
+    minutes = min(float(duration or 0), Config.INTEREST_MAX_DURATION_SECONDS) / 60
+    return base + minutes
+
+
+def profile_update(category, event_type, duration, now, half_life_hours=None):
+    """``$set`` fields for an update pipeline that folds one event into the user's profile.
+
+    The profile keeps a ``{'s': score, 't': updated_at}`` pair per interest.
+    Only the event's interest is touched: its score is decayed from ``t`` to
+    ``now`` and the event's weight added, inside the same update that bumps
+    ``last_active``, so an event costs no reads and no history scan. Other
+    interests keep their pair and are decayed when read. Returns ``{}`` for
+    categories that feed no interest.
+    """
+    interest = vocabulary.CATEGORY_INTEREST[vocabulary.categories.encode(category)]
+    if interest is None:
+        return {}
+    half_life_ms = (half_life_hours or Config.INTEREST_HALF_LIFE_HOURS) * 3600 * 1000
+    path = f'${FIELD}.{interest}'
+    elapsed = {'$subtract': [now, {'$ifNull': [f'{path}.t', now]}]}
+    score = {'$add': [
+        {'$multiply': [{'$ifNull': [f'{path}.s', 0]}, {'$pow': [0.5, {'$divide': [elapsed, half_life_ms]}]}]},
+        event_weight(event_type, duration)
+    ]}
+    return {f'{FIELD}.{interest}': {'s': score, 't': now}}
+
+
+def decayed_scores(profile, now=None, half_life_hours=None):
+    """Each interest's score decayed to ``now``"""
+    if not profile:
+        return {}
+    now = now or datetime.utcnow()
+    half_life = (half_life_hours or Config.INTEREST_HALF_LIFE_HOURS) * 3600
+    return {
+        interest: pair['s'] * 0.5 ** (max((now - pair['t']).total_seconds(), 0) / half_life)
+        for interest, pair in profile.items()
+    }
+
+
+def blend(profile, prediction=None, weight=None, now=None):
+    """A prediction-shaped dict mixing the decayed profile with the model's scores.
+
+    The decayed scores are normalized to sum to one and weighted by
+    ``weight``; the model's ``interest_scores`` get the rest. Without a
+    stored prediction the profile is used alone, so a user's first event
+    already changes their ads. Returns ``prediction`` unchanged when there is
+    no profile or the weight is zero.
+    """
+    weight = Config.INTEREST_BLEND_WEIGHT if weight is None else weight
+    scores = decayed_scores(profile, now)
+    total = sum(scores.values())
+    if not total or not weight:
+        return prediction
+    model_scores = (prediction or {}).get('interest_scores') or {}
+    if not model_scores:
+        weight = 1.0
+
+    blended = {interest: (1 - weight) * score for interest, score in model_scores.items()}
+    for interest, score in scores.items():
+        blended[interest] = blended.get(interest, 0.0) + weight * score / total
+    primary_interest = max(blended, key=blended.get)
+    return {
+        'primary_interest': primary_interest,
+        'interest_scores': blended,
+        'confidence': blended[primary_interest],
+        'blend_weight': weight
+    }
+
+
+def activity_update(category, event_type, duration, now):
+    """The ``users`` update for a tracked event: ``last_active`` and, if enabled, the profile"""
+    if not Config.INTEREST_PROFILE_ENABLED:
+        return {'$set': {'last_active': now}}
+    return [{'$set': {'last_active': now, **profile_update(category, event_type, duration, now)}}]
+
+
+def profile_projection():
+    """Projection for reading the profile, or None when ranking does not use it"""
+    if not Config.INTEREST_PROFILE_ENABLED or not Config.INTEREST_BLEND_WEIGHT:
+        return None
+    return {'_id': 0, FIELD: 1}
@@ -0,0 +1,203 @@
+import heapq
+from datetime import datetime
+
+import numpy as np
+from pymongo import ReplaceOne
+from scipy import sparse
+
+from config import Config
+from app.services.ad_slate import ad_category_for
+from app.services.ad_events import ctr_table
+from app.utils.vocabulary import categories as category_vocab
+
+
+def user_items_pipeline(since, until):
+    """Fold interactions in ``(since, until]`` into deduplicated (user, content) pairs"""
+    match = {'timestamp': {'$lte': until}, 'content_id': {'$ne': None}}
+    if since is not None:
+        match['timestamp']['$gt'] = since
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'u': '$user_id', 'i': '$content_id'},
+            'n': {'$sum': 1},
+            'c': {'$last': '$content_category'}
+        }},
+        {'$merge': {
+            'into': 'user_items',
+            'whenMatched': [{'$set': {'n': {'$add': ['$n', '$$new.n']}, 'c': '$$new.c'}}],
+            'whenNotMatched': 'insert'
+        }}
+    ]
+
+
+def top_neighbors(X, rows, counts, top_n, min_cooccurrence):
+    """Top-N cosine neighbours of item columns ``rows`` in a binary user x item matrix.
+
+    Yields ``(row, neighbour_columns, scores)`` with scores descending.
+    """
+    cooccurrence = (X[:, rows].T @ X).tocsr()
+    for k, item in enumerate(rows):
+        start, end = cooccurrence.indptr[k], cooccurrence.indptr[k + 1]
+        cols = cooccurrence.indices[start:end]
+        together = cooccurrence.data[start:end]
+        keep = (cols != item) & (together >= min_cooccurrence)
+        cols, together = cols[keep], together[keep]
+        scores = together / np.sqrt(counts[item] * counts[cols])
+        if len(scores) > top_n:
+            best = np.argpartition(-scores, top_n)[:top_n]
+            cols, scores = cols[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        yield item, cols[order], scores[order]
+
+
+class ItemSimilarityIndex:
+    """Item-to-item neighbours from content co-occurrence across users.
+
+    ``rebuild`` folds new interactions into the ``user_items`` pair table,
+    loads it as a sparse binary user x content matrix and computes the top-N
+    cosine neighbours per item in column batches. Each item's list is stored
+    as one ``content_neighbors`` document (parallel id/score/category
+    arrays), so serving is one ``_id`` lookup per recent item. Incremental
+    runs only recompute items that co-occur with content touched since the
+    watermark, and only load the pairs of the users of those items; every
+    other item's neighbourhood is unchanged.
+    """
+
+    STATE_ID = 'item_similarity'
+
+    def __init__(self, mongo_db, top_n=None, min_cooccurrence=None, batch_items=None):
+        self.db = mongo_db
+        self.top_n = top_n or Config.SIMILARITY_TOP_N
+        self.min_cooccurrence = min_cooccurrence or Config.SIMILARITY_MIN_COOCCURRENCE
+        self.batch_items = batch_items or Config.SIMILARITY_BATCH_ITEMS
+
+    def get_watermark(self):
+        state = self.db.similarity_state.find_one({'_id': self.STATE_ID})
+        return state['watermark'] if state else None
+
+    def load_matrix(self, query=None):
+        """Binary user x item CSC matrix, item ids in column order and item categories"""
+        users, items = {}, {}
+        categories = []
+        rows, cols = [], []
+        for pair in self.db.user_items.find(query or {}, {'_id': 1, 'c': 1}):
+            user = users.setdefault(pair['_id']['u'], len(users))
+            item = items.get(pair['_id']['i'])
+            if item is None:
+                item = items[pair['_id']['i']] = len(items)
+                categories.append(pair.get('c'))
+            rows.append(user)
+            cols.append(item)
+        data = np.ones(len(rows), dtype=np.float32)
+        X = sparse.csc_matrix((data, (rows, cols)), shape=(len(users), len(items)))
+        return X, list(items), categories
+
+    def _pair_keys(self, field, values, key):
+        """Distinct ``key`` of the user_items pairs whose ``field`` is in ``values``"""
+        pipeline = [{'$match': {field: {'$in': list(values)}}}, {'$group': {'_id': f'${key}'}}]
+        return [row['_id'] for row in self.db.user_items.aggregate(pipeline)]
+
+    def item_counts(self, item_ids):
+        """Number of users per item, over the whole pair table"""
+        pipeline = [{'$match': {'_id.i': {'$in': list(item_ids)}}}, {'$group': {'_id': '$_id.i', 'n': {'$sum': 1}}}]
+        counts = {row['_id']: row['n'] for row in self.db.user_items.aggregate(pipeline)}
+        return np.array([counts.get(item_id, 0) for item_id in item_ids], dtype=np.float32)
+
+    def load_affected(self, touched):
+        """The slice of the matrix that neighbours of content co-occurring with ``touched`` depend on.
+
+        Affected items share a user with touched content; their co-occurrence
+        counts are exact over the pairs of every user of an affected item,
+        and the columns those users reach get their user counts from the full
+        table. Returns ``(X, item_ids, categories, counts, rows)``, ``rows``
+        being the affected columns.
+        """
+        affected = self._pair_keys('_id.u', self._pair_keys('_id.i', touched, '_id.u'), '_id.i')
+        if not affected:
+            return sparse.csc_matrix((0, 0), dtype=np.float32), [], [], np.zeros(0), np.zeros(0, dtype=np.int64)
+        users = self._pair_keys('_id.i', affected, '_id.u')
+        X, item_ids, categories = self.load_matrix({'_id.u': {'$in': users}})
+        position = {item_id: i for i, item_id in enumerate(item_ids)}
+        rows = np.array(sorted(position[item_id] for item_id in affected), dtype=np.int64)
+        return X, item_ids, categories, self.item_counts(item_ids), rows
+
+    def rebuild(self, full=False):
+        since = None if full else self.get_watermark()
+        until = datetime.utcnow()
+        if full:
+            self.db.user_items.delete_many({})
+        self.db.interactions.aggregate(user_items_pipeline(since, until))
+
+        if full or since is None:
+            X, item_ids, categories = self.load_matrix()
+            counts = np.asarray(X.sum(axis=0)).ravel()
+            rows = np.arange(len(item_ids))
+        else:
+            touched = self.db.interactions.distinct(
+                'content_id', {'timestamp': {'$gt': since, '$lte': until}, 'content_id': {'$ne': None}}
+            )
+            # Items sharing a user with touched content may gain or reorder neighbours
+            X, item_ids, categories, counts, rows = self.load_affected(touched)
+
+        written = 0
+        for start in range(0, len(rows), self.batch_items):
+            ops = []
+            for item, cols, scores in top_neighbors(X, rows[start:start + self.batch_items], counts,
+                                                    self.top_n, self.min_cooccurrence):
+                ops.append(ReplaceOne({'_id': item_ids[item]}, {
+                    'c': categories[item],
+                    'n': [item_ids[c] for c in cols],
+                    's': [round(float(s), 4) for s in scores],
+                    'nc': [categories[c] for c in cols],
+                    'updated_at': until
+                }, upsert=True))
+            if ops:
+                self.db.content_neighbors.bulk_write(ops, ordered=False)
+                written += len(ops)
+
+        self.db.similarity_state.update_one(
+            {'_id': self.STATE_ID},
+            {'$set': {'watermark': until, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        return {'success': True, 'items': len(item_ids), 'updated': written, 'watermark': until,
+                'message': f'Updated neighbours for {written} items ({len(item_ids)} loaded)'}
+
+
+def related_items(neighbor_docs, seen, limit):
+    """Merge the neighbour lists of a user's recent items into one ranked list"""
+    scores = {}
+    categories = {}
+    for doc in neighbor_docs:
+        for item_id, score, category in zip(doc['n'], doc['s'], doc['nc']):
+            if item_id in seen:
+                continue
+            scores[item_id] = scores.get(item_id, 0.0) + score
+            categories[item_id] = category
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+    return [
+        {'content_id': item_id, 'content_category': category_vocab.decode(categories[item_id]), 'score': round(score, 4)}
+        for item_id, score in best
+    ]
+
+
+def related_ads(items, limit=3):
+    """Ads from the categories of related content, strongest category first"""
+    weights = {}
+    for item in items:
+        category = ad_category_for(item['content_category'])
+        if category in Config.AD_CATEGORIES:
+            weights[category] = weights.get(category, 0.0) + item['score']
+    total = sum(weights.values())
+
+    ads = []
+    for category, weight in sorted(weights.items(), key=lambda x: x[1], reverse=True):
+        for ad in ctr_table.rank(Config.AD_CATEGORIES[category]):
+            if len(ads) >= limit:
+                return ads
+            ad = dict(ad)
+            ad['recommendation_reason'] = 'Related to content you viewed'
+            ad['confidence_score'] = round(weight / total, 4)
+            ads.append(ad)
+    return ads
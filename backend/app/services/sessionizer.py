@@ -0,0 +1,263 @@
+import atexit
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from config import Config
+
+
+class Sessionizer:
+    """Groups incoming interactions into sessions by inactivity gap.
+
+    Open sessions live in an OrderedDict keyed by user and kept in
+    last-activity order, so expiring idle sessions only looks at the front.
+    A session closes when the user is idle for ``gap`` seconds, when the
+    client switches session ids, or when the table is full and it is the
+    least recently active. Closed sessions are summarised into the
+    ``sessions`` collection and rolled into per-user counters on the user
+    document, which is where session features and analytics read them.
+
+    State is per process, so this only suits a single process accepting
+    interactions (or sticky routing by user); ``MongoSessionizer`` shares
+    open sessions between processes.
+    """
+
+    def __init__(self, gap_seconds=None, max_open=None, flush_interval=None):
+        self.gap = timedelta(seconds=gap_seconds or Config.SESSION_GAP_SECONDS)
+        self.max_open = max_open or Config.SESSION_MAX_OPEN
+        self.flush_interval = flush_interval or Config.SESSION_FLUSH_SECONDS
+        self._open = OrderedDict()
+        self._closed = []
+        self._lock = threading.Lock()
+        self._db = None
+        self._thread = None
+
+    def attach(self, mongo_db):
+        """Set the database the background flusher writes to"""
+        self._db = mongo_db
+
+    def assign(self, user_id, timestamp, client_session_id=None, category=None, duration=0):
+        """Record an event and return the id of the session it belongs to"""
+        with self._lock:
+            self._evict_idle(timestamp)
+            session = self._open.get(user_id)
+            if session is not None and (
+                timestamp - session['end'] > self.gap
+                or (client_session_id and client_session_id != session['session_id'])
+            ):
+                self._close(self._open.pop(user_id))
+                session = None
+
+            if session is None:
+                session = {
+                    'session_id': client_session_id or str(uuid.uuid4()),
+                    'user_id': user_id,
+                    'start': timestamp,
+                    'end': timestamp,
+                    'events': 0,
+                    'active_duration': 0,
+                    'categories': {}
+                }
+                self._open[user_id] = session
+                if len(self._open) > self.max_open:
+                    self._close(self._open.popitem(last=False)[1])
+
+            session['end'] = timestamp
+            session['events'] += 1
+            session['active_duration'] += duration or 0
+            if category:
+                session['categories'][category] = session['categories'].get(category, 0) + 1
+            self._open.move_to_end(user_id)
+            session_id = session['session_id']
+
+        if self._thread is None and self._db is not None:
+            self._start()
+        return session_id
+
+    def open_session(self, user_id):
+        with self._lock:
+            session = self._open.get(user_id)
+            return dict(session) if session else None
+
+    def _evict_idle(self, now):
+        while self._open:
+            user_id, session = next(iter(self._open.items()))
+            if now - session['end'] <= self.gap:
+                break
+            self._close(self._open.pop(user_id))
+
+    def _close(self, session):
+        session['duration'] = (session['end'] - session['start']).total_seconds()
+        self._closed.append(session)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sessionizer', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Session flush failed: {e}")
+
+    def drain(self, now=None, close_all=False):
+        """Close idle sessions and return ``(session_docs, user_counter_ops)``"""
+        with self._lock:
+            if close_all:
+                while self._open:
+                    self._close(self._open.popitem(last=False)[1])
+            else:
+                self._evict_idle(now or datetime.utcnow())
+            closed, self._closed = self._closed, []
+        return closed, self._counter_ops(closed)
+
+    @staticmethod
+    def _counter_ops(closed):
+        counters = {}
+        for session in closed:
+            total = counters.setdefault(session['user_id'], [0, 0.0])
+            total[0] += 1
+            total[1] += session['duration']
+        return [
+            UpdateOne({'user_id': user_id}, {'$inc': {'total_sessions': n, 'total_session_duration': seconds}})
+            for user_id, (n, seconds) in counters.items()
+        ]
+
+    def flush(self, close_all=False):
+        sessions, ops = self.drain(close_all=close_all)
+        if sessions:
+            self._db.sessions.insert_many(sessions, ordered=False)
+            self._db.users.bulk_write(ops, ordered=False)
+        return len(sessions)
+
+    def shutdown(self):
+        try:
+            self.flush(close_all=True)
+        except Exception as e:
+            print(f"Session flush on shutdown failed: {e}")
+
+
+class MongoSessionizer(Sessionizer):
+    """Sessionizer whose open sessions live in the ``open_sessions`` collection.
+
+    Used when several worker processes accept interactions without sticky
+    routing. Each user has one open session document keyed by user id. An
+    event extends it with a findOneAndUpdate conditioned on ``end`` being
+    within the gap (and on the client's session id, if it sent one); when
+    that matches nothing, a findOneAndReplace conditioned on the opposite
+    swaps in a new session and returns the old one to be closed. A worker
+    racing on the same user gets a duplicate key error on the upsert and
+    retries, so concurrent events never split or lose a session. Idle
+    sessions are drained in batches: a worker stamps up to ``DRAIN_BATCH``
+    of them with its own claim token, reads back and deletes the ones it
+    claimed, so two workers flushing at once never close the same session
+    twice. Claimed sessions are left alone by ``assign``; a claim older than
+    the gap (its worker died) can be taken over.
+    """
+
+    DRAIN_BATCH = 1000
+
+    def assign(self, user_id, timestamp, client_session_id=None, category=None, duration=0):
+        open_sessions = self._db.open_sessions
+        cutoff = timestamp - self.gap
+        extend = {'$max': {'end': timestamp}, '$inc': {'events': 1, 'active_duration': duration or 0}}
+        # Categories outside the vocabulary are client strings; keep them usable as a field name
+        category = (category or '').replace('.', '_').lstrip('$')
+        if category:
+            extend['$inc'][f'categories.{category}'] = 1
+        current = {'_id': user_id, 'end': {'$gte': cutoff}, 'closing': None}
+        stale = [{'end': {'$lt': cutoff}}]
+        if client_session_id:
+            current['session_id'] = client_session_id
+            stale.append({'session_id': {'$ne': client_session_id}})
+
+        for _ in range(3):
+            session = open_sessions.find_one_and_update(current, extend, projection={'session_id': 1})
+            if session is not None:
+                break
+            session = {
+                '_id': user_id,
+                'session_id': client_session_id or str(uuid.uuid4()),
+                'user_id': user_id,
+                'start': timestamp,
+                'end': timestamp,
+                'events': 1,
+                'active_duration': duration or 0,
+                'categories': {category: 1} if category else {}
+            }
+            try:
+                previous = open_sessions.find_one_and_replace(
+                    {'_id': user_id, 'closing': None, '$or': stale}, session, upsert=True)
+            except DuplicateKeyError:
+                # Another worker opened or extended this user's session first
+                continue
+            if previous is not None:
+                with self._lock:
+                    self._close(previous)
+            break
+        else:
+            session = {'session_id': client_session_id or str(uuid.uuid4())}
+
+        if self._thread is None:
+            self._start()
+        return session['session_id']
+
+    def open_session(self, user_id):
+        return self._db.open_sessions.find_one({'_id': user_id}, {'_id': 0})
+
+    def _close(self, session):
+        for field in ('_id', 'closing', 'closing_at'):
+            session.pop(field, None)
+        super()._close(session)
+
+    def drain(self, now=None, close_all=False):
+        """Close sessions idle for longer than the gap, across all workers.
+
+        ``close_all`` is ignored: other workers' users may still be active.
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - self.gap
+        open_sessions = self._db.open_sessions
+        idle = {'end': {'$lt': cutoff}, '$or': [{'closing': None}, {'closing_at': {'$lt': cutoff}}]}
+        for _ in range(0, self.max_open, self.DRAIN_BATCH):
+            ids = [doc['_id'] for doc in open_sessions.find(idle, {'_id': 1}).limit(self.DRAIN_BATCH)]
+            if not ids:
+                break
+            token = str(uuid.uuid4())
+            open_sessions.update_many({'_id': {'$in': ids}, **idle}, {'$set': {'closing': token, 'closing_at': now}})
+            # Only the sessions this worker's token landed on are closed here
+            claimed = {'_id': {'$in': ids}, 'closing': token}
+            sessions = list(open_sessions.find(claimed))
+            open_sessions.delete_many(claimed)
+            with self._lock:
+                for session in sessions:
+                    self._close(session)
+            if len(ids) < self.DRAIN_BATCH:
+                break
+        with self._lock:
+            closed, self._closed = self._closed, []
+        return closed, self._counter_ops(closed)
+
+
+def session_stats(user, open_session=None):
+    """Session count and average duration from a user document's counters"""
+    total_sessions = (user or {}).get('total_sessions', 0)
+    total_duration = (user or {}).get('total_session_duration', 0.0)
+    if open_session:
+        total_sessions += 1
+        total_duration += (open_session['end'] - open_session['start']).total_seconds()
+    return {
+        'total_sessions': total_sessions,
+        'avg_session_duration': total_duration / total_sessions if total_sessions else 0.0
+    }
+
+
+sessionizer = MongoSessionizer() if Config.SESSION_STORE == 'mongo' else Sessionizer()
@@ -0,0 +1,60 @@
+import threading
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import Config
+
+
+class TrainingJob:
+    """Runs model training off the request path, one job at a time across workers.
+
+    The job's state is a single ``training_jobs`` document, so whichever
+    worker a status request lands on sees it. A worker claims the job with a
+    conditional upsert that only matches when no run is in progress (or the
+    running one is older than ``stale_seconds``, i.e. its worker died); a
+    second worker's claim fails on the duplicate key. Training then runs in
+    a daemon thread and its result is written back to the document.
+
+    ``claim`` and ``finish`` return the filter and update documents so the
+    async service can issue them through Motor.
+    """
+
+    JOB_ID = 'train'
+
+    def __init__(self, stale_seconds=None):
+        self.stale_seconds = stale_seconds or Config.TRAIN_JOB_STALE_SECONDS
+
+    def claim(self, now):
+        stale = now - timedelta(seconds=self.stale_seconds)
+        query = {'_id': self.JOB_ID, '$or': [{'status': {'$ne': 'running'}}, {'started_at': {'$lt': stale}}]}
+        update = {'$set': {'status': 'running', 'started_at': now, 'finished_at': None, 'result': None}}
+        return query, update
+
+    def finish(self, result):
+        status = 'succeeded' if result.get('success') else 'failed'
+        return {'_id': self.JOB_ID}, {'$set': {'status': status, 'finished_at': datetime.utcnow(), 'result': result}}
+
+    def start(self, mongo_db, train):
+        """Claim the job and run ``train()`` in a thread; returns the job document, or None if one is running"""
+        query, update = self.claim(datetime.utcnow())
+        try:
+            job = mongo_db.training_jobs.find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            return None
+
+        def run():
+            try:
+                result = train()
+            except Exception as e:
+                result = {'success': False, 'message': f'Model training failed: {str(e)}'}
+            mongo_db.training_jobs.update_one(*self.finish(result))
+
+        threading.Thread(target=run, name='model-training', daemon=True).start()
+        return job
+
+    def status(self, mongo_db):
+        return mongo_db.training_jobs.find_one({'_id': self.JOB_ID}, {'_id': 0}) or {'status': 'idle'}
+
+
+training_job = TrainingJob()
@@ -0,0 +1,98 @@
+# Per-user rollups computed inside Mongo instead of over fetched documents.
+# Pipelines $match on user_id and $sort on timestamp so they walk the
+# (user_id, timestamp) index over the same history window the Python path
+# fetches, and return a few dozen numbers. activity_from_interactions backs
+# the 'python' aggregation mode kept for comparison.
+from app.utils.vocabulary import categories as category_vocab, event_types as event_vocab
+
+
+def _decoded_counts(rows, vocab):
+    # Legacy string values and their codes decode to the same name
+    counts = {}
+    for row in rows:
+        name = vocab.decode(row['_id'])
+        counts[name] = counts.get(name, 0) + row['count']
+    return counts
+
+
+def user_history_match(user_id, since=None):
+    """Raw history of a user, from ``since`` (the compaction watermark) when set.
+
+    Earlier days are already counted in ``interaction_summaries``; raw
+    events stay around for the compaction lead time and must not be counted
+    a second time.
+    """
+    match = {'user_id': user_id}
+    if since is not None:
+        match['timestamp'] = {'$gte': since}
+    return match
+
+
+def user_activity_pipeline(user_id, limit=1000, since=None):
+    return [
+        {'$match': user_history_match(user_id, since)},
+        {'$sort': {'timestamp': -1}},
+        {'$limit': limit},
+        {'$facet': {
+            'total': [{'$count': 'n'}],
+            'categories': [{'$group': {'_id': '$content_category', 'count': {'$sum': 1}}}],
+            'events': [{'$group': {'_id': '$event_type', 'count': {'$sum': 1}}}],
+            'sessions': [{'$group': {'_id': '$session_id'}}, {'$count': 'n'}]
+        }}
+    ]
+
+
+def activity_from_facet(facet):
+    return {
+        'total': facet['total'][0]['n'] if facet['total'] else 0,
+        'categories': _decoded_counts(facet['categories'], category_vocab),
+        'events': _decoded_counts(facet['events'], event_vocab),
+        'sessions': facet['sessions'][0]['n'] if facet['sessions'] else 0
+    }
+
+
+def activity_from_interactions(interactions):
+    categories = {}
+    events = {}
+    for interaction in interactions:
+        category = category_vocab.decode(interaction.get('content_category'))
+        event_type = event_vocab.decode(interaction.get('event_type'))
+        categories[category] = categories.get(category, 0) + 1
+        events[event_type] = events.get(event_type, 0) + 1
+    return {
+        'total': len(interactions),
+        'categories': categories,
+        'events': events,
+        'sessions': len(set(i.get('session_id') for i in interactions))
+    }
+
+
+def user_features_pipeline(user_id, limit=500, since=None):
+    return [
+        {'$match': user_history_match(user_id, since)},
+        {'$sort': {'timestamp': -1}},
+        {'$limit': limit},
+        {'$facet': {
+            'categories': [{'$group': {
+                '_id': '$content_category',
+                'count': {'$sum': 1},
+                'duration': {'$sum': {'$ifNull': ['$duration', 0]}}
+            }}],
+            'sessions': [{'$group': {'_id': '$session_id'}}, {'$count': 'n'}]
+        }}
+    ]
+
+
+def feature_records_from_facet(facet):
+    """Weighted records for ``features_matrix`` plus session stats from the window"""
+    records = [
+        {'content_category': row['_id'], 'count': row['count'], 'duration': row['duration']}
+        for row in facet['categories']
+    ]
+    sessions = facet['sessions'][0]['n'] if facet['sessions'] else 0
+    total_duration = sum(row['duration'] for row in facet['categories'])
+    stats = {
+        'total_sessions': sessions,
+        'avg_session_duration': total_duration / sessions if sessions else 0.0
+    }
+    return records, stats
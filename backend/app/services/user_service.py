@@ -1,16 +1,28 @@
 import uuid
 from datetime import datetime
-from bson import ObjectId
-from app.models.ml_model import UserInterestClassifier
+from app.models.ml_model import UserInterestClassifier, shared_classifier
+from app.services.compaction_service import InteractionCompactor
+from app.services.ad_slate import ad_category_for_interest, popularity_slate
+from app.services.ad_events import ctr_table
+from app.services.dirty_tracker import dirty_users
+from app.services.sessionizer import sessionizer, session_stats
+from app.services.training_jobs import training_job
+from app.services import interest_profile, user_aggregates
+from app.services.item_similarity import related_ads, related_items
+from app.utils import vocabulary
+from app.utils.admission import admission
+from app.utils.pagination import KEYSET_SORT, encode_cursor, keyset_query
+from app.utils.tracing import tracer
 from config import Config
 
 
+@tracer.traced_methods()
 class UserService:
     """Service class for user management and interaction tracking"""
 
     def __init__(self, mongo_db):
         self.db = mongo_db
-        self.ml_classifier = UserInterestClassifier()
+        self.ml_classifier = shared_classifier()
 
     def create_user(self, user_data):
         user_id = str(uuid.uuid4())
@@ -27,44 +39,88 @@ class UserService:
         return {'success': True, 'user_id': user_id, 'message': 'User created successfully'} if result.inserted_id else {'success': False, 'message': 'Failed to create user'}
 
     def get_user(self, user_id):
-        user = self.db.users.find_one({'user_id': user_id})
-        if user:
-            user['_id'] = str(user['_id'])
-        return user
+        return self.db.users.find_one({'user_id': user_id})
 
     def track_interaction(self, user_id, interaction_data):
-        category = interaction_data.get('content_category', '').lower()
-        if category == 'technology':
-            category = 'tech'
+        # Stored as vocabulary codes (unknown values as strings); names are restored at the API boundary
+        category = vocabulary.categories.store(interaction_data.get('content_category'))
 
+        now = datetime.utcnow()
+        duration = interaction_data.get('duration', 0)
+        session_id = sessionizer.assign(user_id, now, interaction_data.get('session_id'),
+                                        vocabulary.categories.decode(category), duration)
         interaction = {
             'user_id': user_id,
-            'session_id': interaction_data.get('session_id', str(uuid.uuid4())),
-            'event_type': interaction_data.get('event_type'),
+            'session_id': session_id,
+            'event_type': vocabulary.event_types.store(interaction_data.get('event_type')),
             'content_category': category,
             'content_id': interaction_data.get('content_id'),
-            'duration': interaction_data.get('duration', 0),
-            'timestamp': datetime.utcnow(),
+            'duration': duration,
+            'timestamp': now,
             'metadata': interaction_data.get('metadata', {})
         }
         result = self.db.interactions.insert_one(interaction)
         if result.inserted_id:
-            self.db.users.update_one({'user_id': user_id}, {'$set': {'last_active': datetime.utcnow()}})
-            return {'success': True, 'interaction_id': str(result.inserted_id), 'message': 'Interaction tracked successfully'}
+            self.db.users.update_one({'user_id': user_id}, interest_profile.activity_update(
+                category, interaction['event_type'], duration, now))
+            dirty_users.mark(user_id)
+            return {'success': True, 'interaction_id': str(result.inserted_id),
+                    'normalized': vocabulary.normalized_fields(interaction_data, interaction),
+                    'message': 'Interaction tracked successfully'}
         return {'success': False, 'message': 'Failed to track interaction'}
 
-    def get_user_interactions(self, user_id, limit=100):
-        interactions = list(self.db.interactions.find({'user_id': user_id}).sort('timestamp', -1).limit(limit))
-        for interaction in interactions:
-            interaction['_id'] = str(interaction['_id'])
-        return interactions
+    def get_user_interactions(self, user_id, limit=100, since=None):
+        query = user_aggregates.user_history_match(user_id, since)
+        return list(self.db.interactions.find(query).sort('timestamp', -1).limit(limit))
 
-    def predict_user_interests(self, user_id):
-        interactions = self.get_user_interactions(user_id, limit=500)
+    def compacted_until(self):
+        """Compaction watermark: raw events before it are already in the summaries"""
+        return InteractionCompactor(self.db).compacted_until()
+
+    def get_interactions_page(self, user_id, limit=100, cursor=None):
+        """One page of history after ``cursor`` and the token for the next page"""
+        limit = max(1, min(limit, Config.INTERACTIONS_MAX_PAGE))
+        query = keyset_query({'user_id': user_id}, cursor)
+        # One extra row tells whether another page exists
+        docs = list(self.db.interactions.find(query).sort(KEYSET_SORT).limit(limit + 1))
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return [vocabulary.decode_interaction(doc) for doc in docs[:limit]], next_cursor
+
+    def iter_interactions(self, user_id, cursor=None, limit=0):
+        """Lazy cursor over history after ``cursor``; ``limit`` 0 means all of it"""
+        query = keyset_query({'user_id': user_id}, cursor)
+        return (self.db.interactions.find(query).sort(KEYSET_SORT)
+                .limit(limit).batch_size(Config.INTERACTIONS_STREAM_BATCH))
+
+    def get_session_stats(self, user_id, user=None):
+        if user is None:
+            user = self.db.users.find_one({'user_id': user_id}, {'total_sessions': 1, 'total_session_duration': 1})
+        return session_stats(user, sessionizer.open_session(user_id))
+
+    def _server_side(self, aggregation):
+        return (aggregation or Config.USER_AGGREGATION_MODE) == 'server'
+
+    def get_feature_records(self, user_id, aggregation=None):
+        """Records for the model's feature builder and the window's session stats"""
+        since = self.compacted_until()
+        if self._server_side(aggregation):
+            facet = next(self.db.interactions.aggregate(user_aggregates.user_features_pipeline(user_id, since=since)))
+            return user_aggregates.feature_records_from_facet(facet)
+        return self.get_user_interactions(user_id, limit=500, since=since), None
+
+    def predict_user_interests(self, user_id, aggregation=None):
+        interactions, window_stats = self.get_feature_records(user_id, aggregation)
+        if not interactions:
+            # Raw events may have expired; fall back to the compacted history,
+            # whose rows stand in for `count` interactions each
+            interactions = InteractionCompactor(self.db).get_user_summary(user_id)
         if not interactions:
             return {'success': False, 'message': 'No interaction data available for prediction'}
         try:
-            prediction = self.ml_classifier.predict_user_interests(interactions)
+            stats = self.get_session_stats(user_id)
+            if not stats['total_sessions'] and window_stats:
+                stats = window_stats
+            prediction = self.ml_classifier.predict_user_interests(interactions, stats)
             prediction_record = {
                 'user_id': user_id,
                 'primary_interest': prediction['primary_interest'],
@@ -79,25 +135,68 @@ class UserService:
         except Exception as e:
             return {'success': False, 'message': f'Prediction failed: {str(e)}'}
 
-    def get_recommended_ads(self, user_id, limit=3):
+    def has_interactions(self, user_id):
+        # Index-only existence probe; never fetches an interaction document
+        projection = {'_id': 0, 'user_id': 1}
+        if self.db.interactions.find_one({'user_id': user_id}, projection):
+            return True
+        if Config.INTERACTIONS_RETENTION_DAYS:
+            return self.db.interaction_summaries.find_one({'user_id': user_id}, projection) is not None
+        return False
+
+    def get_interest_profile(self, user_id):
+        projection = interest_profile.profile_projection()
+        if projection is None:
+            return None
+        user = self.db.users.find_one({'user_id': user_id}, projection)
+        return (user or {}).get(interest_profile.FIELD)
+
+    def get_recommended_ads(self, user_id, limit=3, inline_predict=True):
+        """Ads for the user's stored prediction blended with their decayed interest profile.
+
+        Users with a profile but no prediction are ranked from the profile
+        alone. Otherwise the prediction is made inline; with
+        ``inline_predict`` off, or when the predict group has no free slot,
+        they get the popularity slate.
+        """
+        ctr_table.reload_in_background(self.db)
         prediction = self.db.predictions.find_one({'user_id': user_id})
+        profile = self.get_interest_profile(user_id)
+        if not prediction and profile:
+            return self.select_ads(interest_profile.blend(profile), limit)
         if not prediction:
-            prediction_result = self.predict_user_interests(user_id)
+            if not inline_predict or not self.has_interactions(user_id):
+                return self.get_popular_ads(user_id, limit)
+            with admission.slot('predict') as slot:
+                if not slot.admitted:
+                    return self.get_popular_ads(user_id, limit)
+                prediction_result = self.predict_user_interests(user_id)
+                if not prediction_result['success']:
+                    slot.fail()
             if not prediction_result['success']:
-                return self.get_random_ads(limit)
+                return self.get_popular_ads(user_id, limit)
             prediction = prediction_result['prediction']
+        return self.select_ads(interest_profile.blend(profile, prediction), limit)
+
+    def get_popular_ads(self, user_id, limit=3):
+        if popularity_slate.is_stale():
+            popularity_slate.refresh_in_background(self.db)
+        return popularity_slate.get(user_id, limit)
 
+    def select_ads(self, prediction, limit=3):
         primary_interest = prediction.get('primary_interest', 'sports')
         interest_scores = prediction.get('interest_scores', {})
-        ads = Config.AD_CATEGORIES.get(primary_interest, [])
+        # Copy so per-user fields never leak into the shared catalog
+        # Model interests and ad categories are named differently ('tech' vs 'technology')
+        ads = [dict(ad) for ad in ctr_table.rank(Config.AD_CATEGORIES.get(ad_category_for_interest(primary_interest), []))]
 
         if len(ads) < limit:
             sorted_interests = sorted(interest_scores.items(), key=lambda x: x[1], reverse=True)
             for interest, score in sorted_interests[1:]:
                 if len(ads) >= limit:
                     break
-                interest_ads = Config.AD_CATEGORIES.get(interest, [])
-                ads.extend(interest_ads[:limit - len(ads)])
+                interest_ads = ctr_table.rank(Config.AD_CATEGORIES.get(ad_category_for_interest(interest), []))
+                ads.extend(dict(ad) for ad in interest_ads[:limit - len(ads)])
 
         ads = ads[:limit]
         for ad in ads:
@@ -106,37 +205,65 @@ class UserService:
 
         return ads
 
+    def get_related(self, user_id, limit=10, ad_limit=3):
+        """Content related to the user's recent items and ads from its categories"""
+        recent = self.db.interactions.find(
+            {'user_id': user_id, 'content_id': {'$ne': None}}, {'_id': 0, 'content_id': 1}
+        ).sort('timestamp', -1).limit(Config.SIMILARITY_RECENT_ITEMS)
+        seen = {row['content_id'] for row in recent}
+        items = related_items(self.db.content_neighbors.find({'_id': {'$in': list(seen)}}), seen, limit)
+        return {'content': items, 'ads': related_ads(items, ad_limit)}
+
     def get_random_ads(self, limit=3):
         import random
         all_ads = []
         for category, ads in Config.AD_CATEGORIES.items():
             all_ads.extend(ads)
-        selected_ads = random.sample(all_ads, min(limit, len(all_ads)))
+        selected_ads = [dict(ad) for ad in random.sample(all_ads, min(limit, len(all_ads)))]
         for ad in selected_ads:
             ad['recommendation_reason'] = 'Random recommendation'
             ad['confidence_score'] = 0.0
         return selected_ads
 
-    def get_user_analytics(self, user_id):
+    def get_user_activity(self, user_id, aggregation=None):
+        """Counts over the user's latest 1000 interactions not yet compacted"""
+        since = self.compacted_until()
+        if self._server_side(aggregation):
+            facet = next(self.db.interactions.aggregate(user_aggregates.user_activity_pipeline(user_id, since=since)))
+            return user_aggregates.activity_from_facet(facet)
+        interactions = self.get_user_interactions(user_id, limit=1000, since=since)
+        return user_aggregates.activity_from_interactions(interactions)
+
+    def get_user_analytics(self, user_id, aggregation=None):
         user = self.get_user(user_id)
         if not user:
             return None
 
-        interactions = self.get_user_interactions(user_id, limit=1000)
-        total_interactions = len(interactions)
-        unique_sessions = len(set(i.get('session_id') for i in interactions))
+        activity = self.get_user_activity(user_id, aggregation)
+        prediction = self.db.predictions.find_one({'user_id': user_id})
+        summary = InteractionCompactor(self.db).get_user_summary(user_id)
+        return self.build_user_analytics(user_id, user, activity, prediction, summary)
+
+    def build_user_analytics(self, user_id, user, activity, prediction, summary=()):
+        total_interactions = activity['total']
+        # Sessions come from the sessionizer's counters; older users without
+        # them fall back to counting ids in the fetched history
+        unique_sessions = session_stats(user, sessionizer.open_session(user_id))['total_sessions']
+        if not unique_sessions:
+            unique_sessions = activity['sessions']
 
-        category_counts = {}
-        event_type_counts = {}
-        for interaction in interactions:
-            category = interaction.get('content_category', 'unknown')
-            if category == 'technology':
-                category = 'tech'
-            event_type = interaction.get('event_type', 'unknown')
-            category_counts[category] = category_counts.get(category, 0) + 1
-            event_type_counts[event_type] = event_type_counts.get(event_type, 0) + 1
+        category_counts = dict(activity['categories'])
+        event_type_counts = dict(activity['events'])
+
+        # History that has been compacted out of the raw collection
+        compacted_interactions = 0
+        for row in summary:
+            category = vocabulary.categories.decode(row['content_category'])
+            event_type = vocabulary.event_types.decode(row['event_type'])
+            category_counts[category] = category_counts.get(category, 0) + row['count']
+            event_type_counts[event_type] = event_type_counts.get(event_type, 0) + row['count']
+            compacted_interactions += row['count']
 
-        prediction = self.db.predictions.find_one({'user_id': user_id})
         analytics = {
             'user_info': {
                 'user_id': user_id,
@@ -146,21 +273,43 @@ class UserService:
             },
             'interaction_stats': {
                 'total_interactions': total_interactions,
+                'compacted_interactions': compacted_interactions,
                 'unique_sessions': unique_sessions,
                 'avg_interactions_per_session': total_interactions / unique_sessions if unique_sessions else 0
             },
             'category_breakdown': category_counts,
             'event_type_breakdown': event_type_counts,
+            'decayed_interests': interest_profile.decayed_scores(user.get(interest_profile.FIELD)),
             'prediction': prediction
         }
         return analytics
 
-    def train_ml_model(self):
+    def train_ml_model(self, data_path=None, budget_seconds=None):
         try:
-            accuracy = self.ml_classifier.train_model()
-            return {'success': True, 'accuracy': accuracy, 'message': 'Model trained successfully'}
+            # A separate instance: requests keep using the shared model until the new file lands
+            classifier = UserInterestClassifier(self.ml_classifier.model_path)
+            accuracy = classifier.train_model(path=data_path, budget_seconds=budget_seconds)
+            return {'success': True, 'accuracy': accuracy, 'model': classifier.selection['chosen'],
+                    'report_path': classifier.report_path, 'message': 'Model trained successfully'}
         except Exception as e:
             return {'success': False, 'message': f'Model training failed: {str(e)}'}
 
+    def start_training(self):
+        """Start training in the background; the job document, or None if a run is in progress"""
+        return training_job.start(self.db, self.train_ml_model)
+
+    def get_training_status(self):
+        return training_job.status(self.db)
+
+    def distill_ml_model(self, data_path=None, p99_budget_ms=None):
+        try:
+            classifier = UserInterestClassifier(self.ml_classifier.model_path)
+            report = classifier.distill_model(path=data_path, p99_budget_ms=p99_budget_ms)
+            return {'success': True, 'student': report['student'], 'teacher': report['teacher'],
+                    'report_path': classifier.distillation_report_path,
+                    'message': 'Model distilled successfully'}
+        except Exception as e:
+            return {'success': False, 'message': f'Model distillation failed: {str(e)}'}
+
     def get_model_info(self):
         return self.ml_classifier.get_model_info()
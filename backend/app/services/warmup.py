@@ -0,0 +1,198 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+from app.models.ml_model import UserInterestClassifier, shared_classifier
+from app.services.ad_events import ctr_table
+from app.services.ad_slate import popularity_slate
+from app.utils.http_cache import catalog_version
+
+# A small, plausible history used for warm-up inferences
+SAMPLE_INTERACTIONS = [
+    {'content_category': category, 'duration': 30 + 15 * i, 'session_id': f'warmup-{i % 2}'}
+    for i, category in enumerate(Config.CONTENT_CATEGORIES[:6])
+]
+
+
+class Readiness:
+    """Warm-up progress of this process, as reported by ``/readyz``.
+
+    A process where no warm-up was ever started (``flask run``, a plain
+    ``gunicorn wsgi:app``, the test client) reports ``not_started`` and counts
+    as ready, as it did before warm-up existed; once ``begin`` is called it is
+    ready only when the warm-up finishes.
+    """
+
+    def __init__(self, enabled=True):
+        self._lock = threading.Lock()
+        self.state = 'not_started' if enabled else 'ready'
+        self.steps = {}
+        self.error = None
+        self.started_at = time.time()
+        self.ready_at = None if enabled else self.started_at
+
+    @property
+    def is_ready(self):
+        return self.state in ('ready', 'not_started')
+
+    def begin(self):
+        with self._lock:
+            self.state = 'warming'
+            self.steps = {}
+            self.error = None
+
+    def record(self, step, seconds, **info):
+        with self._lock:
+            self.steps[step] = {'seconds': round(seconds, 3), **info}
+
+    def ready(self):
+        with self._lock:
+            self.state = 'ready'
+            self.ready_at = time.time()
+
+    def fail(self, error):
+        with self._lock:
+            self.state = 'failed'
+            self.error = str(error)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'steps': dict(self.steps),
+                'error': self.error,
+                'warmup_seconds': round(self.ready_at - self.started_at, 3) if self.ready_at else None
+            }
+
+
+def warm_model(inferences=None):
+    """Load (or first train) the shared model and run a few inferences through it"""
+    classifier = shared_classifier()
+    if classifier.model is None:
+        print("🤖 No trained model found, training one...")
+        UserInterestClassifier(classifier.model_path).train_model()
+        classifier = shared_classifier()
+
+    for _ in range(inferences or Config.WARMUP_INFERENCES):
+        classifier.predict_user_interests(SAMPLE_INTERACTIONS)
+    # The teacher serves batch scoring; touch its code path too
+    classifier.predict_proba(classifier.features_matrix(SAMPLE_INTERACTIONS))
+    return {'model': type(classifier.model).__name__,
+            'online_model': classifier.student.name if classifier.student is not None else 'teacher'}
+
+
+def p99_ms(timings):
+    return float(np.percentile(timings, 99) * 1000)
+
+
+def is_steady(rounds, tolerance):
+    """True once the last two rounds' p99 agree within ``tolerance``"""
+    if len(rounds) < 2:
+        return False
+    previous, last = rounds[-2], rounds[-1]
+    return abs(last - previous) <= tolerance * max(previous, 1e-6)
+
+
+class Warmup:
+    """Brings a freshly started process up to steady-state latency.
+
+    Steps, in order: load the model and run dummy inferences; open
+    ``connections`` Mongo connections at once so the pool is not grown on
+    live requests; load the CTR table and popularity slate; make sure
+    recently active users have a stored prediction, so their first ``/ads``
+    does not predict inline; then time rounds of ``/ads`` service calls until
+    two consecutive rounds have the same p99 within ``tolerance``. Progress
+    goes to ``readiness`` and ``/readyz`` reports ready only at the end.
+    """
+
+    def __init__(self, mongo_db, recent_users=None, connections=None, probes=None,
+                 max_rounds=None, tolerance=None):
+        self.db = mongo_db
+        self.recent_users = recent_users or Config.WARMUP_RECENT_USERS
+        self.connections = connections or Config.WARMUP_CONNECTIONS
+        self.probes = probes or Config.WARMUP_PROBES
+        self.max_rounds = max_rounds or Config.WARMUP_MAX_ROUNDS
+        self.tolerance = tolerance or Config.WARMUP_P99_TOLERANCE
+
+    def open_pool(self):
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            list(pool.map(lambda _: self.db.command('ping'), range(self.connections)))
+        return {'connections': self.connections}
+
+    def prime_catalog(self):
+        catalog_version()
+        ctr_table.reload(self.db)
+        popularity_slate.end_refresh(list(self.db.interactions.aggregate(popularity_slate.popularity_pipeline())))
+        return {'ads_with_ctr': len(ctr_table.by_ad)}
+
+    def recent_user_ids(self):
+        users = self.db.users.find({}, {'_id': 0, 'user_id': 1}).sort('last_active', -1).limit(self.recent_users)
+        return [user['user_id'] for user in users]
+
+    def prime_predictions(self, user_ids):
+        from app.services.user_service import UserService
+
+        service = UserService(self.db)
+        have = {p['user_id'] for p in self.db.predictions.find({'user_id': {'$in': user_ids}}, {'_id': 0, 'user_id': 1})}
+        predicted = 0
+        for user_id in user_ids:
+            if user_id not in have and service.has_interactions(user_id):
+                predicted += service.predict_user_interests(user_id)['success']
+        return {'recent_users': len(user_ids), 'had_prediction': len(have), 'predicted': predicted}
+
+    def calibrate(self, user_ids):
+        from app.services.user_service import UserService
+
+        user_ids = user_ids or ['warmup']
+        rounds = []
+        for _ in range(self.max_rounds):
+            timings = []
+            for i in range(self.probes):
+                started = time.perf_counter()
+                UserService(self.db).get_recommended_ads(user_ids[i % len(user_ids)], 3)
+                timings.append(time.perf_counter() - started)
+            rounds.append(p99_ms(timings))
+            if is_steady(rounds, self.tolerance):
+                break
+        return {'p99_ms': [round(r, 3) for r in rounds], 'steady': is_steady(rounds, self.tolerance)}
+
+    def _step(self, readiness, name, step, *args):
+        started = time.perf_counter()
+        info = step(*args)
+        readiness.record(name, time.perf_counter() - started, **info)
+
+    def run(self, readiness):
+        try:
+            self._step(readiness, 'model', warm_model)
+            self._step(readiness, 'mongo_pool', self.open_pool)
+            self._step(readiness, 'ad_catalog', self.prime_catalog)
+            user_ids = self.recent_user_ids()
+            self._step(readiness, 'predictions', self.prime_predictions, user_ids)
+            self._step(readiness, 'calibration', self.calibrate, user_ids)
+            readiness.ready()
+            print(f"✅ Warm-up finished in {readiness.snapshot()['warmup_seconds']}s")
+        except Exception as e:
+            readiness.fail(e)
+            print(f"❌ Warm-up failed: {e}")
+
+
+readiness = Readiness(Config.WARMUP_ENABLED)
+
+
+def start_warmup(app):
+    """Run the warm-up in a background thread so ``/healthz`` answers meanwhile"""
+    if not Config.WARMUP_ENABLED:
+        return None
+    # Not ready from here on, before the thread gets to run
+    readiness.begin()
+
+    def run():
+        with app.app_context():
+            Warmup(app.mongo).run(readiness)
+
+    thread = threading.Thread(target=run, name='warmup', daemon=True)
+    thread.start()
+    return thread
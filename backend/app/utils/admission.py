@@ -0,0 +1,228 @@
+import inspect
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import make_response
+from config import Config
+
+
+class AdaptiveLimit:
+    """Concurrency limit for one route group, adapted to observed latency.
+
+    Requests past ``limit`` in flight are rejected instead of queued. The
+    limit grows by about one per ``limit`` fast completions (additive
+    increase) while the group is busy, and shrinks by ``backoff`` whenever a
+    request takes longer than ``target_latency`` or fails (multiplicative
+    decrease), so it settles at the concurrency the backend can serve
+    within the target.
+    """
+
+    def __init__(self, name, initial, max_limit, target_latency, min_limit=1, backoff=0.9, smoothing=0.2):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.inflight = 0
+        self.latency = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.inflight >= int(self.limit):
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self, latency, failed=False):
+        with self._lock:
+            self.inflight -= 1
+            self.latency += self.smoothing * (latency - self.latency)
+            if failed or latency > self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif self.inflight * 2 >= int(self.limit):
+                # Only grow while the limit is actually being used
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def pressure(self):
+        """Fraction of the limit in use; above 1 once latency is over target"""
+        with self._lock:
+            if not self.inflight:
+                # Idle: the next request probes whether latency has recovered
+                return 0.0
+            used = self.inflight / max(int(self.limit), 1)
+            return max(used, self.latency / self.target_latency)
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, at least one"""
+        return max(1, math.ceil(self.latency * 2))
+
+    def stats(self):
+        with self._lock:
+            return {'limit': int(self.limit), 'inflight': self.inflight,
+                    'latency_ms': round(self.latency * 1000, 1), 'rejected': self.rejected}
+
+
+class _ProcessLimit:
+    """Fixed cap on requests in flight across all limited groups"""
+
+    def __init__(self, max_inflight):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+
+class AdmissionController:
+    """Admission control for the ingestion, prediction and ad-serving routes.
+
+    ``limit(group)`` decorates a view (Flask or Quart). When the group is at
+    its adaptive limit the request is refused with 429; when the whole
+    process is at ``max_inflight`` it is refused with 503. Both carry a
+    ``Retry-After`` header so well-behaved clients spread their retries.
+    ``slot(group)`` admits non-route work such as an inline prediction, and
+    ``degraded(group)`` tells callers to take their cheap path before the
+    group starts rejecting.
+    """
+
+    def __init__(self, groups, max_inflight, degrade_pressure, enabled=True):
+        self.groups = {
+            name: AdaptiveLimit(name, initial, max_limit, target_ms / 1000.0)
+            for name, (initial, max_limit, target_ms) in groups.items()
+        }
+        self.process = _ProcessLimit(max_inflight)
+        self.degrade_pressure = degrade_pressure
+        self.enabled = enabled
+
+    def degraded(self, group):
+        return self.enabled and self.groups[group].pressure() >= self.degrade_pressure
+
+    def _admit(self, group):
+        """None if admitted, else the rejecting status code"""
+        if not self.process.try_acquire():
+            return 503
+        if not self.groups[group].try_acquire():
+            self.process.release()
+            return 429
+        return None
+
+    def _release(self, group, started, failed):
+        self.groups[group].release(time.perf_counter() - started, failed)
+        self.process.release()
+
+    def _rejection(self, group, status):
+        message = 'Too many requests, retry later' if status == 429 else 'Server overloaded, retry later'
+        headers = {'Retry-After': str(self.groups[group].retry_after())}
+        return {'success': False, 'message': message}, status, headers
+
+    def limit(self, group):
+        def decorator(view):
+            if inspect.iscoroutinefunction(view):
+                @wraps(view)
+                async def async_wrapper(*args, **kwargs):
+                    from quart import make_response as make_async_response
+
+                    if not self.enabled:
+                        return await view(*args, **kwargs)
+                    status = self._admit(group)
+                    if status is not None:
+                        return self._rejection(group, status)
+                    started = time.perf_counter()
+                    failed = True
+                    try:
+                        response = await make_async_response(await view(*args, **kwargs))
+                        failed = response.status_code >= 500
+                        return response
+                    finally:
+                        self._release(group, started, failed)
+                return async_wrapper
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+                status = self._admit(group)
+                if status is not None:
+                    return self._rejection(group, status)
+                started = time.perf_counter()
+                failed = True
+                try:
+                    response = make_response(view(*args, **kwargs))
+                    failed = response.status_code >= 500
+                    return response
+                finally:
+                    self._release(group, started, failed)
+            return wrapper
+        return decorator
+
+    def slot(self, group):
+        return _Slot(self, group)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'inflight': self.process.inflight,
+            'rejected': self.process.rejected,
+            'groups': {name: limit.stats() for name, limit in self.groups.items()}
+        }
+
+
+class _Slot:
+    """Context manager form of admission; check ``admitted`` on the bound slot.
+
+    Work that reports failure in its result rather than by raising calls
+    ``fail()``, so the limit sees it as a failure and not a fast success.
+    """
+
+    def __init__(self, controller, group):
+        self.controller = controller
+        self.group = group
+        self.admitted = False
+        self.failed = False
+
+    def __enter__(self):
+        if not self.controller.enabled:
+            self.admitted = True
+            return self
+        self.admitted = self.controller.groups[self.group].try_acquire()
+        self.started = time.perf_counter()
+        return self
+
+    def fail(self):
+        self.failed = True
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.admitted and self.controller.enabled:
+            failed = self.failed or exc_type is not None
+            self.controller.groups[self.group].release(time.perf_counter() - self.started, failed)
+        return False
+
+
+admission = AdmissionController(
+    {
+        'ingest': (Config.ADMISSION_INGEST_LIMIT, Config.ADMISSION_INGEST_MAX, Config.ADMISSION_INGEST_TARGET_MS),
+        'predict': (Config.ADMISSION_PREDICT_LIMIT, Config.ADMISSION_PREDICT_MAX, Config.ADMISSION_PREDICT_TARGET_MS),
+        'ads': (Config.ADMISSION_ADS_LIMIT, Config.ADMISSION_ADS_MAX, Config.ADMISSION_ADS_TARGET_MS),
+    },
+    max_inflight=Config.ADMISSION_MAX_INFLIGHT,
+    degrade_pressure=Config.ADMISSION_DEGRADE_PRESSURE,
+    enabled=Config.ADMISSION_ENABLED
+)
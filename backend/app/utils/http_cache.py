@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request
+from config import Config
+
+
+def _digest(*parts):
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:20]
+
+
+_catalog_version = None
+
+
+def catalog_version():
+    """Version key of the static ad catalog, computed once per process"""
+    global _catalog_version
+    if _catalog_version is None:
+        _catalog_version = (_digest(repr(sorted(Config.AD_CATEGORIES.items()))), None)
+    return _catalog_version
+
+
+def model_version():
+    """Version key of the trained model: config version plus file mtime"""
+    try:
+        # Nanoseconds, so a retrain within the same second still changes the ETag
+        mtime_ns = os.stat(Config.ML_MODEL_PATH).st_mtime_ns
+    except OSError:
+        return (f'{Config.ML_MODEL_VERSION}-untrained', None)
+    return (f'{Config.ML_MODEL_VERSION}-{mtime_ns}', datetime.fromtimestamp(mtime_ns // 10**9, timezone.utc))
+
+
+def _not_modified(etag, last_modified, cache_control, response_class=None):
+    response = (response_class or current_app.response_class)(status=304)
+    _set_validators(response, etag, last_modified, cache_control)
+    return response
+
+
+def _set_validators(response, etag, last_modified, cache_control):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+
+
+def _is_fresh(etag, last_modified, req=None):
+    # ``req`` lets the Quart variant pass its own request; both share werkzeug's header parsing
+    req = req or request
+    if req.if_none_match:
+        return req.if_none_match.contains(etag)
+    if last_modified is not None and req.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= req.if_modified_since
+    return False
+
+
+def conditional(version_fn, max_age=0):
+    """Answer with 304 when the client already holds the current version.
+
+    ``version_fn`` returns ``(version_key, last_modified)``; the ETag is
+    derived from it and the request URL, so the view body is only run when
+    the client's copy is out of date. Works on Flask and Quart views.
+    """
+    cache_control = f'public, max-age={max_age}' if max_age else 'no-cache'
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                from quart import current_app as async_app, make_response as make_async_response
+                from quart import request as async_request
+
+                version, last_modified = version_fn()
+                etag = _digest(async_request.full_path, version)
+                if _is_fresh(etag, last_modified, async_request):
+                    return _not_modified(etag, last_modified, cache_control, async_app.response_class)
+
+                response = await make_async_response(await view(*args, **kwargs))
+                if response.status_code == 200:
+                    _set_validators(response, etag, last_modified, cache_control)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version, last_modified = version_fn()
+            etag = _digest(request.full_path, version)
+            if _is_fresh(etag, last_modified):
+                return _not_modified(etag, last_modified, cache_control)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified, cache_control)
+            return response
+        return wrapper
+    return decorator
+
+
+class ResponseCache:
+    """In-process cache of rendered responses with stale-while-revalidate.
+
+    Entries younger than ``ttl`` are served as is. Entries younger than
+    ``ttl + stale_ttl`` are served while a background thread recomputes
+    them; anything older is recomputed inline, once per key. Keys are the
+    endpoint plus the query parameters a view declares, so other parameters
+    cannot create new entries, and at most ``max_entries`` are kept, least
+    recently used first out. On Quart views the recompute is awaited under an
+    ``asyncio.Lock`` and background refreshes run as app background tasks.
+    """
+
+    def __init__(self, ttl, stale_ttl, max_entries=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries or Config.RESPONSE_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key(self, params, req=None):
+        # (endpoint, query string of the allowed parameters); the latter rebuilds the request for refreshes
+        req = req or request
+        query = urlencode([(name, req.args[name]) for name in params if name in req.args])
+        return req.endpoint, f'{req.path}?{query}'
+
+    def _key_lock(self, key, factory=threading.Lock):
+        with self._lock:
+            return self._key_locks.setdefault(key, factory())
+
+    def _compute(self, key, view, args, kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return None, response
+        return self._store(key, response.get_data(), response.mimetype), response
+
+    async def _compute_async(self, key, view, args, kwargs):
+        from quart import make_response as make_async_response
+
+        response = await make_async_response(await view(*args, **kwargs))
+        if response.status_code != 200:
+            return None, response
+        return self._store(key, await response.get_data(), response.mimetype), response
+
+    def _store(self, key, body, mimetype):
+        entry = {
+            'body': body,
+            'mimetype': mimetype,
+            'etag': hashlib.sha1(body).hexdigest()[:20],
+            # The rollup watermark: when this snapshot of the data was taken
+            'computed_at': time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted, None)
+        return entry
+
+    def _refresh_in_background(self, key, view, args, kwargs):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        app = current_app._get_current_object()
+        path = key[1]
+
+        def run():
+            try:
+                with app.test_request_context(path):
+                    self._compute(key, view, args, kwargs)
+            except Exception as e:
+                print(f"Background refresh of {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _refresh_in_background_async(self, key, view, args, kwargs):
+        from quart import current_app as async_app
+
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        app = async_app._get_current_object()
+
+        async def run():
+            try:
+                async with app.test_request_context(key[1]):
+                    await self._compute_async(key, view, args, kwargs)
+            except Exception as e:
+                print(f"Background refresh of {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # Quart holds a reference to the task and awaits it on shutdown
+        app.add_background_task(run)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            return None, None
+        return entry, time.time() - entry['computed_at']
+
+    def cached(self, params=()):
+        """Cache a view per endpoint and the values of the query parameters in ``params``"""
+        def decorator(view):
+            if inspect.iscoroutinefunction(view):
+                return self._cached_async(view, params)
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = self._key(params)
+                entry, age = self._lookup(key)
+
+                if entry is None or age >= self.ttl + self.stale_ttl:
+                    with self._key_lock(key):
+                        entry, age = self._lookup(key)
+                        if entry is None or age >= self.ttl + self.stale_ttl:
+                            entry, response = self._compute(key, view, args, kwargs)
+                            if entry is None:
+                                with self._lock:
+                                    self._key_locks.pop(key, None)
+                                return response
+                            age = 0
+                elif age >= self.ttl:
+                    self._refresh_in_background(key, view, args, kwargs)
+
+                return self._serve(entry, age)
+            return wrapper
+        return decorator
+
+    def _cached_async(self, view, params):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            from quart import current_app as async_app, request as async_request
+
+            key = self._key(params, async_request)
+            entry, age = self._lookup(key)
+
+            if entry is None or age >= self.ttl + self.stale_ttl:
+                async with self._key_lock(key, asyncio.Lock):
+                    entry, age = self._lookup(key)
+                    if entry is None or age >= self.ttl + self.stale_ttl:
+                        entry, response = await self._compute_async(key, view, args, kwargs)
+                        if entry is None:
+                            with self._lock:
+                                self._key_locks.pop(key, None)
+                            return response
+                        age = 0
+            elif age >= self.ttl:
+                self._refresh_in_background_async(key, view, args, kwargs)
+
+            return self._serve(entry, age, async_request, async_app.response_class)
+        return wrapper
+
+    def _serve(self, entry, age, req=None, response_class=None):
+        max_age = max(int(self.ttl - age), 0)
+        cache_control = f'public, max-age={max_age}, stale-while-revalidate={self.stale_ttl}'
+        last_modified = datetime.fromtimestamp(int(entry['computed_at']), timezone.utc)
+        if _is_fresh(entry['etag'], last_modified, req):
+            return _not_modified(entry['etag'], last_modified, cache_control, response_class)
+        response = (response_class or current_app.response_class)(entry['body'], mimetype=entry['mimetype'])
+        _set_validators(response, entry['etag'], last_modified, cache_control)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+
+analytics_cache = ResponseCache(Config.ANALYTICS_CACHE_TTL, Config.ANALYTICS_STALE_TTL)
@@ -0,0 +1,71 @@
+from datetime import date, datetime
+
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with the ML stack
+    np = None
+
+
+def _default(obj):
+    """Fallback encoder for types orjson and the stdlib don't handle natively"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime) and obj.tzinfo is None:
+        # Stored timestamps come from utcnow(), match orjson's OPT_NAIVE_UTC
+        return obj.isoformat() + '+00:00'
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if np is not None:
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes Mongo documents and model output directly.
+
+    Uses orjson when it is installed and falls back to the stdlib encoder
+    otherwise. Either way ``datetime`` is emitted as ISO 8601, ``ObjectId``
+    as its hex string and NumPy scalars/arrays as plain JSON values, so routes
+    can return raw documents without stringifying ``_id`` by hand.
+    """
+
+    if orjson is not None:
+        _options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC
+
+    def _orjson_options(self):
+        # Honour the app's sort_keys setting, as the stdlib path does
+        return self._options | orjson.OPT_SORT_KEYS if self.sort_keys else self._options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options()).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            body = orjson.dumps(obj, default=_default, option=self._orjson_options())
+        else:
+            body = self.dumps(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
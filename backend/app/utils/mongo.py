@@ -0,0 +1,49 @@
+import os
+import threading
+
+
+class ProcessLocalDatabase:
+    """A Mongo database handle that opens its client lazily in each process.
+
+    ``MongoClient`` is not fork-safe: a client created before a pre-fork
+    server forks would be shared by every worker. This wrapper builds the
+    client on first use and rebuilds it whenever the process id changes, so
+    the master and each worker get their own pool. Attribute and item access
+    are passed through to the underlying ``Database``.
+    """
+
+    def __init__(self, client_factory, db_name):
+        self._client_factory = client_factory
+        self._db_name = db_name
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _database(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # The parent's client is left alone; closing it here would touch its sockets
+                    self._client = self._client_factory()
+                    self._db = self._client[self._db_name]
+                    self._pid = os.getpid()
+        return self._db
+
+    @property
+    def client(self):
+        self._database()
+        return self._client
+
+    def close(self):
+        """Close this process's client; the next access opens a new one"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = self._db = self._pid = None
+
+    def __getattr__(self, name):
+        return getattr(self._database(), name)
+
+    def __getitem__(self, name):
+        return self._database()[name]
@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Newest first; _id breaks ties between events sharing a timestamp
+KEYSET_SORT = [('timestamp', -1), ('_id', -1)]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(doc):
+    """Opaque continuation token pointing just past ``doc`` in KEYSET_SORT order"""
+    millis = (doc['timestamp'] - _EPOCH) // timedelta(milliseconds=1)
+    raw = json.dumps([millis, str(doc['_id'])], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(timestamp, _id)`` from a token, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        millis, object_id = json.loads(raw)
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def keyset_query(query, cursor=None):
+    """Restrict ``query`` to documents after ``cursor`` in KEYSET_SORT order"""
+    if not cursor:
+        return query
+    timestamp, object_id = decode_cursor(cursor)
+    return {
+        **query,
+        '$or': [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': object_id}}
+        ]
+    }
@@ -0,0 +1,228 @@
+import json
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from config import Config
+from app.utils import vocabulary
+
+# Relative frequency of each tracked event; unknown events get weight 1
+EVENT_WEIGHTS = {'page_view': 40, 'click': 25, 'scroll': 15, 'time_spent': 10, 'like': 5, 'share': 2, 'comment': 3}
+
+
+class SyntheticWorkload:
+    """Generates users and their interaction histories for load testing.
+
+    Each user prefers categories in a random order with Zipf weights
+    (``category_skew``), and activity per user is Pareto-distributed
+    (``activity_skew``) around ``events_per_user`` so a few heavy users
+    dominate, as in production. Events come in sessions separated by more
+    than the sessionizer gap and spread over the last ``days`` days. Users
+    are generated from a per-shard seed, so any shard can be regenerated on
+    its own.
+    """
+
+    def __init__(self, events_per_user=50, category_skew=1.2, activity_skew=1.5,
+                 events_per_session=8, days=30, seed=42):
+        self.events_per_user = events_per_user
+        self.category_skew = category_skew
+        self.activity_skew = activity_skew
+        self.events_per_session = events_per_session
+        self.days = days
+        self.seed = seed
+        self.categories = list(Config.CONTENT_CATEGORIES)
+        self.events = list(Config.TRACKING_EVENTS)
+        self.event_weights = [EVENT_WEIGHTS.get(e, 1) for e in self.events]
+        self.zipf = [1 / (rank + 1) ** category_skew for rank in range(len(self.categories))]
+
+    def _event_count(self, rng):
+        # Pareto with the configured mean: scale * a / (a - 1) == events_per_user
+        a = max(self.activity_skew, 1.01)
+        scale = self.events_per_user * (a - 1) / a
+        # Capped so one draw from the tail cannot dominate a whole shard
+        return max(1, min(int(scale * rng.paretovariate(a)), self.events_per_user * 100))
+
+    def generate(self, start, end, now=None):
+        """Yield ``(user, interactions)`` for user numbers in ``[start, end)``"""
+        now = now or datetime.utcnow()
+        rng = random.Random(f'{self.seed}:{start}')
+        horizon = self.days * 86400
+        gap = Config.SESSION_GAP_SECONDS
+
+        for n in range(start, end):
+            user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            preferred = rng.sample(self.categories, len(self.categories))
+            remaining = self._event_count(rng)
+            first_seen = now - timedelta(seconds=rng.uniform(0, horizon))
+
+            interactions = []
+            clock = first_seen
+            sessions = 0
+            session_seconds = 0.0
+            while remaining > 0 and clock < now:
+                session_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+                length = min(remaining, max(1, int(rng.expovariate(1 / self.events_per_session))))
+                started = clock
+                for _ in range(length):
+                    event_type = rng.choices(self.events, self.event_weights)[0]
+                    duration = int(rng.expovariate(1 / 45)) if event_type in ('page_view', 'time_spent') else 0
+                    interactions.append({
+                        'user_id': user_id,
+                        'session_id': session_id,
+                        'event_type': vocabulary.event_types.encode(event_type),
+                        'content_category': vocabulary.categories.encode(rng.choices(preferred, self.zipf)[0]),
+                        'content_id': f'content_{rng.randrange(10000)}',
+                        'duration': duration,
+                        'timestamp': clock,
+                        'metadata': {'seeded': True}
+                    })
+                    clock += timedelta(seconds=duration + rng.uniform(5, 120))
+                sessions += 1
+                session_seconds += (clock - started).total_seconds()
+                remaining -= length
+                clock += timedelta(seconds=gap + rng.expovariate(1 / (horizon / 20)))
+
+            user = {
+                'user_id': user_id,
+                'email': f'seed{self.seed}-{n}@example.com',
+                'name': f'Seed User {n}',
+                'created_at': first_seen,
+                'last_active': interactions[-1]['timestamp'] if interactions else first_seen,
+                'preferences': {},
+                'is_demo_user': True,
+                'is_seeded': True,
+                'total_sessions': sessions,
+                'total_session_duration': session_seconds
+            }
+            yield user, interactions
+
+
+def _iso(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class _MongoSink:
+    def __init__(self, mongo_uri, db_name):
+        self.client = MongoClient(mongo_uri, maxPoolSize=2)
+        self.db = self.client[db_name]
+
+    def write(self, collection, docs):
+        return len(self.db[collection].insert_many(docs, ordered=False).inserted_ids)
+
+    def write_users(self, users):
+        """Insert users; returns the ids actually inserted"""
+        try:
+            self.db.users.insert_many(users, ordered=False)
+            return {user['user_id'] for user in users}
+        except BulkWriteError as e:
+            # Re-seeding with the same seed hits the unique user indexes; skip those
+            if any(err['code'] != 11000 for err in e.details['writeErrors']):
+                raise
+            failed = {err['index'] for err in e.details['writeErrors']}
+            return {user['user_id'] for i, user in enumerate(users) if i not in failed}
+
+    def close(self):
+        self.client.close()
+
+
+class _NDJSONSink:
+    """Local stand-in for Mongo: one NDJSON file per collection and shard"""
+
+    def __init__(self, out_dir, shard):
+        os.makedirs(out_dir, exist_ok=True)
+        self.files = {
+            name: open(os.path.join(out_dir, f'{name}-{shard:05d}.ndjson'), 'w')
+            for name in ('users', 'interactions')
+        }
+
+    def write(self, collection, docs):
+        self.files[collection].writelines(json.dumps(doc, default=_iso) + '\n' for doc in docs)
+        return len(docs)
+
+    def write_users(self, users):
+        self.write('users', users)
+        return {user['user_id'] for user in users}
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def _seed_shard(workload, shard, start, end, batch_size, target, mongo_uri, db_name, out_dir):
+    sink = _MongoSink(mongo_uri, db_name) if target == 'mongo' else _NDJSONSink(out_dir, shard)
+    pending, n_events = [], 0
+    counts = {'users': 0, 'interactions': 0}
+
+    def flush():
+        # Users go first; interactions are only written for users that were new,
+        # so re-seeding with the same seed does not duplicate their histories
+        inserted = sink.write_users([user for user, _ in pending])
+        counts['users'] += len(inserted)
+        events = [event for user, user_events in pending if user['user_id'] in inserted for event in user_events]
+        for i in range(0, len(events), batch_size):
+            counts['interactions'] += sink.write('interactions', events[i:i + batch_size])
+
+    try:
+        for user, events in workload.generate(start, end):
+            pending.append((user, events))
+            n_events += len(events)
+            if len(pending) >= batch_size or n_events >= batch_size:
+                flush()
+                pending, n_events = [], 0
+        if pending:
+            flush()
+    finally:
+        sink.close()
+    return counts
+
+
+class Seeder:
+    """Loads a SyntheticWorkload into Mongo or NDJSON files across processes.
+
+    Users are split into fixed-size shards; each worker process generates
+    its shards and writes them with unordered ``insert_many`` batches over
+    its own client, so generation and loading both scale with ``workers``.
+    ``on_progress(totals, elapsed)`` is called as shards finish.
+    """
+
+    def __init__(self, workload, target='mongo', workers=None, batch_size=None, shard_users=None,
+                 mongo_uri=None, db_name=None, out_dir=None):
+        if target not in ('mongo', 'ndjson'):
+            raise ValueError(f'Unknown seed target: {target}')
+        self.workload = workload
+        self.target = target
+        self.workers = workers or Config.SEED_WORKERS
+        self.batch_size = batch_size or Config.SEED_BATCH_SIZE
+        self.shard_users = shard_users or Config.SEED_SHARD_USERS
+        self.mongo_uri = mongo_uri or Config.MONGODB_URI
+        self.db_name = db_name or Config.MONGODB_DB
+        self.out_dir = out_dir or os.path.join(Config.EXPORT_DIR, 'seed')
+
+    def run(self, n_users, on_progress=None):
+        totals = {'users': 0, 'interactions': 0}
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [
+                pool.submit(_seed_shard, self.workload, shard, start, min(start + self.shard_users, n_users),
+                            self.batch_size, self.target, self.mongo_uri, self.db_name, self.out_dir)
+                for shard, start in enumerate(range(0, n_users, self.shard_users))
+            ]
+            for future in as_completed(futures):
+                for key, value in future.result().items():
+                    totals[key] += value
+                if on_progress is not None:
+                    on_progress(totals, time.perf_counter() - started)
+
+        elapsed = time.perf_counter() - started
+        docs = totals['users'] + totals['interactions']
+        rate = docs / elapsed if elapsed else 0.0
+        return {'success': True, **totals, 'seconds': elapsed, 'docs_per_second': rate,
+                'message': f"Loaded {totals['users']} users and {totals['interactions']} interactions "
+                           f"in {elapsed:.1f}s ({rate:,.0f} docs/s)"}
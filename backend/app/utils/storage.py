@@ -0,0 +1,49 @@
+def interactions_collection_options(config):
+    """create_collection kwargs for `interactions`, or None for a plain collection"""
+    if not config['INTERACTIONS_TIMESERIES']:
+        return None
+    options = {
+        'timeseries': {
+            'timeField': 'timestamp',
+            'metaField': 'user_id',
+            'granularity': config['INTERACTIONS_TS_GRANULARITY']
+        }
+    }
+    if config['INTERACTIONS_RETENTION_DAYS']:
+        options['expireAfterSeconds'] = timeseries_ttl_seconds(config)
+    return options
+
+
+def timeseries_ttl_change(config, collection_info):
+    """New expireAfterSeconds for an existing time-series `interactions`, or None if it is current"""
+    options = (collection_info or {}).get('options', {})
+    if not config['INTERACTIONS_RETENTION_DAYS'] or 'timeseries' not in options:
+        return None
+    ttl = timeseries_ttl_seconds(config)
+    return ttl if options.get('expireAfterSeconds') != ttl else None
+
+
+def timeseries_ttl_seconds(config):
+    """TTL for a time-series `interactions`: retention plus a margin for missed compaction runs"""
+    return (config['INTERACTIONS_RETENTION_DAYS'] + config['COMPACTION_TS_MARGIN_DAYS']) * 86400
+
+
+def interactions_indexes(config):
+    """Secondary indexes for `interactions` under the configured storage layout"""
+    if config['INTERACTIONS_TIMESERIES']:
+        # Buckets are already clustered by user_id and time; the compound
+        # index serves per-user history and the timestamp one time windows
+        return [[('user_id', 1), ('timestamp', -1)], [('timestamp', 1)]]
+    # _id is the keyset pagination tiebreaker for events sharing a timestamp
+    return ['user_id', 'timestamp', [('user_id', 1), ('timestamp', -1), ('_id', -1)]]
+
+
+def superseded_interactions_indexes(config):
+    """Names of `interactions` indexes an older layout created that the current one replaces"""
+    if config['INTERACTIONS_TIMESERIES']:
+        return []
+    # Replaced by (user_id, timestamp, _id), which serves the same queries
+    return ['user_id_1_timestamp_-1']
+
+
+SUMMARY_KEY = ['user_id', 'day', 'content_category', 'event_type']
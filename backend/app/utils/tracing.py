@@ -0,0 +1,305 @@
+import atexit
+import contextvars
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from pymongo import monitoring
+
+from config import Config
+
+# Chrome trace timestamps are microseconds; perf_counter_ns is shifted onto the wall clock once
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+# Span of the request or call currently running in this thread or task
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+def parse_traceparent(value):
+    """``(trace_id, parent_span_id, sampled)`` from a W3C ``traceparent`` header, or None"""
+    parts = (value or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'cat', 'start_ns', 'attrs')
+
+    def __init__(self, trace_id, parent_id, name, cat, attrs):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.cat = cat
+        self.start_ns = time.perf_counter_ns()
+        self.attrs = attrs
+
+    def child(self, name, cat, **attrs):
+        return Span(self.trace_id, self.span_id, name, cat, attrs)
+
+
+class Tracer:
+    """Sampled request tracing written as Chrome trace events.
+
+    A request is sampled when it arrives with a ``traceparent`` whose
+    sampled flag is set, or otherwise with probability ``sample_rate``. Its
+    root span lives in a context variable, so nested ``span`` blocks,
+    ``traced`` functions, Mongo commands and ``asyncio.to_thread`` calls
+    attach to it without passing anything around. Outside a sampled request
+    all of these reduce to one context variable lookup.
+
+    Finished spans are appended to a bounded deque and a daemon thread
+    writes them as complete (``ph: X``) events to ``trace-<pid>.json`` under
+    ``trace_dir``, a JSON array whose closing bracket is optional, so the
+    file loads in Perfetto or ``chrome://tracing`` even while it grows. Each
+    trace gets its own track (``tid``) so concurrent async requests do not
+    interleave.
+    """
+
+    def __init__(self, enabled=None, sample_rate=None, trace_dir=None, flush_interval=None, max_buffer=None):
+        self.enabled = Config.TRACE_ENABLED if enabled is None else enabled
+        self.sample_rate = Config.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.trace_dir = trace_dir or Config.TRACE_DIR
+        self.flush_interval = flush_interval or Config.TRACE_FLUSH_SECONDS
+        self._buffer = deque(maxlen=max_buffer or Config.TRACE_MAX_BUFFER)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # Traces
+
+    def start_trace(self, name, headers=None, cat='route', **attrs):
+        """Open a root span for a request; returns a handle for ``finish_trace`` or None if unsampled"""
+        if not self.enabled:
+            return None
+        incoming = parse_traceparent(headers.get('traceparent')) if headers is not None else None
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id = (headers.get('X-Trace-Id') if headers is not None else None) or _new_id(128)
+            parent_id, sampled = None, random.random() < self.sample_rate
+        if not sampled:
+            return None
+        span = Span(trace_id, parent_id, name, cat, attrs)
+        return span, _current.set(span)
+
+    def finish_trace(self, handle, **attrs):
+        if handle is None:
+            return
+        span, token = handle
+        span.attrs.update(attrs)
+        self.record(span, time.perf_counter_ns())
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Teardown ran in a different context than the request; nothing to restore there
+            pass
+
+    def current(self):
+        return _current.get()
+
+    @contextmanager
+    def span(self, name, cat='app', **attrs):
+        """Child span of the current one; a no-op outside a sampled request"""
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        span = parent.child(name, cat, **attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+            self.record(span, time.perf_counter_ns())
+
+    def traced(self, name=None, cat='app'):
+        """Decorator recording a span per call of a function or coroutine function"""
+        def decorator(func):
+            span_name = name or func.__qualname__
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if _current.get() is None:
+                        return await func(*args, **kwargs)
+                    with self.span(span_name, cat):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return func(*args, **kwargs)
+                with self.span(span_name, cat):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def traced_methods(self, cat='service'):
+        """Class decorator applying ``traced`` to every public method defined on the class"""
+        def decorator(cls):
+            for attr, value in list(vars(cls).items()):
+                if inspect.isfunction(value) and not attr.startswith('_'):
+                    setattr(cls, attr, self.traced(f'{cls.__name__}.{attr}', cat)(value))
+            return cls
+        return decorator
+
+    # Export
+
+    def record(self, span, end_ns, start_ns=None):
+        start_ns = span.start_ns if start_ns is None else start_ns
+        self._buffer.append({
+            'name': span.name,
+            'cat': span.cat,
+            'ph': 'X',
+            'ts': (start_ns + _EPOCH_OFFSET_NS) / 1000,
+            'dur': (end_ns - start_ns) / 1000,
+            'pid': os.getpid(),
+            'tid': zlib.crc32(span.trace_id.encode()),
+            'args': {'trace_id': span.trace_id, 'span_id': span.span_id, 'parent_id': span.parent_id,
+                     'thread': threading.current_thread().name, **span.attrs}
+        })
+        if self._pid != os.getpid():
+            self._start()
+
+    @property
+    def path(self):
+        return os.path.join(self.trace_dir, f'trace-{os.getpid()}.json')
+
+    def _start(self):
+        # Started per process: a forked worker does not inherit the parent's thread
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='trace-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Trace flush failed: {e}")
+
+    def flush(self):
+        events = []
+        popleft = self._buffer.popleft
+        while True:
+            try:
+                events.append(popleft())
+            except IndexError:
+                break
+        if not events:
+            return 0
+        with self._lock:
+            path = self.path
+            os.makedirs(self.trace_dir, exist_ok=True)
+            new_file = not os.path.exists(path)
+            with open(path, 'a') as f:
+                if new_file:
+                    f.write('[\n')
+                f.writelines(json.dumps(event, default=str) + ',\n' for event in events)
+        return len(events)
+
+    # Framework hooks
+
+    def _route_name(self, request):
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        return f'{request.method} {rule}'
+
+    def init_app(self, app):
+        """Trace Flask requests: a root span per request, its id echoed in ``X-Trace-Id``"""
+        from flask import g, request
+
+        @app.before_request
+        def start_request_trace():
+            g.trace = self.start_trace(self._route_name(request), request.headers, path=request.path)
+
+        @app.after_request
+        def tag_request_trace(response):
+            handle = g.get('trace')
+            if handle is not None:
+                handle[0].attrs['status'] = response.status_code
+                response.headers['X-Trace-Id'] = handle[0].trace_id
+            return response
+
+        @app.teardown_request
+        def finish_request_trace(error=None):
+            self.finish_trace(g.pop('trace', None), **({'error': str(error)} if error else {}))
+
+    def init_async_app(self, app):
+        """Quart counterpart of ``init_app``; hooks are coroutines so the span stays in the request task"""
+        from quart import g, request
+
+        @app.before_request
+        async def start_request_trace():
+            g.trace = self.start_trace(self._route_name(request), request.headers, path=request.path)
+
+        @app.after_request
+        async def tag_request_trace(response):
+            handle = g.get('trace')
+            if handle is not None:
+                handle[0].attrs['status'] = response.status_code
+                response.headers['X-Trace-Id'] = handle[0].trace_id
+            return response
+
+        @app.teardown_request
+        async def finish_request_trace(error=None):
+            self.finish_trace(g.pop('trace', None), **({'error': str(error)} if error else {}))
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """pymongo command listener recording a span per command issued inside a sampled trace.
+
+    Commands are matched to their start by connection and request id; the
+    span's start is derived from the driver's own ``duration_micros``.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self._open = {}
+
+    def started(self, event):
+        parent = _current.get()
+        if parent is None:
+            return
+        target = event.command.get(event.command_name)
+        attrs = {'db': event.database_name}
+        if isinstance(target, str):
+            attrs['collection'] = target
+        self._open[(event.connection_id, event.request_id)] = parent.child(f'mongo.{event.command_name}', 'mongo', **attrs)
+
+    def _finish(self, event, **attrs):
+        span = self._open.pop((event.connection_id, event.request_id), None)
+        if span is None:
+            return
+        span.attrs.update(attrs)
+        end_ns = time.perf_counter_ns()
+        self.tracer.record(span, end_ns, end_ns - event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, error=str(event.failure))
+
+
+tracer = Tracer()
+mongo_listener = MongoCommandTracer(tracer)
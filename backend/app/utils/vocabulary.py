@@ -0,0 +1,134 @@
+import numpy as np
+from config import Config
+
+UNKNOWN = 'unknown'
+
+
+class Vocabulary:
+    """Small-integer codes for a fixed set of names.
+
+    Code 0 is ``unknown``; the rest follow ``names`` order. ``aliases`` map
+    other spellings onto a canonical name, so normalization happens once on
+    write. Names may only ever be appended, since stored documents keep the
+    codes. ``store`` keeps values outside the vocabulary as their cleaned
+    string instead of collapsing them to code 0, and ``decode`` reads both
+    codes and strings, including documents written before the codes existed.
+    """
+
+    def __init__(self, field, names, aliases=None):
+        self.field = field
+        self.names = [UNKNOWN] + [name for name in names if name != UNKNOWN]
+        self.codes = {name: code for code, name in enumerate(self.names)}
+        for alias, name in (aliases or {}).items():
+            if alias not in self.codes and name in self.codes:
+                self.codes[alias] = self.codes[name]
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, value):
+        if isinstance(value, int):
+            return value if 0 <= value < len(self.names) else 0
+        if not value:
+            return 0
+        return self.codes.get(str(value).strip().lower(), 0)
+
+    def store(self, value):
+        """Value to write: the code of a known name or alias, else the cleaned string"""
+        if isinstance(value, int) or not value:
+            return self.encode(value)
+        cleaned = str(value).strip().lower()
+        return self.codes.get(cleaned, cleaned or 0)
+
+    def decode(self, value):
+        if isinstance(value, int):
+            return self.names[value] if 0 <= value < len(self.names) else UNKNOWN
+        if value is None:
+            return UNKNOWN
+        stored = self.store(value)
+        return self.names[stored] if isinstance(stored, int) else stored
+
+    def lookup(self, mapping, default):
+        """List indexed by code, holding ``mapping.get(name, default)``"""
+        return [mapping.get(name, default) for name in self.names]
+
+    def check(self, stored):
+        """Validate the stored code table; True if it needs extending to ``names``"""
+        if stored and stored['names'] != self.names[:len(stored['names'])]:
+            raise RuntimeError(
+                f"{self.field} vocabulary changed incompatibly; names may only be appended "
+                f"(stored: {stored['names']})"
+            )
+        return not stored or len(stored['names']) < len(self.names)
+
+    def sync(self, mongo_db):
+        """Record the code table in ``vocabulary`` and refuse to start if it was reordered"""
+        if self.check(mongo_db.vocabulary.find_one({'_id': self.field})):
+            mongo_db.vocabulary.update_one({'_id': self.field}, {'$set': {'names': self.names}}, upsert=True)
+
+
+def _category_aliases():
+    # Model and ad category names ('tech', 'technology', 'sports') resolve to
+    # the first content category that feeds them
+    mappings = (Config.CONTENT_TO_INTEREST, Config.CONTENT_TO_AD_CATEGORY)
+    aliases = {}
+    for mapping in mappings:
+        for content, target in mapping.items():
+            if content in Config.CONTENT_CATEGORIES:
+                aliases.setdefault(target, content)
+    for mapping in mappings:
+        for content, target in mapping.items():
+            if content not in Config.CONTENT_CATEGORIES and target in aliases:
+                aliases.setdefault(content, aliases[target])
+    return aliases
+
+
+categories = Vocabulary('content_category', Config.CONTENT_CATEGORIES, _category_aliases())
+event_types = Vocabulary('event_type', Config.TRACKING_EVENTS)
+
+# Per-code lookups, so callers translate a category with one index
+CATEGORY_INTEREST = categories.lookup(Config.CONTENT_TO_INTEREST, None)
+CATEGORY_AD = categories.lookup(Config.CONTENT_TO_AD_CATEGORY, None)
+INTEREST_AD = {
+    interest: Config.CONTENT_TO_AD_CATEGORY[content]
+    for content, interest in Config.CONTENT_TO_INTEREST.items()
+    if content in Config.CONTENT_TO_AD_CATEGORY
+}
+
+
+def interest_codes(model_categories):
+    """Array mapping category code -> model category index (len(model_categories) if none)"""
+    index = {category: i for i, category in enumerate(model_categories)}
+    return np.array([index.get(interest, len(model_categories)) for interest in CATEGORY_INTEREST], dtype=np.int64)
+
+
+VOCABULARIES = (categories, event_types)
+
+
+def sync(mongo_db):
+    for vocab in VOCABULARIES:
+        vocab.sync(mongo_db)
+
+
+def normalized_fields(data, doc):
+    """Fields stored under a different name than the client sent, e.g. the alias
+    ``sports`` stored as ``sports_news``, as ``{field: {'sent', 'stored'}}``"""
+    changed = {}
+    for vocab in VOCABULARIES:
+        sent = data.get(vocab.field)
+        if sent is None:
+            continue
+        stored = vocab.decode(doc.get(vocab.field))
+        if stored != sent:
+            changed[vocab.field] = {'sent': sent, 'stored': stored}
+    return changed
+
+
+def decode_interaction(doc):
+    """Copy of an interaction document with names in place of codes"""
+    doc = dict(doc)
+    if 'content_category' in doc:
+        doc['content_category'] = categories.decode(doc['content_category'])
+    if 'event_type' in doc:
+        doc['event_type'] = event_types.decode(doc['event_type'])
+    return doc
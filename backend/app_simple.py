@@ -1,16 +1,27 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import os
+import time
 import uuid
 from datetime import datetime
 import random
 
+from simple_snapshot import SnapshotStore
+
 app = Flask(__name__)
 CORS(app)
 
-# Simple in-memory storage for demo
-users = {}
-interactions = []
-predictions = {}
+# Simple in-memory storage for demo, restored from the last snapshot
+SNAPSHOT_DIR = os.environ.get('SIMPLE_SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_INTERVAL = int(os.environ.get('SIMPLE_SNAPSHOT_INTERVAL', 60))
+SNAPSHOT_MERGE_FACTOR = int(os.environ.get('SIMPLE_SNAPSHOT_MERGE_FACTOR', 4))
+
+snapshots = SnapshotStore(SNAPSHOT_DIR, SNAPSHOT_MERGE_FACTOR)
+_started = time.perf_counter()
+users, interactions, predictions = snapshots.load()
+if len(users) or len(interactions):
+    print(f"📂 Restored {len(users)} users and {len(interactions)} interactions "
+          f"in {time.perf_counter() - _started:.2f}s")
 
 # Sample ads
 SAMPLE_ADS = {
@@ -188,7 +199,7 @@ def predict_interests(user_id):
     """Predict user interests based on interactions"""
     try:
         # Get user interactions
-        user_interactions = [i for i in interactions if i['user_id'] == user_id]
+        user_interactions = interactions.for_user(user_id)
         
         if not user_interactions:
             return jsonify({
@@ -330,7 +341,7 @@ def get_user_analytics(user_id):
                 'message': 'User not found'
             }), 404
         
-        user_interactions = [i for i in interactions if i['user_id'] == user_id]
+        user_interactions = interactions.for_user(user_id)
         
         # Calculate stats
         total_interactions = len(user_interactions)
@@ -394,4 +405,7 @@ if __name__ == '__main__':
     print("🌐 Server will be available at http://localhost:5000")
     print("📚 API endpoints available at http://localhost:5000/api")
     print("⚠️  This is a simplified version without MongoDB")
+    # With the reloader, only the child process serves requests and owns the state
+    if SNAPSHOT_INTERVAL > 0 and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        snapshots.start(users, interactions, predictions, SNAPSHOT_INTERVAL)
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,12 @@
+from app.async_app import create_async_app
+
+# Serve with an ASGI server, e.g.:
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000 --loop uvloop
+app = create_async_app()
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Starting Personalized Ads Demo Backend (async)...")
+    print("🌐 Starting ASGI server on http://localhost:5000")
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -13,10 +13,108 @@ class Config:
     # MongoDB Configuration
     MONGODB_URI = os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017/personalized_ads'
     MONGODB_DB = 'personalized_ads'
+    MONGODB_MAX_POOL_SIZE = int(os.environ.get('MONGODB_MAX_POOL_SIZE', 100))
+    MONGODB_MIN_POOL_SIZE = int(os.environ.get('MONGODB_MIN_POOL_SIZE', 0))
+
+    # Interaction Storage Configuration
+    # Time-series layout only applies when the collection is first created
+    INTERACTIONS_TIMESERIES = os.environ.get('INTERACTIONS_TIMESERIES', 'false').lower() == 'true'
+    INTERACTIONS_TS_GRANULARITY = os.environ.get('INTERACTIONS_TS_GRANULARITY', 'minutes')
+    # Raw events older than this are expired; 0 keeps them forever
+    INTERACTIONS_RETENTION_DAYS = int(os.environ.get('INTERACTIONS_RETENTION_DAYS', 0))
+    # Compaction folds events into daily summaries this long before expiry
+    COMPACTION_LEAD_DAYS = int(os.environ.get('COMPACTION_LEAD_DAYS', 2))
+    # Time-series collections expire raw events on their own, compacted or not;
+    # their TTL gets this many extra days so a few missed compaction runs lose nothing
+    COMPACTION_TS_MARGIN_DAYS = int(os.environ.get('COMPACTION_TS_MARGIN_DAYS', 7))
+    # A compaction run holding its claim longer than this is assumed dead
+    COMPACTION_STALE_SECONDS = int(os.environ.get('COMPACTION_STALE_SECONDS', 3600))
+    # Columnar exports for offline analysis and training
+    EXPORT_DIR = os.environ.get('EXPORT_DIR', './exports')
+    EXPORT_FORMAT = os.environ.get('EXPORT_FORMAT', 'parquet')  # parquet or arrow
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 10000))
+    # Item-to-item similarity (`flask build-similarity`)
+    SIMILARITY_TOP_N = int(os.environ.get('SIMILARITY_TOP_N', 20))
+    SIMILARITY_MIN_COOCCURRENCE = int(os.environ.get('SIMILARITY_MIN_COOCCURRENCE', 2))
+    SIMILARITY_BATCH_ITEMS = int(os.environ.get('SIMILARITY_BATCH_ITEMS', 2000))
+    # Recent items per user whose neighbours are merged at request time
+    SIMILARITY_RECENT_ITEMS = int(os.environ.get('SIMILARITY_RECENT_ITEMS', 20))
+    # Synthetic load seeding (`flask seed`)
+    SEED_WORKERS = int(os.environ.get('SEED_WORKERS', os.cpu_count() or 1))
+    SEED_BATCH_SIZE = int(os.environ.get('SEED_BATCH_SIZE', 5000))
+    SEED_SHARD_USERS = int(os.environ.get('SEED_SHARD_USERS', 10000))
+    # Page size cap for interaction history and cursor batch size for NDJSON export
+    INTERACTIONS_MAX_PAGE = int(os.environ.get('INTERACTIONS_MAX_PAGE', 1000))
+    INTERACTIONS_STREAM_BATCH = int(os.environ.get('INTERACTIONS_STREAM_BATCH', 500))
     
     # Machine Learning Configuration
     ML_MODEL_PATH = os.environ.get('ML_MODEL_PATH') or './ml_models/user_classifier.pkl'
     ML_MODEL_VERSION = '1.0.0'
+    # Model selection: candidate families, wall-clock budget, parallel workers and
+    # the accuracy tolerance within which the lowest-latency model wins
+    MODEL_CANDIDATES = os.environ.get('MODEL_CANDIDATES', 'logistic_regression,decision_tree,knn,random_forest').split(',')
+    MODEL_SELECTION_BUDGET_SECONDS = float(os.environ.get('MODEL_SELECTION_BUDGET_SECONDS', 120))
+    MODEL_SELECTION_WORKERS = int(os.environ.get('MODEL_SELECTION_WORKERS', os.cpu_count() or 1))
+    MODEL_SELECTION_TOLERANCE = float(os.environ.get('MODEL_SELECTION_TOLERANCE', 0.01))
+    # POST /ml/train runs in the background; a run still marked running after
+    # this long is assumed dead and may be replaced
+    TRAIN_JOB_STALE_SECONDS = int(os.environ.get('TRAIN_JOB_STALE_SECONDS', 3600))
+    # Distillation: online requests use the most accurate student within the p99 budget;
+    # the transfer set adds DISTILL_AUGMENT jittered copies of the training rows
+    DISTILL_ENABLED = os.environ.get('DISTILL_ENABLED', 'true').lower() == 'true'
+    DISTILL_P99_BUDGET_MS = float(os.environ.get('DISTILL_P99_BUDGET_MS', 0.5))
+    DISTILL_AUGMENT = int(os.environ.get('DISTILL_AUGMENT', 2))
+    DISTILL_JITTER = float(os.environ.get('DISTILL_JITTER', 0.1))
+    # Flattened copy of the forest that batch scoring workers memory-map
+    SCORING_MODEL_DIR = os.environ.get('SCORING_MODEL_DIR') or './ml_models/scoring'
+    SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', os.cpu_count() or 1))
+    SCORING_SHARD_SIZE = int(os.environ.get('SCORING_SHARD_SIZE', 500))
+    # How often marked-dirty users are flushed to the dirty_users collection
+    DIRTY_FLUSH_SECONDS = float(os.environ.get('DIRTY_FLUSH_SECONDS', 5.0))
+
+    # HTTP Caching Configuration (seconds)
+    CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', 300))
+    ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 30))
+    ANALYTICS_STALE_TTL = int(os.environ.get('ANALYTICS_STALE_TTL', 120))
+    # Cached analytics responses kept per process, least recently used evicted first
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))
+
+    # Warm-up before /readyz reports ready: recent users to pre-predict, Mongo
+    # connections to open, dummy inferences, and /ads probe rounds until the
+    # p99 of two consecutive rounds agrees within the tolerance
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+    WARMUP_RECENT_USERS = int(os.environ.get('WARMUP_RECENT_USERS', 200))
+    WARMUP_CONNECTIONS = int(os.environ.get('WARMUP_CONNECTIONS', 10))
+    WARMUP_INFERENCES = int(os.environ.get('WARMUP_INFERENCES', 20))
+    WARMUP_PROBES = int(os.environ.get('WARMUP_PROBES', 50))
+    WARMUP_MAX_ROUNDS = int(os.environ.get('WARMUP_MAX_ROUNDS', 10))
+    WARMUP_P99_TOLERANCE = float(os.environ.get('WARMUP_P99_TOLERANCE', 0.2))
+
+    # Request Tracing Configuration (off unless TRACE_ENABLED=true). Sampled
+    # requests record spans for the route, service methods, Mongo commands and
+    # model calls as Chrome trace events in TRACE_DIR. A W3C traceparent header
+    # carries the trace id, and its sampled flag overrides TRACE_SAMPLE_RATE
+    TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'false').lower() == 'true'
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+    TRACE_DIR = os.environ.get('TRACE_DIR', './traces')
+    TRACE_FLUSH_SECONDS = float(os.environ.get('TRACE_FLUSH_SECONDS', 2.0))
+    TRACE_MAX_BUFFER = int(os.environ.get('TRACE_MAX_BUFFER', 100000))
+
+    # Admission control: per-group (initial limit, max limit, target latency ms).
+    # Requests over a group's adaptive limit get 429, over the process cap 503.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', 200))
+    ADMISSION_INGEST_LIMIT = int(os.environ.get('ADMISSION_INGEST_LIMIT', 50))
+    ADMISSION_INGEST_MAX = int(os.environ.get('ADMISSION_INGEST_MAX', 150))
+    ADMISSION_INGEST_TARGET_MS = float(os.environ.get('ADMISSION_INGEST_TARGET_MS', 50))
+    ADMISSION_PREDICT_LIMIT = int(os.environ.get('ADMISSION_PREDICT_LIMIT', 8))
+    ADMISSION_PREDICT_MAX = int(os.environ.get('ADMISSION_PREDICT_MAX', 32))
+    ADMISSION_PREDICT_TARGET_MS = float(os.environ.get('ADMISSION_PREDICT_TARGET_MS', 250))
+    ADMISSION_ADS_LIMIT = int(os.environ.get('ADMISSION_ADS_LIMIT', 50))
+    ADMISSION_ADS_MAX = int(os.environ.get('ADMISSION_ADS_MAX', 150))
+    ADMISSION_ADS_TARGET_MS = float(os.environ.get('ADMISSION_ADS_TARGET_MS', 100))
+    # Share of the limit (or target latency) at which /ads stops predicting inline
+    ADMISSION_DEGRADE_PRESSURE = float(os.environ.get('ADMISSION_DEGRADE_PRESSURE', 0.8))
     
     # Interest Categories for Classification
     INTEREST_CATEGORIES = [
@@ -124,6 +222,78 @@ class Config:
         ]
     }
     
+    # Ad category served for each content category users interact with
+    CONTENT_TO_AD_CATEGORY = {
+        'sports_news': 'sports',
+        'tech_news': 'technology',
+        'tech': 'technology',
+        'fashion_trends': 'fashion',
+        'movie_reviews': 'entertainment',
+        'business_insights': 'business'
+    }
+
+    # Model category each content category counts towards
+    CONTENT_TO_INTEREST = {
+        'sports_news': 'sports',
+        'tech_news': 'tech',
+        'technology': 'tech',
+        'fashion_trends': 'fashion',
+        'movie_reviews': 'entertainment',
+        'business_insights': 'business',
+        'health_tips': 'health',
+        'travel_guides': 'travel',
+        'food_recipes': 'food'
+    }
+
+    # Cold-start Slate Configuration
+    SLATE_REFRESH_SECONDS = int(os.environ.get('SLATE_REFRESH_SECONDS', 300))
+    SLATE_WINDOW_DAYS = int(os.environ.get('SLATE_WINDOW_DAYS', 7))
+    SLATE_VARIANTS = int(os.environ.get('SLATE_VARIANTS', 32))
+
+    # Ad Impression/Click Logging Configuration
+    AD_EVENTS_FLUSH_SECONDS = float(os.environ.get('AD_EVENTS_FLUSH_SECONDS', 1.0))
+    AD_EVENTS_BATCH_SIZE = int(os.environ.get('AD_EVENTS_BATCH_SIZE', 1000))
+    AD_EVENTS_MAX_BUFFER = int(os.environ.get('AD_EVENTS_MAX_BUFFER', 100000))
+    CTR_WINDOW_DAYS = int(os.environ.get('CTR_WINDOW_DAYS', 14))
+    CTR_RELOAD_SECONDS = int(os.environ.get('CTR_RELOAD_SECONDS', 60))
+    # Pseudo-impressions at the category CTR used to smooth per-ad rates
+    CTR_PRIOR_IMPRESSIONS = int(os.environ.get('CTR_PRIOR_IMPRESSIONS', 100))
+
+    # Where per-user features and analytics are computed: 'server' runs
+    # $group/$facet pipelines in Mongo, 'python' fetches the raw history
+    USER_AGGREGATION_MODE = os.environ.get('USER_AGGREGATION_MODE', 'server')
+
+    # Audience segment bitmaps: refresh interval, confidence buckets over [0, 1]
+    # and the longest activity window, in days, a segment can ask for
+    AUDIENCE_REFRESH_SECONDS = int(os.environ.get('AUDIENCE_REFRESH_SECONDS', 60))
+    AUDIENCE_CONFIDENCE_BUCKETS = int(os.environ.get('AUDIENCE_CONFIDENCE_BUCKETS', 20))
+    AUDIENCE_MAX_WINDOW_DAYS = int(os.environ.get('AUDIENCE_MAX_WINDOW_DAYS', 30))
+    AUDIENCE_MAX_MEMBERS = int(os.environ.get('AUDIENCE_MAX_MEMBERS', 10000))
+
+    # Sessionization Configuration. Open sessions are kept in process memory,
+    # or in Mongo ('mongo') when several workers accept interactions
+    SESSION_STORE = os.environ.get('SESSION_STORE', 'memory')
+    SESSION_GAP_SECONDS = int(os.environ.get('SESSION_GAP_SECONDS', 1800))
+    SESSION_MAX_OPEN = int(os.environ.get('SESSION_MAX_OPEN', 100000))
+    SESSION_FLUSH_SECONDS = float(os.environ.get('SESSION_FLUSH_SECONDS', 10.0))
+
+    # Time-decayed interest profiles, updated on every tracked event. /ads
+    # ranks from the profile mixed with the stored prediction; the blend
+    # weight is the profile's share (0 ignores it, 1 ignores the model)
+    INTEREST_PROFILE_ENABLED = os.environ.get('INTEREST_PROFILE_ENABLED', 'true').lower() == 'true'
+    INTEREST_HALF_LIFE_HOURS = float(os.environ.get('INTEREST_HALF_LIFE_HOURS', 72))
+    INTEREST_BLEND_WEIGHT = float(os.environ.get('INTEREST_BLEND_WEIGHT', 0.5))
+    INTEREST_MAX_DURATION_SECONDS = float(os.environ.get('INTEREST_MAX_DURATION_SECONDS', 300))
+    INTEREST_EVENT_WEIGHTS = {
+        'page_view': 1.0,
+        'click': 1.0,
+        'scroll': 0.5,
+        'time_spent': 1.0,
+        'like': 2.0,
+        'share': 3.0,
+        'comment': 2.0
+    }
+
     # User Behavior Tracking Configuration
     TRACKING_EVENTS = [
         'page_view',
@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+
+# Settings for the pre-fork production server:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Prediction is CPU-bound and holds the GIL, so one process per core; a few
+# threads per worker overlap the Mongo round trips of concurrent requests
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Load the app (model, catalog) once in the master and fork it; see wsgi.py
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then, returning pages un-shared since the fork
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+# A worker's Mongo pool only has to cover its own threads plus the background
+# flushers. config.py reads these when the app is imported, after this file.
+os.environ.setdefault('MONGODB_MAX_POOL_SIZE', str(threads + 4))
+os.environ.setdefault('MONGODB_MIN_POOL_SIZE', str(threads))
+os.environ.setdefault('WARMUP_CONNECTIONS', str(threads))
+
+# Without sticky routing a user's events reach every worker, so open sessions
+# have to be shared through Mongo rather than held in each worker's memory
+os.environ.setdefault('SESSION_STORE', 'mongo' if workers > 1 else 'memory')
+if workers > 1 and os.environ['SESSION_STORE'] != 'mongo':
+    print(f"⚠️  SESSION_STORE={os.environ['SESSION_STORE']} with {workers} workers splits sessions "
+          "unless the load balancer routes each user to one worker")
+
+
+def post_fork(server, worker):
+    """Warm up each worker; /readyz answers per worker once its pool and caches are hot"""
+    from app.services.warmup import start_warmup
+    import wsgi
+
+    start_warmup(wsgi.app)
+
+
+def worker_exit(server, worker):
+    """Write buffered ad events, dirty-user flags, sessions and trace spans before the worker goes away"""
+    from app.services.ad_events import ad_event_logger
+    from app.services.dirty_tracker import dirty_users
+    from app.services.sessionizer import sessionizer
+    from app.utils.tracing import tracer
+
+    for flusher in (ad_event_logger, dirty_users, tracer):
+        try:
+            flusher.flush()
+        except Exception as e:
+            print(f"Flush on worker exit failed: {e}")
+    # Closes this worker's in-memory sessions; the Mongo store only writes closed ones
+    sessionizer.shutdown()
@@ -0,0 +1,287 @@
+import atexit
+import json
+import math
+import os
+import pickle
+import shutil
+import signal
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Interaction fields stored as codes into the segment's string table
+STRING_FIELDS = ('user_id', 'session_id', 'event_type', 'content_category', 'content_id')
+
+
+class Segment:
+    """An immutable, memory-mapped block of interactions.
+
+    String fields are int32 codes into a string table (-1 for None):
+    ``strings.bin`` holds the UTF-8 strings back to back and
+    ``string_offsets.npy`` where each one starts, plus a final end offset,
+    so empty strings round-trip. ``duration`` is float64 and ``timestamp``
+    datetime64[us]. The string table is only decoded on first use.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.columns = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in STRING_FIELDS + ('duration', 'timestamp')
+        }
+        self._strings = None
+        self._codes = None
+
+    def __len__(self):
+        return len(self.columns['duration'])
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            with open(os.path.join(self.directory, 'strings.bin'), 'rb') as f:
+                blob = f.read()
+            offsets_path = os.path.join(self.directory, 'string_offsets.npy')
+            if os.path.exists(offsets_path):
+                offsets = np.load(offsets_path).tolist()
+                self._strings = [blob[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+            else:
+                # Segments written before offsets were stored used NUL separators
+                self._strings = blob.decode().split('\0')
+        return self._strings
+
+    def code(self, value):
+        if self._codes is None:
+            self._codes = {s: i for i, s in enumerate(self.strings)}
+        return self._codes.get(value, -2)
+
+    def rows(self, index=None):
+        """Yield interaction dicts, optionally only at positions ``index``"""
+        strings = self.strings
+        columns = {name: self.columns[name] if index is None else self.columns[name][index]
+                   for name in self.columns}
+        timestamps = np.datetime_as_string(columns['timestamp'], unit='us').tolist()
+        durations = columns['duration'].tolist()
+        codes = {name: columns[name].tolist() for name in STRING_FIELDS}
+        for i in range(len(durations)):
+            row = {name: (strings[codes[name][i]] if codes[name][i] >= 0 else None) for name in STRING_FIELDS}
+            row['duration'] = durations[i]
+            row['timestamp'] = timestamps[i]
+            yield row
+
+    @staticmethod
+    def write(directory, rows):
+        Segment.merge(directory, (), rows)
+
+    @staticmethod
+    def merge(directory, segments, rows=()):
+        """Write ``segments`` followed by ``rows`` as one segment, remapping codes column by column"""
+        table = {}
+        parts = {name: [] for name in STRING_FIELDS + ('duration', 'timestamp')}
+        for segment in segments:
+            # The trailing -1 makes code -1 (None) map to itself
+            remap = np.array([table.setdefault(s, len(table)) for s in segment.strings] + [-1], dtype=np.int32)
+            for name in STRING_FIELDS:
+                parts[name].append(remap[segment.columns[name]])
+            parts['duration'].append(np.asarray(segment.columns['duration']))
+            parts['timestamp'].append(np.asarray(segment.columns['timestamp']))
+        for name in STRING_FIELDS:
+            parts[name].append(np.fromiter(
+                (-1 if row.get(name) is None else table.setdefault(str(row.get(name)), len(table)) for row in rows),
+                dtype=np.int32, count=len(rows)
+            ))
+        parts['duration'].append(np.array([_number(row.get('duration')) for row in rows], dtype=np.float64))
+        parts['timestamp'].append(np.array([row.get('timestamp') for row in rows], dtype='datetime64[us]'))
+        Segment._write_columns(directory, {name: np.concatenate(arrays) for name, arrays in parts.items()}, table)
+
+    @staticmethod
+    def _write_columns(directory, columns, table):
+        os.makedirs(directory, exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(directory, f'{name}.npy'), values)
+        encoded = [s.encode() for s in table]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(os.path.join(directory, 'string_offsets.npy'), offsets)
+        with open(os.path.join(directory, 'strings.bin'), 'wb') as f:
+            f.write(b''.join(encoded))
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class InteractionLog:
+    """Append-only interaction list backed by snapshot segments.
+
+    Restored interactions stay in memory-mapped segments; new ones go to an
+    in-memory tail. It supports what the demo server needs from a list
+    (``append``, ``len``, iteration) plus ``for_user``, which finds a user's
+    rows in each segment with a vectorised comparison.
+    """
+
+    def __init__(self, segments=()):
+        self.segments = list(segments)
+        self.tail = []
+        self._lock = threading.Lock()
+
+    def append(self, interaction):
+        with self._lock:
+            self.tail.append(interaction)
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments) + len(self.tail)
+
+    def _view(self):
+        with self._lock:
+            return list(self.segments), list(self.tail)
+
+    def __iter__(self):
+        segments, tail = self._view()
+        for segment in segments:
+            yield from segment.rows()
+        yield from tail
+
+    def for_user(self, user_id):
+        segments, tail = self._view()
+        found = []
+        for segment in segments:
+            code = segment.code(user_id)
+            if code >= 0:
+                found.extend(segment.rows(np.flatnonzero(segment.columns['user_id'] == code)))
+        found.extend(i for i in tail if i['user_id'] == user_id)
+        return found
+
+    def pending(self):
+        """Tail rows not yet in a segment"""
+        with self._lock:
+            return list(self.tail)
+
+    def seal(self, segment, count, merged=()):
+        """Replace the first ``count`` tail rows, and the ``merged`` segments, with the segment that now holds them"""
+        with self._lock:
+            self.segments = [s for s in self.segments if s not in merged] + [segment]
+            del self.tail[:count]
+
+
+class SnapshotStore:
+    """Snapshots the demo server's state to ``directory`` and restores it.
+
+    Each snapshot writes the interactions appended since the last one as a
+    new segment. Segments are tiered by size, a tier spanning a factor of
+    ``merge_factor``: once the newest tier would hold ``merge_factor``
+    segments, they and the new rows are merged into one segment of the next
+    tier, cascading upwards. Each row is rewritten once per tier, so the cost
+    of a snapshot grows with the log of the history, not the history. It then
+    rewrites users and predictions (small, pickled) and
+    finally the manifest, atomically, so a crash mid-snapshot leaves the
+    previous snapshot intact. Request threads only contend for the log's
+    lock while a list is copied or the sealed rows are swapped out.
+    """
+
+    def __init__(self, directory, merge_factor=4):
+        self.directory = directory
+        self.merge_factor = max(2, merge_factor)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def load(self):
+        """Return ``(users, interactions, predictions)``, empty if there is no snapshot"""
+        try:
+            with open(self._manifest_path()) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}, InteractionLog(), {}
+        segments = [Segment(os.path.join(self.directory, name)) for name in manifest['segments']]
+        with open(os.path.join(self.directory, manifest['state']), 'rb') as f:
+            users, predictions = pickle.load(f)
+        return users, InteractionLog(segments), predictions
+
+    def _tier(self, rows):
+        return int(math.log(max(rows, 1), self.merge_factor))
+
+    def _to_merge(self, segments, rows):
+        """The newest segments to merge with ``rows`` new rows, oldest first"""
+        merged, total = [], rows
+        while True:
+            remaining = segments[:len(segments) - len(merged)]
+            tier = self._tier(total)
+            run = []
+            for segment in reversed(remaining):
+                if self._tier(len(segment)) > tier:
+                    break
+                run.insert(0, segment)
+            # The new rows count as one segment of the tier
+            if len(run) + 1 < self.merge_factor:
+                return merged
+            merged = run + merged
+            total += sum(len(s) for s in run)
+
+    def save(self, users, interactions, predictions):
+        with self._lock:
+            started = time.perf_counter()
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime('%Y%m%dT%H%M%S') + f'{time.time() % 1:.6f}'[1:].replace('.', '')
+
+            rows = interactions.pending()
+            if rows:
+                name = f'segment-{stamp}'
+                path = os.path.join(self.directory, name)
+                merged = self._to_merge(list(interactions.segments), len(rows))
+                if merged:
+                    Segment.merge(path, merged, rows)
+                else:
+                    Segment.write(path, rows)
+                interactions.seal(Segment(path), len(rows), merged)
+
+            # dict() copies in one step, so concurrent inserts cannot break pickling
+            state = f'state-{stamp}.pkl'
+            with open(os.path.join(self.directory, state), 'wb') as f:
+                pickle.dump((dict(users), dict(predictions)), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            manifest = {
+                'segments': [os.path.basename(s.directory) for s in interactions.segments],
+                'state': state,
+                'saved_at': time.time()
+            }
+            tmp = self._manifest_path() + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp, self._manifest_path())
+
+            # Readers still holding a merged segment keep its memory maps after the files go
+            for old in os.listdir(self.directory):
+                if old.startswith('state-') and old != state:
+                    os.remove(os.path.join(self.directory, old))
+                elif old.startswith('segment-') and old not in manifest['segments']:
+                    shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+            return {'rows': len(rows), 'seconds': time.perf_counter() - started}
+
+    def start(self, users, interactions, predictions, interval):
+        """Snapshot every ``interval`` seconds in a daemon thread, and on shutdown"""
+        def snapshot():
+            try:
+                result = self.save(users, interactions, predictions)
+                print(f"💾 Snapshot saved ({result['rows']} new interactions, {result['seconds']:.2f}s)")
+            except Exception as e:
+                print(f"Snapshot failed: {e}")
+
+        def run():
+            while True:
+                time.sleep(interval)
+                snapshot()
+
+        self._thread = threading.Thread(target=run, name='snapshot', daemon=True)
+        self._thread.start()
+        atexit.register(snapshot)
+
+        # Turn SIGTERM into a normal exit so the atexit snapshot runs
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
@@ -0,0 +1,39 @@
+import gc
+
+from app import create_app
+from app.services.ad_events import ctr_table
+from app.services.ad_slate import popularity_slate
+from app.services.warmup import warm_model
+from app.utils.http_cache import catalog_version
+
+# Pre-fork WSGI entry point:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# With preload_app the master imports this module once, loads the model and
+# ad catalog, then forks; workers share those pages copy-on-write instead of
+# each loading their own copy.
+app = create_app()
+
+
+def preload(app):
+    """Load everything workers should share, then drop the master's Mongo client"""
+    # Trains once here if no model exists, rather than once per worker
+    info = warm_model()
+    catalog_version()
+    try:
+        ctr_table.reload(app.mongo)
+        popularity_slate.load(list(app.mongo.interactions.aggregate(popularity_slate.popularity_pipeline())))
+    except Exception as e:
+        print(f"Ad catalog preload failed, workers will load it lazily: {e}")
+
+    # Workers open their own clients on first use
+    app.mongo.close()
+
+    # Objects that survive to here live for the whole process. Freezing moves
+    # them out of the collector's generations, so a worker's GC pass does not
+    # write to (and so un-share) the pages holding the model
+    gc.collect()
+    gc.freeze()
+    print(f"📦 Preloaded {info['model']} (online: {info['online_model']}) for workers")
+
+
+preload(app)
@@ -32,19 +32,38 @@ const MLDashboard = () => {
     }
   };
 
+  const waitForTraining = async () => {
+    // Training runs in the background on the server; poll until it finishes
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      const response = await mlAPI.getTrainingStatus();
+      if (response.data.job.status !== 'running') {
+        return response.data.job.result || {};
+      }
+    }
+  };
+
   const handleTrainModel = async () => {
     setTraining(true);
     setError('');
 
     try {
-      const response = await mlAPI.trainModel();
-      
-      if (response.data.success) {
+      try {
+        await mlAPI.trainModel();
+      } catch (error) {
+        // 409: a run is already in progress, so wait for that one instead
+        if (error.response?.status !== 409) {
+          throw error;
+        }
+      }
+      const result = await waitForTraining();
+
+      if (result.success) {
         // Reload model info after training
         await loadModelInfo();
-        alert(`Model trained successfully! Accuracy: ${(response.data.accuracy * 100).toFixed(1)}%`);
+        alert(`Model trained successfully! Accuracy: ${(result.accuracy * 100).toFixed(1)}%`);
       } else {
-        setError(response.data.message || 'Failed to train model');
+        setError(result.message || 'Failed to train model');
       }
     } catch (error) {
       setError('Error training model');
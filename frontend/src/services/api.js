@@ -73,8 +73,11 @@ export const adAPI = {
 
 // ML API endpoints
 export const mlAPI = {
-  // Train the ML model
+  // Start training the ML model in the background
   trainModel: () => api.post('/ml/train'),
+
+  // Status and result of the latest training run
+  getTrainingStatus: () => api.get('/ml/train'),
   
   // Get model information
   getModelInfo: () => api.get('/ml/info'),